@@ -1,19 +1,34 @@
 import click
 import os
+from tabulate import tabulate
 from qualitative_coding.corpus import QCCorpus
 from qualitative_coding.logs import configure_logger
+from qualitative_coding.exceptions import QCError
 from qualitative_coding.cli.decorators import (
     handle_qc_errors,
 )
 
 @click.command()
 @click.option("-s", "--settings", type=click.Path(exists=True), help="Settings file")
+@click.option("-d", "--db", is_flag=True, help="Show effective database settings")
+@click.option("-f", "--full", is_flag=True, 
+        help="Rehash all corpus files, even those which appear unchanged")
+@click.option("-j", "--jobs", default=1, type=int, help="Number of files to hash in parallel")
+@click.option("--rebuild-summary", is_flag=True, 
+        help="Recompute the code count summary from coded lines")
 @handle_qc_errors
-def check(settings):
+def check(settings, db, full, jobs, rebuild_summary):
     "Check project for errors"
     settings_path = settings or os.environ.get("QC_SETTINGS", "settings.yaml")
     log = configure_logger(settings_path)
-    log.info("check")
+    log.info("check", db=db, full=full, jobs=jobs, rebuild_summary=rebuild_summary)
     corpus = QCCorpus(settings_path)
     with corpus.session():
-        corpus.validate_corpus_paths()
+        if db:
+            pragmas = corpus.get_database_pragmas()
+            print(tabulate(pragmas.items(), ["Pragma", "Value"]))
+        corpus.validate_corpus_paths(full=full, jobs=jobs)
+        if rebuild_summary:
+            if not corpus.use_code_count_summary:
+                raise QCError("The code count summary is disabled. Set code_count_summary in settings.")
+            corpus.rebuild_code_count_summary()
@@ -13,7 +13,7 @@ from qualitative_coding.logs import configure_logger
 @click.argument("coder")
 @click.option("-s", "--settings", type=click.Path(exists=True), help="Settings file")
 @click.option("-p", "--pattern", 
-        help="Pattern to filter corpus filenames (glob-style)")
+        help="Pattern to filter corpus filenames (glob-style, or re:<regex>)")
 @click.option("-f", "--filenames", 
         help="File path containing a list of filenames to use")
 @click.option("-u", "--uncoded", is_flag=True, help="Select uncoded files")
@@ -11,7 +11,7 @@ from qualitative_coding.logs import configure_logger
 @click.argument("codes", nargs=-1)
 @click.option("-s", "--settings", type=click.Path(exists=True), help="Settings file")
 @click.option("-p", "--pattern", 
-        help="Pattern to filter corpus filenames (glob-style)")
+        help="Pattern to filter corpus filenames (glob-style, or re:<regex>)")
 @click.option("-f", "--filenames", 
         help="File path containing a list of filenames to use")
 @click.option("-c", "--coders", help="Coders", multiple=True)
@@ -28,7 +28,7 @@ from qualitative_coding.logs import configure_logger
         help="Do not show matching codes")
 @click.option("-l", "--no-line-numbers", "no_line_numbers", is_flag=True,
         help="Do not show line numbers")
-@click.option("-j", "--json", is_flag=True, help="Export as JSON")
+@click.option("-j", "--json", is_flag=True, help="Export as JSON Lines")
 @handle_qc_errors
 def find(codes, settings, pattern, filenames, coders, depth, unit, recursive_codes, 
          before, after, no_codes, no_line_numbers, json):
@@ -10,7 +10,7 @@ from qualitative_coding.logs import configure_logger
 @click.option("-s", "--settings", type=click.Path(exists=True), help="Settings file")
 @click.option("-c", "--coders", help="Coders", multiple=True)
 @click.option("-p", "--pattern", 
-        help="Pattern to filter corpus filenames (glob-style)")
+        help="Pattern to filter corpus filenames (glob-style, or re:<regex>)")
 @click.option("-f", "--filenames", 
         help="File path containing a list of filenames to use")
 def rename(old_codes, new_code, settings, coders, pattern, filenames):
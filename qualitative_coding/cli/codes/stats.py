@@ -14,7 +14,7 @@ from tabulate import tabulate_formats
 @click.argument("codes", nargs=-1)
 @click.option("-s", "--settings", type=click.Path(exists=True), help="Settings file")
 @click.option("-p", "--pattern", 
-        help="Pattern to filter corpus filenames (glob-style)")
+        help="Pattern to filter corpus filenames (glob-style, or re:<regex>)")
 @click.option("-f", "--filenames", 
         help="File path containing a list of filenames to use")
 @click.option("-c", "--coders", help="Coders", multiple=True)
@@ -21,22 +21,23 @@ LABELS = {
 
 @click.command()
 @click.option("-s", "--settings", type=click.Path(exists=True), help="Settings file")
-@click.option("-p", "--pattern", help="Pattern to filter corpus filenames (glob-style)")
+@click.option("-p", "--pattern", help="Pattern to filter corpus filenames (glob-style, or re:<regex>)")
 @click.option("-f", "--filenames", help="File path containing a list of filenames to use")
 @click.option("-k", "--key", default="key.yaml", help="Path to key file")
 @click.option("-r", "--reverse", is_flag=True, help="Un-anonymize documents")
 @click.option("-o", "--out-dir", default="anonymized", help="location for anonymized documemts")
 @click.option("-u", "--update", is_flag=True, help="Update documents in place")
 @click.option("-d", "--dryrun", is_flag=True, help="Show diff instead of performing update")
+@click.option("-j", "--jobs", default=1, type=int, help="Number of processes used to compute diffs")
 @handle_qc_errors
-def anonymize(settings, pattern, filenames, key, reverse, out_dir, update, dryrun):
+def anonymize(settings, pattern, filenames, key, reverse, out_dir, update, dryrun, jobs):
     "Anonymize corpus files"
     settings_path = settings or os.environ.get("QC_SETTINGS", "settings.yaml")
     key_file = Path(key)
     out_path = Path(out_dir)
     log = configure_logger(settings_path)
     log.info("corpus anonymize", pattern=pattern, filenames=filenames, key=key, 
-             reverse=reverse, out_dir=out_dir, update=update, dryrun=dryrun)
+             reverse=reverse, out_dir=out_dir, update=update, dryrun=dryrun, jobs=jobs)
     corpus = QCCorpus(settings_path)
     with corpus.session():
         docs = corpus.get_documents(pattern=pattern, file_list=read_file_list(filenames))
@@ -46,13 +47,14 @@ def anonymize(settings, pattern, filenames, key, reverse, out_dir, update, dryru
         if reverse:
             keys = reverse_keys(keys)
         out_path.mkdir(exist_ok=True, parents=True)
-        with corpus.session():
-            for doc in docs:
-                source = corpus.corpus_dir / doc.file_path
-                dest = out_path / doc.file_path
-                replace_keys(keys, source, dest)
-                if update:
-                    corpus.update_document(source, dest, dryrun)
+        updates = []
+        for doc in docs:
+            source = corpus.corpus_dir / doc.file_path
+            dest = out_path / doc.file_path
+            updates.append((source, replace_keys(keys, source, dest)))
+        if update:
+            with corpus.session():
+                corpus.update_documents(updates, dryrun=dryrun, jobs=jobs)
     else:
         if reverse:
             raise QCError("Cannot use --reverse unless key file exists")
@@ -65,6 +67,7 @@ def replace_keys(keys, source, dest):
     for key in keys_by_length:
         text = text.replace(key, keys[key])
     dest.write_text(text)
+    return text
 
 def reverse_keys(keys):
     """Converts anonymization keys into de-anonymization keys.
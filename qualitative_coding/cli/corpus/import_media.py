@@ -4,6 +4,7 @@ from qualitative_coding.corpus import QCCorpus
 from qualitative_coding.cli.decorators import handle_qc_errors
 from qualitative_coding.media_importers import media_importers
 from qualitative_coding.logs import configure_logger
+from qualitative_coding.exceptions import QCError
 
 @click.command(name="import")
 @click.argument("file_path")
@@ -15,18 +16,27 @@ from qualitative_coding.logs import configure_logger
 @click.option("-i", "--importer", type=click.Choice(media_importers.keys()),
         default="pandoc",
         help="Importer class to use")
+@click.option("-j", "--jobs", default=1, type=int, 
+        help="Number of files to convert concurrently")
 @handle_qc_errors
-def import_media(file_path, settings, recursive, corpus_root, importer):
+def import_media(file_path, settings, recursive, corpus_root, importer, jobs):
     "Import corpus files"
     settings_path = settings or os.environ.get("QC_SETTINGS", "settings.yaml")
     log = configure_logger(settings_path)
     log.info("corpus import", file_path=file_path, recursive=recursive, corpus_root=corpus_root,
-             importer=importer)
+             importer=importer, jobs=jobs)
     corpus = QCCorpus(settings_path)
     with corpus.session():
-        corpus.import_media(
+        failures = corpus.import_media(
             file_path, 
             recursive=recursive, 
             corpus_root=corpus_root, 
-            importer=importer
+            importer=importer,
+            jobs=jobs,
+            progress=recursive,
+        )
+    if failures:
+        raise QCError(
+            f"{len(failures)} file(s) could not be imported:\n" + 
+            "\n".join(f"- {source}: {message}" for source, message in failures)
         )
@@ -7,6 +7,7 @@ from qualitative_coding.corpus import QCCorpus
 from qualitative_coding.exceptions import IncompatibleOptions, QCError, InvalidParameter
 from qualitative_coding.cli.decorators import handle_qc_errors
 from qualitative_coding.logs import configure_logger
+from qualitative_coding.views.styles import warn
 
 @click.command()
 @click.argument("file_path", type=click.Path(exists=True))
@@ -22,4 +23,10 @@ def update(file_path, settings, new, dryrun):
     log.info("corpus update", new=new, dryrun=dryrun)
     corpus = QCCorpus(settings_path)
     with corpus.session():
-        corpus.update_document(file_path, new, dryrun)
+        dropped = corpus.update_document(file_path, new, dryrun)
+    verb = "would be" if dryrun else "was"
+    for code, coder, line, doc_path in dropped:
+        click.echo(warn(
+            f"Code {code} ({coder}) on line {line} of {doc_path} {verb} dropped " + 
+            "because the line was deleted."
+        ), err=True)
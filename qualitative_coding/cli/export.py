@@ -10,8 +10,10 @@ from qualitative_coding.cli.decorators import (
 @click.command()
 @click.argument("export_path")
 @click.option("-s", "--settings", type=click.Path(exists=True), help="Settings file")
+@click.option("-i", "--incremental", is_flag=True, 
+        help="Only rewrite sources which changed since the last incremental export")
 @handle_qc_errors
-def export(export_path, settings):
+def export(export_path, settings, incremental):
     "Export project as REFI-QDA"
     settings_path = settings or os.environ.get("QC_SETTINGS", "settings.yaml")
     corpus = QCCorpus(settings_path)
@@ -19,5 +21,5 @@ def export(export_path, settings):
         corpus.update_codebook()
     path = Path(export_path).with_suffix(".qdpx")
     writer = REFIQDAWriter(settings_path)
-    writer.write(export_path)
+    writer.write(export_path, incremental=incremental)
 
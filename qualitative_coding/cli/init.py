@@ -9,14 +9,18 @@ from pathlib import Path
 @click.option("-s", "--settings", type=click.Path(), help="Settings file")
 @click.option("-w", "--write-settings-file", is_flag=True, help="Create a settings file but do not create directories")
 @click.option("-i", "--import", "_import", help="Import an existing qdpx project")
+@click.option("-j", "--jobs", default=1, type=int, 
+        help="Number of source files to import concurrently")
+@click.option("--no-validate", is_flag=True, 
+        help="Do not validate the imported project against the REFI-QDA schema")
 @handle_qc_errors
-def init(settings, write_settings_file, _import):
+def init(settings, write_settings_file, _import, jobs, no_validate):
     "Initialize a qc project"
     settings_path = settings or os.environ.get("QC_SETTINGS", "settings.yaml")
     if _import:
         from qualitative_coding.refi_qda.reader import REFIQDAReader
-        reader = REFIQDAReader(_import)
-        reader.unpack_project(Path.cwd())
+        reader = REFIQDAReader(_import, validate_schema=not no_validate)
+        reader.unpack_project(Path.cwd(), jobs=jobs)
     else:
         log = configure_logger(settings_path)
         log.info("init", write_settings_file=write_settings_file)
@@ -1,6 +1,96 @@
+from hashlib import sha1
+from io import BytesIO
+from pathlib import Path
+import pickle
+import re
+import yaml
+from qualitative_coding.tree_node import TreeNode, YAMLDumper
 
 class QCCodebook:
+    """Reads the codebook, caching its parsed contents. 
+    Parsing YAML is slow, and the codebook is read several times by many commands.
+    Parsed codebooks are memoized in-process and persisted to a cache file next to 
+    the codebook, both keyed by the hash of the codebook file. Only plain data
+    (lists, dicts, and strings) is cached; TreeNodes are built fresh on every read,
+    so callers may modify them.
+    """
+    memo = {}
+    cache_version = 1
 
     def __init__(self, filename):
-        self.filename = filename
-        
+        self.filename = Path(filename)
+        self.cache_path = self.filename.with_name("." + self.filename.name + ".cache")
+
+    def read(self):
+        "Returns the codebook as a TreeNode."
+        return TreeNode({TreeNode.root: self.read_data()})
+
+    def read_data(self):
+        "Returns the codebook as plain data, as parsed from YAML."
+        text = self.filename.read_bytes()
+        digest = sha1(text).hexdigest()
+        memo_digest, data = self.memo.get(self.filename, (None, None))
+        if memo_digest != digest:
+            data = self.read_cache(digest)
+            if data is None:
+                data = TreeNode.parse_yaml(text, self.filename)
+                self.write_cache(digest, data)
+            self.memo[self.filename] = (digest, data)
+        return data
+
+    def append_codes(self, codes):
+        """Adds codes which are not already in the codebook at its top level. 
+        When the codebook is a single YAML document containing a non-empty 
+        block-style list, the new codes are appended to the file; otherwise 
+        (for example, with document markers or a flow-style list) the codebook 
+        is rewritten.
+        """
+        data = self.read_data()
+        code_tree = TreeNode({TreeNode.root: data})
+        existing = set(code_tree.flatten(names=True))
+        new_codes = [code for code in codes if code not in existing]
+        if not new_codes:
+            return
+        text = self.filename.read_text()
+        content = [line for line in text.splitlines() if line.strip() and not line.startswith("#")]
+        appendable = (
+            isinstance(data, list) and data and 
+            re.match(r"-(\s|$)", content[0]) and
+            not any(line.startswith(("---", "...", "%")) for line in content)
+        )
+        if appendable:
+            separator = "" if text.endswith("\n") else "\n"
+            addition = yaml.dump(new_codes, default_flow_style=False, Dumper=YAMLDumper)
+            with open(self.filename, 'a') as f:
+                f.write(separator + addition)
+        else:
+            for code in new_codes:
+                code_tree.add_child(code)
+            TreeNode.write_yaml(self.filename, code_tree)
+
+    def read_cache(self, digest):
+        "Returns cached data if the cache file matches digest, otherwise None."
+        try:
+            version, cached_digest, data = PlainDataUnpickler(
+                BytesIO(self.cache_path.read_bytes())
+            ).load()
+        except (OSError, ValueError, TypeError, EOFError, pickle.UnpicklingError):
+            return None
+        if version == self.cache_version and cached_digest == digest:
+            return data
+
+    def write_cache(self, digest, data):
+        "Writes the cache file. Failure to write the cache is not an error."
+        try:
+            temp_path = self.cache_path.with_suffix(".tmp")
+            temp_path.write_bytes(pickle.dumps((self.cache_version, digest, data)))
+            temp_path.replace(self.cache_path)
+        except (OSError, pickle.PicklingError):
+            pass
+
+class PlainDataUnpickler(pickle.Unpickler):
+    """Refuses to load anything other than built-in data types, so that a 
+    tampered cache file cannot execute code.
+    """
+    def find_class(self, module, name):
+        raise pickle.UnpicklingError(f"{module}.{name} is not allowed in the codebook cache")
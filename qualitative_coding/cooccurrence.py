@@ -0,0 +1,53 @@
+import numpy as np
+
+def cooccurrence_matrix(incidence, code_sets, chunk_size=4096, weighted=False):
+    """Counts the units of analysis in which each pair of code sets co-occurs.
+    incidence is an iterable of (unit, code) pairs, where unit is any hashable key
+    identifying a unit of analysis (a line, a paragraph, a document). code_sets is
+    a list of sets of code names. Returns an integer matrix whose [i, j] entry is the
+    number of units containing a code from code_sets[i] and a code from code_sets[j].
+
+    When weighted is True, each (unit, code) pair is one occurrence (for example, 
+    one coded line), and may be repeated. Then the [i, j] entry, for i <= j, counts 
+    occurrences of codes in code_sets[i] in units containing a code from code_sets[j], 
+    so that the diagonal counts occurrences; the lower triangle mirrors the upper.
+
+    Units are processed in chunks: each chunk becomes a dense (units x codes) incidence
+    matrix, which is projected onto code sets and then multiplied by its own transpose.
+    Only the code sets present in a chunk take part in the product.
+    """
+    code_index = {}
+    for code_set in code_sets:
+        for code in code_set:
+            code_index.setdefault(code, len(code_index))
+    membership = np.zeros((len(code_index), len(code_sets)), dtype=np.float32)
+    for j, code_set in enumerate(code_sets):
+        for code in code_set:
+            membership[code_index[code], j] = 1
+
+    unit_index = {}
+    unit_ids = []
+    code_ids = []
+    for unit, code in incidence:
+        if code in code_index:
+            unit_ids.append(unit_index.setdefault(unit, len(unit_index)))
+            code_ids.append(code_index[code])
+    order = np.argsort(np.array(unit_ids, dtype=np.int64), kind="stable")
+    unit_ids = np.array(unit_ids, dtype=np.int64)[order]
+    code_ids = np.array(code_ids, dtype=np.int64)[order]
+
+    counts = np.zeros((len(code_sets), len(code_sets)), dtype=np.int64)
+    for start in range(0, len(unit_index), chunk_size):
+        stop = min(start + chunk_size, len(unit_index))
+        lo, hi = np.searchsorted(unit_ids, [start, stop])
+        chunk = np.zeros((stop - start, len(code_index)), dtype=np.float32)
+        np.add.at(chunk, (unit_ids[lo:hi] - start, code_ids[lo:hi]), 1)
+        occurrences = chunk @ membership
+        in_set = occurrences > 0
+        active = in_set.any(axis=0)
+        x = in_set[:, active].astype(np.float32)
+        n = occurrences[:, active] if weighted else x
+        counts[np.ix_(active, active)] += np.rint(n.T @ x).astype(np.int64)
+    if weighted:
+        counts = np.triu(counts) + np.triu(counts, 1).T
+    return counts
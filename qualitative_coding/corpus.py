@@ -1,4 +1,6 @@
-from itertools import chain, combinations_with_replacement
+from itertools import chain, combinations_with_replacement, groupby
+from operator import itemgetter
+from bisect import bisect_right
 from collections import defaultdict
 from contextlib import contextmanager
 from importlib.metadata import metadata
@@ -10,13 +12,21 @@ from semver import Version
 import structlog
 from textwrap import fill
 import os
-from hashlib import sha1
+import re
+from hashlib import file_digest
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from tqdm import tqdm
 from pathlib import Path
 from sqlalchemy import (
     create_engine,
+    event,
     select,
+    update,
     delete,
     not_,
+    and_,
+    or_,
+    exists,
     func,
     distinct,
     text
@@ -30,6 +40,15 @@ from sqlalchemy.orm import (
 from sqlalchemy.dialects.sqlite import insert
 from qualitative_coding.helpers import prompt_for_choice
 from qualitative_coding.tree_node import TreeNode
+from qualitative_coding.codebook import QCCodebook
+from qualitative_coding.cooccurrence import cooccurrence_matrix
+from qualitative_coding.line_index import (
+    LineIndex,
+    scan_file_line_offsets,
+    scan_file_paragraphs,
+    pack_offsets,
+    unpack_offsets,
+)
 from qualitative_coding.exceptions import (
     QCError, 
     SettingsError, 
@@ -43,23 +62,41 @@ from qualitative_coding.database.models import (
     Code, 
     Coder, 
     CodedLine,
+    CodeCountSummary,
     coded_line_location_association_table
 )
 from qualitative_coding.editors import editors
 from qualitative_coding.media_importers import media_importers
 from qualitative_coding.helpers import (
-    iter_paragraph_lines,
     read_settings,
+    compile_path_pattern,
 )
 from qualitative_coding.diff import (
-    get_diff, 
-    get_git_diff,
-    reindex_coded_lines,
+    read_lines,
+    split_lines,
+    diff_lines,
+    get_git_head_lines,
+    map_lines,
+    reindex_lines,
     in_git_repo,
 )
 
 log = structlog.get_logger()
 
+DEFAULT_DATABASE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'mmap_size': 268435456,
+    'cache_size': -65536,
+    'temp_store': 'MEMORY',
+}
+
+# Pragmas which are always applied, whatever the settings say. Deletes rely on
+# ON DELETE CASCADE, which SQLite only enforces when foreign keys are on.
+REQUIRED_DATABASE_PRAGMAS = {
+    'foreign_keys': True,
+}
+
 DEFAULT_SETTINGS = {
     'qc_version': metadata('qualitative-coding')['version'],
     'corpus_dir': 'corpus',
@@ -69,9 +106,11 @@ DEFAULT_SETTINGS = {
     'editor': 'code',
     'log_file': 'qualitative_coding.log',
     'verbose': False,
+    'database_pragmas': DEFAULT_DATABASE_PRAGMAS,
+    'code_count_summary': True,
 }
 
-LATEST_MIGRATION = Version.parse("1.4.0")
+LATEST_MIGRATION = Version.parse("1.8.0")
 
 class QCCorpus:
     """Provides data access to the corpus of documents and codes. 
@@ -119,7 +158,7 @@ class QCCorpus:
             if database_path.exists() and database_path.is_dir():
                 raise QCError(f"Cannot create {database_path}; there is a directory with that name.")
             if not database_path.exists():
-                engine = create_engine(f"sqlite:///{database_path}")
+                engine = cls.create_engine(database_path, settings.get('database_pragmas'))
                 Base.metadata.create_all(engine)
 
     @classmethod
@@ -163,6 +202,19 @@ class QCCorpus:
                         errors.append(f"Expected editors.{name} to be a dict")
             if not settings.get('editor') in {**editors, **settings.get('editors', {})}:
                 errors.append(f"Unrecognized editor {settings.get('editor')}")
+            if 'database_pragmas' in settings:
+                pragmas = settings['database_pragmas']
+                if not isinstance(pragmas, dict):
+                    errors.append("Expected database_pragmas to be a dict")
+                    raise SettingsError()
+                for name, value in pragmas.items():
+                    if name in REQUIRED_DATABASE_PRAGMAS:
+                        if str(value).lower() not in {"true", "on", "1", "yes"}:
+                            errors.append(f"Database pragma {name} cannot be disabled")
+                    elif name not in DEFAULT_DATABASE_PRAGMAS:
+                        errors.append(f"Unsupported database pragma: {name}")
+                    elif not re.fullmatch(r"-?\w+", str(value)):
+                        errors.append(f"Invalid value for database pragma {name}: {value}")
             if errors:
                 raise SettingsError()
         except SettingsError:
@@ -180,7 +232,35 @@ class QCCorpus:
         self.memos_dir = self.resolve_path(self.settings['memos_dir'])
         self.codebook_path = self.resolve_path(self.settings['codebook'])
         db_file = self.resolve_path(self.settings['database'])
-        self.engine = create_engine(f"sqlite:///{db_file}")
+        self.engine = self.create_engine(db_file, self.settings.get('database_pragmas'))
+        self.use_code_count_summary = self.settings.get('code_count_summary', False)
+
+    @classmethod
+    def create_engine(cls, db_file, pragmas=None):
+        """Creates a sqlalchemy engine for the database. 
+        pragmas (see DEFAULT_DATABASE_PRAGMAS) are applied to each new connection,
+        followed by REQUIRED_DATABASE_PRAGMAS, which cannot be overridden.
+        """
+        engine = create_engine(f"sqlite:///{db_file}")
+        pragmas = {**(pragmas or {}), **REQUIRED_DATABASE_PRAGMAS}
+
+        @event.listens_for(engine, "connect")
+        def set_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            for name, value in pragmas.items():
+                if isinstance(value, bool):
+                    value = "ON" if value else "OFF"
+                cursor.execute(f"PRAGMA {name} = {value}")
+            cursor.close()
+        return engine
+
+    def get_database_pragmas(self):
+        "Returns a dict of the effective values of configurable and required database pragmas."
+        connection = self.get_session().connection()
+        return {
+            name: connection.exec_driver_sql(f"PRAGMA {name}").scalar()
+            for name in {**DEFAULT_DATABASE_PRAGMAS, **REQUIRED_DATABASE_PRAGMAS}
+        }
 
     class NotInSession(Exception):
         def __init__(self, *args, **kwargs):
@@ -202,13 +282,30 @@ class QCCorpus:
         This context manager should not be used within QCCorpus methods.
         Instead, use get_session() below; the session will be returned
         if it is in scope.
+
+        Codes created during the session are added to the codebook once, 
+        when the session ends. See sync_codebook. If the body raises, 
+        uncommitted changes are rolled back, codes which were committed are 
+        still added to the codebook, and the Session is closed.
         """
 
         session_context_manager = Session(self.engine)
         self.session = session_context_manager.__enter__()
-        yield
-        del self.session
-        session_context_manager.__exit__(None, None, None)
+        self.new_codes = {}
+        self.clear_document_cache()
+        exc_info = (None, None, None)
+        try:
+            yield
+        except BaseException as err:
+            exc_info = (type(err), err, err.__traceback__)
+            self.session.rollback()
+            raise
+        finally:
+            try:
+                self.sync_codebook()
+            finally:
+                del self.session
+                session_context_manager.__exit__(*exc_info)
 
     def get_session(self):
         "A context manager for sa's Session"
@@ -244,12 +341,16 @@ class QCCorpus:
         if errors:
             raise QCError("Invalid settings:\n" + "\n".join([f"- {err}" for err in errors]))
 
-    def validate_corpus_paths(self):
+    def validate_corpus_paths(self, full=False, jobs=1):
         """Checks that the set of files in corpus_dir exactly matches Documents. 
         Also checks that corpus document hashes match those in the database
         This is not included in QCCorpus.validate because it would create a 
         circular dependency: This method must be run from within a QCCorpus.session, 
         which cannot be instantiated until initialization is complete.
+
+        Files are only rehashed when their size, mtime, or inode differ from those 
+        recorded with the hash, unless full is True. When jobs > 1, files are hashed 
+        in a thread pool. 
         """
         q = select(Document)
         docs_in_db = set(self.get_session().scalars(q).all())
@@ -269,17 +370,28 @@ class QCCorpus:
                 f"{missing} is missing. Either restore the file or remove it from the " + 
                 f"project by running: qc corpus remove {missing}"
             )
+        to_hash = []
         for doc in docs_in_db:
             path = self.corpus_dir / doc.file_path
             if path.exists():
-                if doc.file_hash != self.hash_file(path):
-                    errors.append(
-                        f"{doc.file_path} has been changed since it was imported. " + 
-                        f"This could affect the alignment of existing codes. " + 
-                        f"Either restore the original version of {doc.file_path}, or " + 
-                        f"import the changed version by running: qc corpus update " + 
-                        f"{doc.file_path}"
-                    )
+                if full or self.stat_file(path) != self.get_document_stat(doc):
+                    to_hash.append(doc)
+        with ThreadPoolExecutor(max_workers=max(1, jobs)) as executor:
+            hashes = executor.map(self.hash_file, [self.corpus_dir / d.file_path for d in to_hash])
+            hashes = list(hashes)
+        for doc, file_hash in zip(to_hash, hashes):
+            if doc.file_hash == file_hash:
+                self.set_document_stat(doc, self.stat_file(self.corpus_dir / doc.file_path))
+            else:
+                errors.append(
+                    f"{doc.file_path} has been changed since it was imported. " + 
+                    f"This could affect the alignment of existing codes. " + 
+                    f"Either restore the original version of {doc.file_path}, or " + 
+                    f"import the changed version by running: qc corpus update " + 
+                    f"{doc.file_path}"
+                )
+        if self.get_session().dirty:
+            self.get_session().commit()
         if errors:
             err = "Errors found in corpus:\n"
             fmt = lambda err: fill(err, initial_indent=" - ", subsequent_indent="   ")
@@ -320,20 +432,20 @@ class QCCorpus:
             self.get_session().commit()
             return coder
 
-    # TODO once we implement migrations, this should be simplified using a 
-    # delete cascade on the coder->coded_line
     def delete_coder(self, coder_name):
-        try:
-            q = select(CodedLine).where(CodedLine.coder_id == coder_name)
-            coded_lines = self.get_session().scalars(q)
-            q = select(Coder).where(Coder.name == coder_name)
-            coder = self.get_session().execute(q).scalar_one()
-        except NoResultFound:
+        """Deletes a coder. The coder's coded lines, their links to locations, and
+        their code count summaries are deleted by ON DELETE CASCADE foreign keys.
+        """
+        session = self.get_session()
+        result = session.execute(
+            delete(Coder)
+            .where(Coder.name == coder_name)
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount == 0:
+            session.rollback()
             raise QCError(f"There is no coder named {coder_name}.")
-        for coded_line in coded_lines:
-            self.get_session().delete(coded_line)
-        self.get_session().delete(coder)
-        self.get_session().commit()
+        session.commit()
 
     def get_all_coders(self):
         q = select(Coder)
@@ -347,6 +459,7 @@ class QCCorpus:
             code = Code(name=code_name)
             self.get_session().add(code)
             self.get_session().commit()
+            self.new_codes[code_name] = None
             return code
 
     def get_codes(self, pattern=None, file_list=None, coder=None):
@@ -360,7 +473,7 @@ class QCCorpus:
 
     def get_codebook(self):
         "Reads a tree of codes from the codebook file."
-        return TreeNode.read_yaml(self.codebook_path)
+        return QCCodebook(self.codebook_path).read()
 
     def get_document(self, corpus_path):
         """Fetches a document object.
@@ -386,6 +499,21 @@ class QCCorpus:
         except NoResultFound:
             raise QCError(f"Error getting paragraph for {document}, line {line}.")
 
+    def get_paragraph_intervals(self, document, index_name="paragraphs"):
+        """Returns the paragraph Locations for the given document as three parallel 
+        lists (ids, start lines, end lines), sorted by start line. 
+        """
+        q = (
+            select(Location.id, Location.start_line, Location.end_line)
+            .join(Location.document_index)
+            .where(DocumentIndex.document_id == document)
+            .where(DocumentIndex.name == index_name)
+            .order_by(Location.start_line)
+        )
+        rows = self.get_session().execute(q).all()
+        ids, starts, ends = zip(*rows) if rows else ((), (), ())
+        return list(ids), list(starts), list(ends)
+
     def update_coded_lines(self, document, coder, coded_line_data):
         """Updates document's coded lines for the given coder.
         document and coder should be strings, and coded_line_data should
@@ -393,33 +521,69 @@ class QCCorpus:
 
         Fetches all existing coded lines for the document and coder, and 
         then compares the set of existing coded line data with new coded line data.
-        When existing are absent from new, marks objects for deletion. 
-        When new are absent from existing, creates a new CodedLine and adds it to the session.
+        Existing coded lines absent from new data are deleted; new coded lines absent 
+        from existing data are inserted in bulk and linked to their paragraphs, which 
+        are looked up by bisection in the document's paragraph intervals.
+        All changes are made in a single transaction.
         """
-        self.get_or_create_coder(coder)
-        for code_id in set(cl['code_id'] for cl in coded_line_data):
-            self.get_or_create_code(code_id)
         session = self.get_session()
-        q = (select(CodedLine)
+        session.execute(insert(Coder).on_conflict_do_nothing(), [{'name': coder}])
+        code_ids = set(cl['code_id'] for cl in coded_line_data)
+        if code_ids:
+            created_codes = session.scalars(
+                insert(Code).on_conflict_do_nothing().returning(Code.name), 
+                [{'name': code_id} for code_id in sorted(code_ids)]
+            ).all()
+        q = (select(CodedLine.id, CodedLine.line, CodedLine.code_id)
             .join(CodedLine.locations)
             .join(Location.document_index)
             .where(DocumentIndex.document_id == document)
             .where(CodedLine.coder_id == coder)
         )
-        existing_coded_lines = self.session.scalars(q).all()
-        existing_coded_line_data = {(cl.line, cl.code_id) for cl in existing_coded_lines}
+        existing_coded_lines = session.execute(q).all()
+        existing_coded_line_data = {(line, code_id) for _, line, code_id in existing_coded_lines}
         new_coded_line_data = {(d['line'], d['code_id']) for d in coded_line_data}
-        for cl in existing_coded_lines:
-            if (cl.line, cl.code_id) not in new_coded_line_data:
-                self.get_session().delete(cl)
-        for (line, code_id) in new_coded_line_data - existing_coded_line_data:
-            cl = CodedLine(line=line, code_id=code_id, coder_id=coder)
-            session.add(cl)
-            cl.locations.append(self.get_paragraph(document, line))
+        stale_ids = [cl_id for cl_id, line, code_id in existing_coded_lines 
+                if (line, code_id) not in new_coded_line_data]
+        if stale_ids:
+            self.delete_coded_lines_by_id(stale_ids)
+
+        additions = sorted(new_coded_line_data - existing_coded_line_data)
+        if additions:
+            location_ids, starts, ends = self.get_paragraph_intervals(document)
+            paragraphs = []
+            for line, code_id in additions:
+                i = bisect_right(starts, line) - 1
+                if i < 0 or ends[i] <= line:
+                    raise QCError(f"Error getting paragraph for {document}, line {line}.")
+                paragraphs.append(location_ids[i])
+            new_ids = session.scalars(
+                insert(CodedLine).returning(CodedLine.id, sort_by_parameter_order=True),
+                [{'line': line, 'code_id': code_id, 'coder_id': coder} 
+                        for line, code_id in additions],
+            ).all()
+            session.execute(
+                insert(coded_line_location_association_table),
+                [{'coded_line_id': cl_id, 'location_id': location_id} 
+                        for cl_id, location_id in zip(new_ids, paragraphs)],
+            )
+        if stale_ids or additions:
+            self.update_code_count_summary(documents=[document], coders=[coder])
         session.commit()
-        self.update_codebook()
+        if code_ids:
+            self.new_codes.update(dict.fromkeys(created_codes))
+
+    def delete_coded_lines_by_id(self, coded_line_ids):
+        """Deletes coded lines, and their links to locations, by id. 
+        Does not commit the session.
+        """
+        session = self.get_session()
+        assoc = coded_line_location_association_table
+        session.execute(delete(assoc).where(assoc.c.coded_line_id.in_(coded_line_ids)))
+        session.execute(delete(CodedLine).where(CodedLine.id.in_(coded_line_ids)))
 
-    def import_media(self, file_path, recursive=False, corpus_root=None, importer="pandoc"):
+    def import_media(self, file_path, recursive=False, corpus_root=None, importer="pandoc",
+            jobs=1, progress=False):
         """Imports media into the corpus. 
         Importing media consists of three tasks: 
 
@@ -431,6 +595,13 @@ class QCCorpus:
         When recursive is True, walks the given directory and imports all files found.
         When corpus_root is true, saves the files relative to the given subdirectory within
         the corpus.
+
+        Files are transformed by a pool of `jobs` workers, using the importer's executor. 
+        As each file is saved, it is registered here, so that all registrations happen 
+        in a single transaction. A file which cannot be imported does not stop the 
+        import, and its output is removed unless the file existed before the import;
+        returns a list of (source path, error message) for files which failed.
+        When progress is True, shows a progress bar.
         """
         imp = media_importers[importer](self.settings)
         source = Path(file_path)
@@ -443,6 +614,7 @@ class QCCorpus:
             raise InvalidParameter(f"{source} is a dir. Use --recursive.")
         if corpus_root and Path(corpus_root).is_absolute():
             raise InvalidParameter(f"corpus_root ({corpus_root}) must be a relative path.")
+        imp.check_requirements()
 
         if corpus_root:
             dest_root_dir = self.corpus_dir / corpus_root
@@ -451,6 +623,7 @@ class QCCorpus:
             dest_root_dir = self.corpus_dir
 
         if recursive:
+            paths = []
             for dir_path, dir_names, filenames in os.walk(source):
                 rel_dir_path = str(Path(dir_path).relative_to(source))
                 dest_dir = dest_root_dir / rel_dir_path
@@ -458,19 +631,118 @@ class QCCorpus:
                 for fn in filenames:
                     source_path = Path(dir_path) / fn
                     dest_path = (dest_dir / fn).with_suffix(".txt")
-                    imp.import_media(source_path, dest_path)
-                    self.register_document(dest_path)
+                    paths.append((source_path, dest_path))
         else:
             dest_path = (dest_root_dir / source.name).with_suffix(".txt")
-            imp.import_media(source, dest_path)
-            self.register_document(dest_path)
+            paths = [(source, dest_path)]
+
+        session = self.get_session()
+        registered = set(session.scalars(select(Document.file_path)))
+        failures = []
+        sources_by_dest = {}
+        for source_path, dest_path in paths:
+            corpus_path = str(self.get_corpus_path(dest_path))
+            if corpus_path in registered:
+                failures.append((source_path, f"A Document with file path {corpus_path} already exists"))
+            elif dest_path in sources_by_dest:
+                failures.append((source_path, 
+                        f"{sources_by_dest[dest_path]} is also being imported as {corpus_path}"))
+            else:
+                sources_by_dest[dest_path] = source_path
+        preexisting = {dest_path for dest_path in sources_by_dest if dest_path.exists()}
+
+        executor = imp.executor if jobs > 1 else ThreadPoolExecutor
+        with executor(max_workers=max(1, jobs)) as pool:
+            futures = {
+                pool.submit(imp.import_media, source_path, dest_path): dest_path
+                for dest_path, source_path in sources_by_dest.items()
+            }
+            completed = tqdm(as_completed(futures), total=len(futures), 
+                    desc="Importing", disable=not progress)
+            for future in completed:
+                dest_path = futures[future]
+                try:
+                    future.result()
+                    with session.begin_nested():
+                        self.register_document(dest_path, commit=False)
+                except Exception as err:
+                    failures.append((sources_by_dest[dest_path], str(err) or repr(err)))
+                    if dest_path not in preexisting:
+                        dest_path.unlink(missing_ok=True)
+        session.commit()
+        return failures
 
     def hash_file(self, corpus_path):
         """Computes the hash of a document at a corpus path.
         """
-        return sha1(Path(corpus_path).read_bytes()).hexdigest()
+        with open(corpus_path, 'rb') as fh:
+            return file_digest(fh, "sha1").hexdigest()
+
+    def stat_file(self, corpus_path):
+        """Returns (size, mtime_ns, inode) for a document at a corpus path. 
+        When these are unchanged, the file is assumed to be unchanged.
+        """
+        stat = Path(corpus_path).stat()
+        return stat.st_size, stat.st_mtime_ns, stat.st_ino
+
+    def get_document_stat(self, doc):
+        "Returns the (size, mtime_ns, inode) recorded for a document"
+        return doc.file_size, doc.file_mtime_ns, doc.file_inode
+
+    def set_document_stat(self, doc, stat):
+        "Records (size, mtime_ns, inode) for a document"
+        doc.file_size, doc.file_mtime_ns, doc.file_inode = stat
+
+    def set_document_line_offsets(self, doc, corpus_path):
+        "Records the byte and character offsets of each line in a document"
+        byte_offsets, char_offsets = scan_file_line_offsets(corpus_path)
+        doc.line_byte_offsets = pack_offsets(byte_offsets)
+        doc.line_char_offsets = pack_offsets(char_offsets)
+
+    def get_line_offsets(self, corpus_path):
+        """Returns (byte_offsets, char_offsets) arrays for a document, where 
+        line i spans offsets[i]:offsets[i+1] and offsets[-1] is the end of the file.
+        Uses the offsets recorded when the document was registered or updated; 
+        when there are none, or the file has changed since, the file is scanned.
+        """
+        doc = self.get_document(corpus_path)
+        if (
+            doc is None or 
+            doc.line_byte_offsets is None or 
+            self.stat_file(corpus_path) != self.get_document_stat(doc)
+        ):
+            return scan_file_line_offsets(corpus_path)
+        return unpack_offsets(doc.line_byte_offsets), unpack_offsets(doc.line_char_offsets)
+
+    def count_lines(self, corpus_path):
+        "Returns the number of lines in a document"
+        byte_offsets, char_offsets = self.get_line_offsets(corpus_path)
+        return len(byte_offsets) - 1
+
+    def get_line_char_ranges(self, corpus_path):
+        "Returns [(start, end)] character positions for each line in a document"
+        byte_offsets, char_offsets = self.get_line_offsets(corpus_path)
+        return list(zip(char_offsets[:-1].tolist(), char_offsets[1:].tolist()))
+
+    def get_line_for_char_position(self, corpus_path, position):
+        "Returns the line of a document containing a character position"
+        return self.get_lines_for_char_positions(corpus_path, [position])[0]
+
+    def get_lines_for_char_positions(self, corpus_path, positions):
+        """Returns the lines of a document containing each of a list of character 
+        positions. The document's offsets are loaded once, and each position is 
+        resolved by bisection.
+        """
+        byte_offsets, char_offsets = self.get_line_offsets(corpus_path)
+        lines = np.searchsorted(char_offsets, positions, side="right") - 1
+        return np.clip(lines, 0, max(len(char_offsets) - 2, 0)).tolist()
 
-    def register_document(self, corpus_path):
+    def open_lines(self, corpus_path):
+        "Returns a LineIndex for reading ranges of lines from a document"
+        byte_offsets, char_offsets = self.get_line_offsets(corpus_path)
+        return LineIndex(corpus_path, offsets=byte_offsets)
+
+    def register_document(self, corpus_path, commit=True):
         """Adds database entries for a document.
         Document contents are stored in files under the corpus_dir
         """
@@ -482,20 +754,72 @@ class QCCorpus:
             file_path=str(relpath),
             file_hash=self.hash_file(corpus_path),
         )
+        self.set_document_stat(document, self.stat_file(corpus_path))
+        self.set_document_line_offsets(document, corpus_path)
         self.get_session().add(document)
-        index = DocumentIndex(
-            name="paragraphs",
-            document=document,
+        self.get_session().flush()
+        self.set_document_paragraphs(document, corpus_path)
+        self.clear_document_cache()
+        if commit:
+            self.get_session().commit()
+
+    def set_document_paragraphs(self, doc, corpus_path, index_name="paragraphs"):
+        """Segments a document into paragraphs and stores them as the Locations 
+        of its paragraphs DocumentIndex, using bulk inserts. The document's line 
+        offsets must be current. When the index already exists, coded lines linked 
+        to its old Locations are linked to the new paragraph containing their line, 
+        or deleted if their line is past the end of the document.
+        Does not commit the session.
+        """
+        session = self.get_session()
+        starts, ends = scan_file_paragraphs(corpus_path, unpack_offsets(doc.line_byte_offsets))
+        index_id = session.scalar(
+            select(DocumentIndex.id)
+            .where(DocumentIndex.document_id == doc.file_path)
+            .where(DocumentIndex.name == index_name)
         )
-        self.get_session().add(index)
-        with open(corpus_path) as fh:
-            for p_start, p_end in iter_paragraph_lines(fh):
-                self.get_session().add(Location(
-                    start_line=p_start, 
-                    end_line=p_end,
-                    document_index=index,
-                ))
-        self.get_session().commit()
+        coded_lines = []
+        if index_id is None:
+            index_id = session.scalar(
+                insert(DocumentIndex)
+                .values(name=index_name, document_id=doc.file_path)
+                .returning(DocumentIndex.id)
+            )
+        else:
+            assoc = coded_line_location_association_table
+            old_location_ids = select(Location.id).where(Location.document_index_id == index_id)
+            coded_lines = session.execute(
+                select(CodedLine.id, CodedLine.line)
+                .join(assoc, assoc.c.coded_line_id == CodedLine.id)
+                .where(assoc.c.location_id.in_(old_location_ids))
+            ).all()
+            session.execute(delete(assoc).where(assoc.c.location_id.in_(old_location_ids)))
+            session.execute(delete(Location).where(Location.document_index_id == index_id))
+        locations = [
+            {'document_index_id': index_id, 'start_line': start, 'end_line': end}
+            for start, end in zip(starts.tolist(), ends.tolist())
+        ]
+        if not locations:
+            location_ids = []
+        elif coded_lines:
+            location_ids = session.scalars(
+                insert(Location).returning(Location.id, sort_by_parameter_order=True), 
+                locations,
+            ).all()
+        else:
+            session.execute(insert(Location), locations)
+        links = []
+        orphans = []
+        for coded_line_id, line in coded_lines:
+            i = int(np.searchsorted(starts, line, side="right")) - 1
+            if 0 <= i and line < ends[i]:
+                links.append({'coded_line_id': coded_line_id, 'location_id': location_ids[i]})
+            else:
+                orphans.append(coded_line_id)
+        if links:
+            session.execute(insert(coded_line_location_association_table), links)
+        if orphans:
+            self.delete_coded_lines_by_id(orphans)
 
     def get_updated_coded_lines(self, file_path, diff):
         """Returns [(code, coder, line, file_path)] after applying a file diff.
@@ -509,9 +833,90 @@ class QCCorpus:
         # Iterate through the diff
         # return a list of updated coded lines.
 
+    def update_code_count_summary(self, documents=None, coders=None, codes=None):
+        """Recomputes the code count summary for the given documents, coders, and 
+        codes (or for all of them, when none are given) from coded lines. 
+        Does nothing unless the code_count_summary setting is enabled.
+        Does not commit the session.
+        """
+        if not self.use_code_count_summary:
+            return
+        session = self.get_session()
+        stale = delete(CodeCountSummary)
+        counts = (
+            select(
+                DocumentIndex.document_id, 
+                CodedLine.coder_id, 
+                CodedLine.code_id, 
+                func.count(distinct(CodedLine.id)),
+                func.count(distinct(Location.id)),
+            )
+            .join(CodedLine.locations)
+            .join(Location.document_index)
+            .where(DocumentIndex.name == "paragraphs")
+            .group_by(DocumentIndex.document_id, CodedLine.coder_id, CodedLine.code_id)
+        )
+        if documents is not None:
+            stale = stale.where(CodeCountSummary.document_id.in_(documents))
+            counts = counts.where(DocumentIndex.document_id.in_(documents))
+        if coders is not None:
+            stale = stale.where(CodeCountSummary.coder_id.in_(coders))
+            counts = counts.where(CodedLine.coder_id.in_(coders))
+        if codes is not None:
+            stale = stale.where(CodeCountSummary.code_id.in_(codes))
+            counts = counts.where(CodedLine.code_id.in_(codes))
+        session.execute(stale.execution_options(synchronize_session=False))
+        session.execute(insert(CodeCountSummary).from_select([
+            "document_id", "coder_id", "code_id", "line_count", "paragraph_count"
+        ], counts))
+
+    def rebuild_code_count_summary(self):
+        "Recomputes the whole code count summary from coded lines."
+        self.update_code_count_summary()
+        self.get_session().commit()
+
+    def can_count_from_summary(self, unit, coders=None, group_column=None):
+        """Checks whether counts can be answered from the code count summary.
+        Line and document counts always can. Paragraph counts are summed over
+        documents and coders, so they can only be used when a paragraph cannot be 
+        counted for more than one coder: when grouping by coder, or when only 
+        one coder is selected.
+        """
+        if not self.use_code_count_summary:
+            return False
+        if unit == "paragraph":
+            grouped_by_coder = group_column is not None and group_column.key == "coder_id"
+            return grouped_by_coder or bool(coders and len(set(coders)) == 1)
+        return True
+
+    def filter_summary_query(self, query, pattern=None, file_list=None, coders=None):
+        "Filters a query over the code count summary by document and coder."
+        if pattern or file_list:
+            paths = self.select_document_paths(pattern, file_list)
+            query = query.where(CodeCountSummary.document_id.in_(paths))
+        if coders:
+            query = query.where(CodeCountSummary.coder_id.in_(coders))
+        return query
+
+    def get_summary_count(self, unit):
+        "Returns the aggregate over the code count summary for a unit of analysis."
+        return {
+            "line": func.sum(CodeCountSummary.line_count),
+            "paragraph": func.sum(CodeCountSummary.paragraph_count),
+            "document": func.count(distinct(CodeCountSummary.document_id)),
+        }[unit]
+
     def count_codes(self, pattern=None, file_list=None, coders=None, unit="line"):
         """Returns a dict of {code:count}.
+        Uses the code count summary when possible; see can_count_from_summary.
         """
+        if self.can_count_from_summary(unit, coders):
+            query = (
+                select(CodeCountSummary.code_id, self.get_summary_count(unit))
+                .group_by(CodeCountSummary.code_id)
+            )
+            query = self.filter_summary_query(query, pattern, file_list, coders)
+            return dict(self.get_session().execute(query).all())
         unit_column = self.get_column_to_count(unit)
         query = (
             select(Code.name, func.count(distinct(unit_column)))
@@ -527,10 +932,9 @@ class QCCorpus:
         """Returns matching Document objects.
         """
         query = select(Document)
-        if pattern:
-            query = query.where(Document.file_path.contains(pattern))
-        if file_list:
-            query = query.where(Document.file_path.in_(file_list))
+        if pattern or file_list:
+            paths = self.select_document_paths(pattern, file_list)
+            query = query.where(Document.file_path.in_(paths))
         return self.get_session().scalars(query).all()
 
     def move_document(self, target, destination, recursive=False):
@@ -561,12 +965,33 @@ class QCCorpus:
 
     def _move_document(self, old_file_path, new_file_path):
         """Updates a document's file path, and updates DocumentIndex.document_id
-        to match. Does not commit the session.
+        to match. Since file_path is the primary key, and foreign keys may be 
+        enforced, a new Document is created and the old one is deleted.
+        Does not commit the session.
         """
+        session = self.get_session()
         doc = self.get_documents(file_list=[str(old_file_path)])[0]
-        for document_index in doc.indices:
-            document_index.document_id = str(new_file_path)
-        doc.file_path = str(new_file_path)
+        new_doc = Document(
+            file_path=str(new_file_path), 
+            file_hash=doc.file_hash,
+            line_byte_offsets=doc.line_byte_offsets,
+            line_char_offsets=doc.line_char_offsets,
+        )
+        self.set_document_stat(new_doc, self.get_document_stat(doc))
+        session.add(new_doc)
+        session.flush()
+        session.execute(
+            update(DocumentIndex)
+            .where(DocumentIndex.document_id == str(old_file_path))
+            .values(document_id=str(new_file_path))
+        )
+        session.execute(
+            update(CodeCountSummary)
+            .where(CodeCountSummary.document_id == str(old_file_path))
+            .values(document_id=str(new_file_path))
+        )
+        session.execute(delete(Document).where(Document.file_path == str(old_file_path)))
+        self.clear_document_cache()
 
     def get_corpus_path(self, target, must_exist=False, must_not_exist=False, 
                 must_be_file=False, must_be_dir=False):
@@ -599,60 +1024,108 @@ class QCCorpus:
         if not recursive and target.is_dir():
             raise QCError(f"{target} is a directory. Use --recursive")
         if recursive:
+            file_paths = []
             for dir_path, dir_names, filenames in os.walk(target):
                 for fn in filenames:
                     dp = Path(dir_path).relative_to(target)
                     rtarget = target / dp / fn
-                    file_path = str(rtarget.relative_to(self.corpus_dir))
-                    self._remove_document(file_path)
+                    file_paths.append(str(rtarget.relative_to(self.corpus_dir)))
+            self._remove_documents(file_paths)
             shutil.rmtree(target)
         else:
             file_path = str(target.relative_to(self.corpus_dir))
-            self._remove_document(file_path)
+            self._remove_documents([file_path])
             target.unlink()
         session.commit()
 
-    def _remove_document(self, file_path):
-        """Removes document and all dependents from the database.
-        Currently, there are no delete cascades in the database. 
-        When delete cascades are added in a future migration, this 
-        method will become trivial.
+    def _remove_documents(self, file_paths):
+        """Removes documents and all dependents from the database.
+        Coded lines linked to the documents' paragraphs are deleted first; then 
+        deleting the documents removes their indices, locations, links to 
+        coded lines, and code count summaries through ON DELETE CASCADE foreign keys. 
         
         This method is intended to be called by other methods.
         Note that it does not commit the session.
         """
         session = self.get_session()
-
-        query = (
-            select(CodedLine)
-            .join(CodedLine.locations)
+        assoc = coded_line_location_association_table
+        coded_line_ids = (
+            select(assoc.c.coded_line_id)
+            .join(Location, Location.id == assoc.c.location_id)
             .join(Location.document_index)
             .where(DocumentIndex.name == "paragraphs")
+            .where(DocumentIndex.document_id.in_(file_paths))
+        )
+        session.execute(
+            delete(CodedLine)
+            .where(CodedLine.id.in_(coded_line_ids))
+            .execution_options(synchronize_session=False)
         )
-        query = self.filter_query_by_document(query, None, [file_path])
-        coded_lines = self.get_session().execute(query).scalars()
-        for cl in coded_lines:
-            session.delete(cl)
-        doc = self.get_documents(file_list=[file_path])[0]
-        session.delete(doc)
+        session.execute(
+            delete(Document)
+            .where(Document.file_path.in_(file_paths))
+            .execution_options(synchronize_session=False)
+        )
+        self.clear_document_cache()
 
     def filter_query_by_document(self, query, pattern=None, file_list=None, 
             unit="line"):
         """Filters a query by which documents match. 
+        Matching documents are resolved to integer keys once (see 
+        get_document_keys), so the query filters on Location.document_index_id 
+        rather than comparing file paths.
         When unit is paragraph or document, ensures that the query is joined to needed
         tables regardless of whether pattern or file_list are provided.
         """
         if pattern or file_list or unit == "paragraph" or unit == "document":
-            query = query.join(CodedLine.locations).join(Location.document_index)
-        if pattern or file_list or unit == "document":
-            query = query.join(DocumentIndex.document)
-        if unit == "paragraph": 
-            query = query.where(DocumentIndex.name == "paragraphs")
+            query = query.join(CodedLine.locations)
+        if pattern or file_list:
+            document_index_ids = self.get_document_index_ids(pattern, file_list)
+            query = query.where(Location.document_index_id.in_(document_index_ids))
+        elif unit == "paragraph" or unit == "document": 
+            query = (query
+                .join(Location.document_index)
+                .where(DocumentIndex.name == "paragraphs")
+            )
+        return query
+
+    def get_document_keys(self):
+        """Returns a dict mapping each document's file path, in sorted order, to the 
+        id of its paragraphs DocumentIndex. Each document has exactly one paragraphs 
+        index, so these ids serve as integer keys for documents. The dict is read 
+        once and cached for the rest of the session; see clear_document_cache.
+        """
+        if self.document_keys is None:
+            query = (
+                select(DocumentIndex.document_id, DocumentIndex.id)
+                .where(DocumentIndex.name == "paragraphs")
+                .order_by(DocumentIndex.document_id)
+            )
+            self.document_keys = dict(self.get_session().execute(query).all())
+        return self.document_keys
+
+    def select_document_paths(self, pattern=None, file_list=None):
+        """Returns the sorted file paths of documents matching pattern and in file_list.
+        Patterns are compiled once (see helpers.compile_path_pattern) and matched 
+        against the cached list of document paths.
+        """
+        paths = self.get_document_keys()
         if pattern:
-            query = query.where(Document.file_path.contains(pattern))
+            matches = compile_path_pattern(pattern)
+            paths = [path for path in paths if matches(path)]
         if file_list:
-            query = query.where(Document.file_path.in_(file_list))
-        return query
+            file_set = set(file_list)
+            paths = [path for path in paths if path in file_set]
+        return list(paths)
+
+    def get_document_index_ids(self, pattern=None, file_list=None):
+        "Returns the integer keys (see get_document_keys) of matching documents."
+        keys = self.get_document_keys()
+        return [keys[path] for path in self.select_document_paths(pattern, file_list)]
+
+    def clear_document_cache(self):
+        "Clears cached document paths, after documents are registered, moved, or removed."
+        self.document_keys = None
 
     def filter_query_by_coders(self, query, coders=None, coded_line_alias=CodedLine):
         """Filters a query by coders, if coders are given.
@@ -664,18 +1137,27 @@ class QCCorpus:
             return query
 
     def get_column_to_count(self, unit="line", coded_line_alias=CodedLine, 
-            location_alias=Location, document_alias=Document):
+            location_alias=Location):
         """Returns the table and column for a given unit of analysis.
+        Documents are counted by the id of their paragraphs index.
         """
         return {
             "line": coded_line_alias.id,
             "paragraph": location_alias.id,
-            "document": document_alias.file_path,
+            "document": location_alias.document_index_id,
         }[unit]
 
     def get_coded_lines(self, codes=None, pattern=None, file_list=None, coders=None):
         """Returns [(code, coder, line, file_path)]
         """
+        return self.iter_coded_lines(codes=codes, pattern=pattern, file_list=file_list, 
+                coders=coders).all()
+
+    def iter_coded_lines(self, codes=None, pattern=None, file_list=None, coders=None, 
+            yield_per=1000):
+        """Like get_coded_lines, but returns a Result which fetches rows in batches
+        as it is iterated. Rows are ordered by file_path, line, code, and coder.
+        """
         query = (
             select(
                 CodedLine.code_id, 
@@ -686,18 +1168,27 @@ class QCCorpus:
             .join(CodedLine.locations)
             .join(Location.document_index)
             .where(DocumentIndex.name == "paragraphs")
-            .order_by(DocumentIndex.document_id, CodedLine.line)
+            .order_by(DocumentIndex.document_id, CodedLine.line, 
+                CodedLine.code_id, CodedLine.coder_id)
         )
         if codes:
             query = query.where(CodedLine.code_id.in_(codes))
         query = self.filter_query_by_document(query, pattern, file_list)
         query = self.filter_query_by_coders(query, coders)
-        return self.get_session().execute(query).all()
+        return self.get_session().execute(query.execution_options(yield_per=yield_per))
 
     def get_coded_paragraphs(self, codes=None, pattern=None, file_list=None, coders=None):
         """Returns (Code.name, Coder.name, CodedLine.line_number, Document.file_path, Location.id,
                 Location.start_line, Location.end_line)
         """
+        return self.iter_coded_paragraphs(codes=codes, pattern=pattern, file_list=file_list, 
+                coders=coders).all()
+
+    def iter_coded_paragraphs(self, codes=None, pattern=None, file_list=None, coders=None,
+            yield_per=1000):
+        """Like get_coded_paragraphs, but returns a Result which fetches rows in batches
+        as it is iterated. Rows are ordered by file_path, then paragraph start.
+        """
         query = (
             select(CodedLine.code_id, CodedLine.coder_id, DocumentIndex.document_id,
                    Location.start_line, Location.end_line)
@@ -710,7 +1201,7 @@ class QCCorpus:
             query = query.where(CodedLine.code_id.in_(codes))
         query = self.filter_query_by_document(query, pattern, file_list)
         query = self.filter_query_by_coders(query, coders)
-        return self.get_session().execute(query).all()
+        return self.get_session().execute(query.execution_options(yield_per=yield_per))
 
     def get_coded_documents(self, codes=None, pattern=None, file_list=None, coders=None):
         """Returns (Code.name, Coder.name, Document.file_path)
@@ -739,45 +1230,68 @@ class QCCorpus:
         coders=None,
         expanded=False,
     ):
-        """Returns a list of codes and a matrix of (codes * selections). 
+        """Returns a list of codes and a matrix of (codes * codes). 
         Each code represents its code set, consisting of itself and 
-        matching child codes, if `recursive_codes` is set. 
-        Selections are each unit within each matching corpus file.
+        matching child codes, if `recursive_counts` is set. 
+        For paragraph and document units, each cell counts the units within 
+        matching corpus files in which both code sets occur. For the line unit, 
+        each cell [i, j] (i <= j) counts the coded lines with a code from code set 
+        i on lines where code set j also occurs, so that (as with count_codes) a 
+        line coded by two coders counts twice, and the diagonal matches count_codes.
+        The matrix is mirrored below the diagonal.
+        All code incidences are fetched in a single query; see cooccurrence_matrix.
         """
-        tree = self.get_codebook()
-        if codes:
-            nodes = sum([tree.find(c) for c in codes], [])
-            if recursive_codes:
-                nodes = set(sum([n.flatten(depth=depth) for n in nodes], []))
-        else:
-            nodes = tree.flatten(depth=depth)
-        node_names = set([n.name for n in nodes])
-        if recursive_counts:
-            code_sets = [(n.name, set(n.flatten(names=True))) for n in nodes]
-        else:
-            code_sets = [(n.name, set([n.name])) for n in nodes]
+        nodes, code_sets = self.get_code_sets(codes, recursive_codes=recursive_codes, 
+                recursive_counts=recursive_counts, depth=depth)
+        incidence = self.get_code_incidence(unit=unit, pattern=pattern, 
+                file_list=file_list, coders=coders)
+        cooccurrences = cooccurrence_matrix(incidence, [cs for name, cs in code_sets], 
+                weighted=(unit == "line"))
+        labels = [n.expanded_name() if expanded else n.name for n in nodes] 
+        return labels, cooccurrences
 
+    def get_code_matrix_pairwise(self, codes, 
+        recursive_codes=False,
+        recursive_counts=False,
+        depth=None, 
+        unit='line',
+        coders=None,
+        expanded=False,
+    ):
+        """Reference implementation of get_code_matrix, issuing one query per 
+        pair of code sets. This is far too slow for large codebooks, but its 
+        simplicity makes it useful for testing. Does not support filtering documents.
+        """
+        nodes, code_sets = self.get_code_sets(codes, recursive_codes=recursive_codes, 
+                recursive_counts=recursive_counts, depth=depth)
         CodedLineA = aliased(CodedLine)
         CodedLineB = aliased(CodedLine)
         LocationA = aliased(Location)
         LocationB = aliased(Location)
-        unit_column = self.get_column_to_count(unit, coded_line_alias=CodedLineA,
-            location_alias=LocationA)
+        if unit == "line":
+            unit_columns = (CodedLineA.id,)
+        else:
+            unit_columns = self.get_unit_columns(unit, coded_line_alias=CodedLineA,
+                location_alias=LocationA)
         cooccurrences = np.zeros((len(nodes), len(nodes)), dtype=int)
         combos = combinations_with_replacement(enumerate(code_sets), 2)
         for (ix_a, (c_a, cs_a)), (ix_b, (c_b, cs_b)) in combos:
-            query = (
-                select(func.count(distinct(unit_column)))
+            units = (
+                select(*unit_columns)
                 .where(CodedLineA.code_id.in_(cs_a))
                 .where(CodedLineB.code_id.in_(cs_b))
-                .where(CodedLineA.line == CodedLineB.line)
                 .join(LocationA, CodedLineA.locations)
                 .join(LocationB, CodedLineB.locations)
                 .where(LocationA.document_index_id == LocationB.document_index_id)
+                .distinct()
             )
-            query = self.filter_query_by_coders(query, coders, CodedLineA)
-            query = self.filter_query_by_coders(query, coders, CodedLineB)
-
+            if unit == "line":
+                units = units.where(CodedLineA.line == CodedLineB.line)
+            elif unit == "paragraph":
+                units = units.where(LocationA.id == LocationB.id)
+            units = self.filter_query_by_coders(units, coders, CodedLineA)
+            units = self.filter_query_by_coders(units, coders, CodedLineB)
+            query = select(func.count()).select_from(units.subquery())
             ab_count = self.get_session().scalars(query).first()
             cooccurrences[ix_a][ix_b] = ab_count
             cooccurrences[ix_b][ix_a] = ab_count
@@ -785,10 +1299,58 @@ class QCCorpus:
         labels = [n.expanded_name() if expanded else n.name for n in nodes] 
         return labels, cooccurrences
 
+    def get_code_sets(self, codes, recursive_codes=False, recursive_counts=False, 
+            depth=None):
+        """Returns a list of codebook nodes and a list of (name, code set) pairs. 
+        When recursive_counts is set, each code set includes the node's children.
+        """
+        tree = self.get_codebook()
+        if codes:
+            nodes = sum([tree.find(c) for c in codes], [])
+            if recursive_codes:
+                nodes = set(sum([n.flatten(depth=depth) for n in nodes], []))
+        else:
+            nodes = tree.flatten(depth=depth)
+        if recursive_counts:
+            code_sets = [(n.name, set(n.flatten(names=True))) for n in nodes]
+        else:
+            code_sets = [(n.name, set([n.name])) for n in nodes]
+        return list(nodes), code_sets
+
+    def get_code_incidence(self, unit='line', pattern=None, file_list=None, coders=None):
+        """Returns [(unit, code)] for each unit of analysis in which a code occurs.
+        Each unit is a tuple of the columns returned by get_unit_columns.
+        For the line unit, there is one pair per coded line, so a pair is repeated 
+        when several coders applied the same code to a line.
+        """
+        query = (
+            select(*self.get_unit_columns(unit), CodedLine.code_id)
+            .join(CodedLine.locations)
+            .join(Location.document_index)
+            .where(DocumentIndex.name == "paragraphs")
+        )
+        if unit != "line":
+            query = query.distinct()
+        query = self.filter_query_by_document(query, pattern, file_list)
+        query = self.filter_query_by_coders(query, coders)
+        return [(tuple(unit_key), code) for *unit_key, code in self.get_session().execute(query)]
+
+    def get_unit_columns(self, unit="line", coded_line_alias=CodedLine, 
+            location_alias=Location):
+        """Returns the columns which jointly identify a unit of analysis.
+        Assumes coded lines are joined to their paragraph locations.
+        """
+        return {
+            "line": (location_alias.document_index_id, coded_line_alias.line),
+            "paragraph": (location_alias.id,),
+            "document": (location_alias.document_index_id,),
+        }[unit]
+
     def update_codebook(self):
         """
         Updates the codebook by adding any new codes used in the codefiles.
-        Does not remove unused codes.
+        Does not remove unused codes. This compares every code in use with the 
+        codebook; sync_codebook only considers codes created in the current session.
         """
         all_codes = self.get_codes()
         code_tree = self.get_codebook()
@@ -796,131 +1358,263 @@ class QCCorpus:
         for new_code in new_codes:
             code_tree.add_child(new_code)
         TreeNode.write_yaml(self.codebook_path, code_tree)
+        self.new_codes = {}
+
+    def sync_codebook(self):
+        """Adds codes created during the current session to the codebook, 
+        unless they are already there. Called when the session ends, so that 
+        the codebook is read and written at most once per session. Only codes
+        which have been committed to the database are added.
+        """
+        if self.new_codes:
+            committed = set(self.get_session().scalars(
+                select(Code.name).where(Code.name.in_(list(self.new_codes)))
+            ))
+            codes = {code: None for code in self.new_codes if code in committed}
+            if codes:
+                QCCodebook(self.codebook_path).append_codes(codes)
+            self.new_codes = {}
 
     def rename_codes(self, old_codes, new_code, pattern=None, file_list=None, coders=None):
         """
         Updates the codefiles and the codebook, replacing the old code with the new code. 
         Removes the old code from the codebook.
+        Renaming is set-based: coded lines which would duplicate an existing coded 
+        line (same coder, document, and line) with the new code, or one another, are 
+        deleted, and then the remaining matching coded lines are updated in one statement.
         """
         session = self.get_session()
-        new_code = self.get_or_create_code(new_code)
-        query = (
-            select(CodedLine)
+        new_code = self.get_or_create_code(new_code).name
+        coded_lines = self.filter_query_by_document(
+            select(
+                CodedLine.id, 
+                CodedLine.coder_id, 
+                CodedLine.line, 
+                DocumentIndex.document_id,
+            )
             .join(CodedLine.locations)
             .join(Location.document_index)
-            .where(DocumentIndex.name == "paragraphs")
-            .where(CodedLine.code_id.in_(old_codes))
+            .where(DocumentIndex.name == "paragraphs"),
+            pattern=pattern, 
+            file_list=file_list, 
         )
-        query = self.filter_query_by_document(query, pattern, file_list)
-        query = self.filter_query_by_coders(query, coders)
-        matching_coded_lines = session.execute(query).scalars()
-        for cl in matching_coded_lines:
-            doc_path = cl.locations[0].document_index.document_id
-            if self.coded_line_exists(cl.coder_id, new_code.name, cl.line, doc_path):
-                session.delete(cl)
-            else:
-                cl.code = new_code
-        session.commit()
-        self.update_codebook()
-
-    def coded_line_exists(self, coder_name, code_name, line, document_file_path):
-        """Checks whether a coded line exists with the given params.
-        This method is a candidate for optimization.
-        """
-        session = self.get_session()
-        query = (
-            select(CodedLine)
-            .where(CodedLine.coder_id == coder_name)
-            .where(CodedLine.code_id == code_name)
-            .where(CodedLine.line == line)
+        matching = self.filter_query_by_coders(
+            coded_lines
+            .where(CodedLine.code_id.in_(old_codes))
+            .where(CodedLine.code_id != new_code), 
+            coders
+        ).cte("matching")
+        existing = (
+            select(
+                CodedLine.coder_id, 
+                CodedLine.line, 
+                DocumentIndex.document_id,
+            )
             .join(CodedLine.locations)
             .join(Location.document_index)
-            .where(DocumentIndex.document_id == document_file_path)
+            .where(DocumentIndex.name == "paragraphs")
+            .where(CodedLine.code_id == new_code)
+            .cte("existing")
+        )
+        other = matching.alias("other")
+        def same_unit(a, b):
+            return and_(
+                a.c.coder_id == b.c.coder_id,
+                a.c.line == b.c.line,
+                a.c.document_id == b.c.document_id,
+            )
+        collisions = select(matching.c.id).where(or_(
+            exists().where(same_unit(existing, matching)),
+            exists().where(same_unit(other, matching)).where(other.c.id < matching.c.id),
+        ))
+        collision_ids = session.scalars(collisions).all()
+        if collision_ids:
+            self.delete_coded_lines_by_id(collision_ids)
+        session.execute(
+            update(CodedLine)
+            .where(CodedLine.id.in_(select(matching.c.id)))
+            .values(code_id=new_code)
+            .execution_options(synchronize_session=False)
         )
-        result = session.execute(query).scalars()
-        return len(list(result)) > 0
+        self.update_code_count_summary(codes=[*old_codes, new_code])
+        session.commit()
 
     def count_codes_by_coder(self, codes=None, coders=None, recursive_codes=False,
             depth=None, pattern=None, file_list=None, unit='line', totals=True):
         """Counts codes per-coder. Returns a dict of dicts like {"coder":{"code": n}}.
         """
         coders = coders or [c.name for c in self.get_all_coders()]
-        attr = "total" if totals else "count"
-        totals_by_coder = defaultdict(lambda: defaultdict(int))
-        for coder in coders:
-            tree = self.get_code_tree_with_counts(
-                pattern=pattern, 
-                file_list=file_list,
-                coders=[coder], 
-                unit=unit, 
-            )
-            if codes:
-                nodes = sum([tree.find(c) for c in codes], [])
-                if recursive_codes:
-                    nodes = set(sum([n.flatten(depth=depth) for n in nodes], []))
-            else:
-                nodes = tree.flatten(depth=depth)
-            for node in nodes:
-                totals_by_coder[coder][node.expanded_name()] = getattr(node, attr)
-        return totals_by_coder
+        return self.count_codes_by_group(CodedLine.coder_id, coders, codes=codes, 
+                coders=coders, recursive_codes=recursive_codes, depth=depth, 
+                pattern=pattern, file_list=file_list, unit=unit, totals=totals)
 
     def count_codes_by_document(self, codes=None, coders=None, recursive_codes=False,
             depth=None, pattern=None, file_list=None, unit='line', totals=True):
-        """Counts codes per-coder. Returns a dict of dicts like {"coder":{"code": n}}.
+        """Counts codes per-document. Returns a dict of dicts like {"document":{"code": n}}.
         """
         documents = self.get_documents(pattern=pattern, file_list=file_list)
         documents = [doc.file_path for doc in documents]
-        attr = "total" if totals else "count"
-        totals_by_doc = defaultdict(lambda: defaultdict(int))
-        for doc in documents:
-            tree = self.get_code_tree_with_counts(
-                file_list=[doc],
-                coders=coders, 
-                unit=unit, 
+        return self.count_codes_by_group(DocumentIndex.document_id, documents, codes=codes,
+                coders=coders, recursive_codes=recursive_codes, depth=depth, 
+                pattern=pattern, file_list=file_list, unit=unit, totals=totals)
+
+    def count_codes_by_group(self, group_column, groups, codes=None, coders=None, 
+            recursive_codes=False, depth=None, pattern=None, file_list=None, unit='line', 
+            totals=True):
+        """Counts codes for each value of group_column (e.g. CodedLine.coder_id), using a 
+        single grouped query. Counts are then rolled up through the codebook in one
+        matrix product: when totals is True, each node's count includes its descendants.
+        Returns a dict of dicts like {"group":{"code": n}}, keyed by expanded code names.
+        Uses the code count summary when possible; see can_count_from_summary.
+        """
+        if self.can_count_from_summary(unit, coders, group_column):
+            summary_group_column = getattr(CodeCountSummary, group_column.key)
+            query = (
+                select(summary_group_column, CodeCountSummary.code_id, 
+                        self.get_summary_count(unit))
+                .group_by(summary_group_column, CodeCountSummary.code_id)
             )
-            if codes:
-                nodes = sum([tree.find(c) for c in codes], [])
-                if recursive_codes:
-                    nodes = set(sum([n.flatten(depth=depth) for n in nodes], []))
-            else:
-                nodes = tree.flatten(depth=depth)
-            for node in nodes:
-                totals_by_doc[doc][node.expanded_name()] = getattr(node, attr)
-        return totals_by_doc
+            query = self.filter_summary_query(query, pattern, file_list, coders)
+        else:
+            unit_column = self.get_column_to_count(unit)
+            query = (
+                select(group_column, CodedLine.code_id, func.count(distinct(unit_column)))
+                .join(CodedLine.locations)
+                .join(Location.document_index)
+                .where(DocumentIndex.name == "paragraphs")
+                .group_by(group_column, CodedLine.code_id)
+            )
+            query = self.filter_query_by_document(query, pattern, file_list, unit=unit)
+            query = self.filter_query_by_coders(query, coders)
+        rows = self.get_session().execute(query).all()
+
+        tree = self.get_codebook()
+        if codes:
+            nodes = sum([tree.find(c) for c in codes], [])
+            if recursive_codes:
+                nodes = set(sum([n.flatten(depth=depth) for n in nodes], []))
+        else:
+            nodes = tree.flatten(depth=depth)
+        nodes = list(nodes)
+        name_index = {name: i for i, name in enumerate(set(tree.flatten(names=True)))}
+        group_index = {group: i for i, group in enumerate(groups)}
+        counts = np.zeros((len(name_index), len(groups)), dtype=np.int64)
+        for group, code, n in rows:
+            if group in group_index and code in name_index:
+                counts[name_index[code], group_index[group]] = n
+        weights = np.zeros((len(nodes), len(name_index)), dtype=np.int64)
+        for i, node in enumerate(nodes):
+            for member in node.flatten() if totals else [node]:
+                weights[i, name_index[member.name]] += 1
+        rolled_up = weights @ counts
+
+        result = defaultdict(lambda: defaultdict(int))
+        for j, group in enumerate(groups):
+            for i, node in enumerate(nodes):
+                result[group][node.expanded_name()] = int(rolled_up[i, j])
+        return result
 
     def update_document(self, file_path, new, dryrun=False):
         """Update the text of a corpus document. 
         In addition to updating the text in the file, the hash in the database
-        needs to be updated and all existing coded lines need to be reindexed. 
+        needs to be updated, the document needs to be segmented into paragraphs 
+        again, and all existing coded lines need to be reindexed. 
+        With new, the document is replaced by the file at new; otherwise, the 
+        document's current text is compared with its text as of git HEAD.
+        See reindex_documents.
         """
         if new:
             log.debug("Using new file comparison diff strategy")
             if not Path(new).exists():
                 raise InvalidParameter(f"new path {new} does not exist")
-            diff = get_diff(file_path, new)
+            old_lines = read_lines(file_path)
+            new_lines = read_lines(new)
         else:
             log.debug("Using git diff strategy")
             if not in_git_repo():
                 raise QCError("update with git strategy can only be used within a git repository")
-            diff = get_git_diff(file_path)
+            old_lines = get_git_head_lines(file_path)
+            new_lines = read_lines(file_path)
+        return self.reindex_documents([(file_path, old_lines, new_lines)], dryrun=dryrun)
 
-        if dryrun:
-            print(diff)
+    def update_documents(self, updates, dryrun=False, jobs=1):
+        """Updates the text of many corpus documents at once. 
+        updates is a list of (file_path, new_text). See reindex_documents.
+        """
+        changes = [(file_path, read_lines(file_path), split_lines(new_text)) 
+                for file_path, new_text in updates]
+        return self.reindex_documents(changes, dryrun=dryrun, jobs=jobs)
+
+    def reindex_documents(self, changes, dryrun=False, jobs=1):
+        """Applies changes, a list of (file_path, old_lines, new_lines), to corpus documents.
+        Old lines are mapped to new lines using map_lines, computed in a pool of 
+        `jobs` processes. Coded lines are then moved to their new lines and coded 
+        lines on deleted lines are dropped, using bulk statements. Each document is 
+        written, its hash, stat, and line offsets are updated, and it is segmented 
+        into paragraphs again. All changes are made in one transaction, and the 
+        codebook is updated once at the end.
+
+        Returns a list of (code, coder, line, file_path) for coded lines which 
+        were dropped because their lines were deleted. When dryrun is True, prints 
+        each diff and returns the coded lines which would be dropped, without 
+        making changes.
+        """
+        session = self.get_session()
+        corpus_paths = [str(self.get_corpus_path(file_path)) for file_path, _, _ in changes]
+        old_texts = [old_lines for _, old_lines, _ in changes]
+        new_texts = [new_lines for _, _, new_lines in changes]
+        if jobs > 1 and len(changes) > 1:
+            with ProcessPoolExecutor(max_workers=jobs) as pool:
+                line_maps = list(pool.map(map_lines, old_texts, new_texts))
         else:
-            corpus_path = str(self.get_corpus_path(file_path))
-            coded_lines = self.get_coded_lines(file_list=[corpus_path])
-            reindexed_coded_lines = reindex_coded_lines(coded_lines, diff)
-            coded_lines_by_file_by_coder = defaultdict(lambda: defaultdict(list))
-            for code, coder, line, file_path in reindexed_coded_lines:
-                coded_lines_by_file_by_coder[file_path][coder].append({
-                    'line': line, 
-                    'code_id': code,
-                })
-            for file_path, lines_by_coder in coded_lines_by_file_by_coder.items():
-                for coder, lines in lines_by_coder.items():
-                    self.update_coded_lines(file_path, coder, lines)
-            if new:
-                (self.corpus_dir / corpus_path).write_text(Path(new).read_text())
-            doc = self.get_document(self.corpus_dir / corpus_path)
-            doc.file_hash = self.hash_file(self.corpus_dir / corpus_path)
-            self.get_session().commit()
+            line_maps = list(map(map_lines, old_texts, new_texts))
+        line_maps = dict(zip(corpus_paths, line_maps))
+
+        coded_lines = session.execute(
+            select(
+                CodedLine.id,
+                CodedLine.code_id, 
+                CodedLine.coder_id, 
+                CodedLine.line, 
+                DocumentIndex.document_id
+            )
+            .join(CodedLine.locations)
+            .join(Location.document_index)
+            .where(DocumentIndex.name == "paragraphs")
+            .where(DocumentIndex.document_id.in_(corpus_paths))
+            .order_by(DocumentIndex.document_id, CodedLine.line)
+        ).all()
+        moved = []
+        dropped = []
+        dropped_ids = []
+        for doc_path, rows in groupby(coded_lines, key=itemgetter(4)):
+            rows = list(rows)
+            new_lines = reindex_lines([row.line for row in rows], line_maps[doc_path])
+            for (cl_id, code, coder, line, _), new_line in zip(rows, new_lines.tolist()):
+                if new_line < 0:
+                    dropped.append((code, coder, line, doc_path))
+                    dropped_ids.append(cl_id)
+                elif new_line != line:
+                    moved.append({'id': cl_id, 'line': new_line})
+        if dryrun:
+            for old_lines, new_lines in zip(old_texts, new_texts):
+                print(diff_lines(old_lines, new_lines))
+            return dropped
+
+        if moved:
+            session.execute(update(CodedLine), moved)
+        if dropped_ids:
+            self.delete_coded_lines_by_id(dropped_ids)
+        for corpus_path, new_lines in zip(corpus_paths, new_texts):
+            full_path = self.corpus_dir / corpus_path
+            new_text = ''.join(new_lines)
+            if full_path.read_text() != new_text:
+                full_path.write_text(new_text)
+            doc = self.get_document(full_path)
+            doc.file_hash = self.hash_file(full_path)
+            self.set_document_stat(doc, self.stat_file(full_path))
+            self.set_document_line_offsets(doc, full_path)
+            self.set_document_paragraphs(doc, full_path)
+        self.update_code_count_summary(documents=corpus_paths)
+        session.commit()
+        return dropped
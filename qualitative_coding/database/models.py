@@ -1,10 +1,12 @@
-from typing import List
+from typing import List, Optional
 from sqlalchemy import (
     ForeignKey,
     UniqueConstraint,
     CheckConstraint,
+    Index,
     Table,
     Column,
+    LargeBinary,
 )
 from sqlalchemy.orm import (
     DeclarativeBase,
@@ -21,8 +23,13 @@ class Document(Base):
     __tablename__ = "document"
     file_path: Mapped[str] = mapped_column(primary_key=True)
     file_hash: Mapped[str] 
+    file_size: Mapped[Optional[int]]
+    file_mtime_ns: Mapped[Optional[int]]
+    file_inode: Mapped[Optional[int]]
+    line_byte_offsets: Mapped[Optional[bytes]] = mapped_column(LargeBinary, deferred=True)
+    line_char_offsets: Mapped[Optional[bytes]] = mapped_column(LargeBinary, deferred=True)
     indices: Mapped[List["DocumentIndex"]] = relationship(back_populates="document",
-            cascade="all, delete-orphan")
+            cascade="all, delete-orphan", passive_deletes=True)
 
     class AlreadyExists(QCError):
         def __init__(self, doc):
@@ -37,58 +44,88 @@ class DocumentIndex(Base):
             "document_id",
             "name", 
         ),
-)
+        Index("ix_document_index_name", "name", "document_id"),
+    )
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     name: Mapped[str]
     time_series: Mapped[bool] = mapped_column(default=False)
-    document_id: Mapped[str] = mapped_column(ForeignKey(Document.file_path))
+    document_id: Mapped[str] = mapped_column(ForeignKey(Document.file_path, ondelete="CASCADE"))
     document: Mapped["Document"] = relationship(back_populates="indices")
     locations: Mapped[List["Location"]] = relationship(back_populates="document_index",
-            cascade="all, delete-orphan")
+            cascade="all, delete-orphan", passive_deletes=True)
 
 coded_line_location_association_table = Table(
     "coded_line_location_association",
     Base.metadata,
-    Column("coded_line_id", ForeignKey("coded_line.id"), primary_key=True),
-    Column("location_id", ForeignKey("location.id"), primary_key=True),
+    Column("coded_line_id", ForeignKey("coded_line.id", ondelete="CASCADE"), primary_key=True),
+    Column("location_id", ForeignKey("location.id", ondelete="CASCADE"), primary_key=True),
+    Index("ix_coded_line_location_association_location", "location_id", "coded_line_id"),
 )
 
 class Location(Base):
     __tablename__ = "location"
     __table_args__ = (
         CheckConstraint("start_line <= end_line"),
+        Index("ix_location_document_index", "document_index_id", "start_line", "end_line"),
     )
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     start_line: Mapped[int]
     end_line: Mapped[int]
-    document_index_id: Mapped[str] = mapped_column(ForeignKey(DocumentIndex.id))
+    document_index_id: Mapped[str] = mapped_column(ForeignKey(DocumentIndex.id, ondelete="CASCADE"))
     document_index: Mapped["DocumentIndex"] = relationship(back_populates="locations")
     coded_lines: Mapped[List["CodedLine"]] = relationship(
         secondary=coded_line_location_association_table,
         back_populates="locations",
+        passive_deletes=True,
     )
 
 class Code(Base):
     __tablename__ = "code"
     name: Mapped[str] = mapped_column(primary_key=True)
     coded_lines: Mapped[List["CodedLine"]] = relationship(back_populates="code",
-            cascade="all, delete-orphan")
+            cascade="all, delete-orphan", passive_deletes=True)
 
 class Coder(Base):
     __tablename__ = "coder"
     name: Mapped[str] = mapped_column(primary_key=True)
     coded_lines: Mapped[List["CodedLine"]] = relationship(back_populates="coder", 
-            cascade="all, delete-orphan")
+            cascade="all, delete-orphan", passive_deletes=True)
 
 class CodedLine(Base):
     __tablename__ = "coded_line"
+    __table_args__ = (
+        Index("ix_coded_line_code", "code_id", "coder_id", "line"),
+        Index("ix_coded_line_coder", "coder_id", "code_id", "line"),
+    )
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     line: Mapped[int]
-    coder_id: Mapped[str] = mapped_column(ForeignKey(Coder.name))
+    coder_id: Mapped[str] = mapped_column(ForeignKey(Coder.name, ondelete="CASCADE"))
     coder: Mapped["Coder"] = relationship(back_populates="coded_lines")
-    code_id: Mapped[str] = mapped_column(ForeignKey(Code.name))
+    code_id: Mapped[str] = mapped_column(ForeignKey(Code.name, ondelete="CASCADE"))
     code: Mapped["Code"] = relationship(back_populates="coded_lines")
     locations: Mapped[List["Location"]] = relationship(
         secondary=coded_line_location_association_table,
-        back_populates="coded_lines"
+        back_populates="coded_lines",
+        passive_deletes=True,
+    )
+
+class CodeCountSummary(Base):
+    """Materialized counts of coded lines and coded paragraphs for each 
+    document, coder, and code. Maintained by QCCorpus when the 
+    code_count_summary setting is enabled.
+    """
+    __tablename__ = "code_count_summary"
+    __table_args__ = (
+        Index("ix_code_count_summary_code", "code_id", "coder_id", "document_id", 
+                "line_count", "paragraph_count"),
+        Index("ix_code_count_summary_coder", "coder_id", "code_id", "document_id", 
+                "line_count", "paragraph_count"),
     )
+    document_id: Mapped[str] = mapped_column(ForeignKey(Document.file_path, ondelete="CASCADE"), 
+            primary_key=True)
+    coder_id: Mapped[str] = mapped_column(ForeignKey(Coder.name, ondelete="CASCADE"), 
+            primary_key=True)
+    code_id: Mapped[str] = mapped_column(ForeignKey(Code.name, ondelete="CASCADE"), 
+            primary_key=True)
+    line_count: Mapped[int]
+    paragraph_count: Mapped[int]
@@ -1,40 +1,96 @@
 import re
+import numpy as np
+from pathlib import Path
 from more_itertools import peekable
-from difflib import unified_diff
+from difflib import unified_diff, SequenceMatcher
 from subprocess import run
+from qualitative_coding.exceptions import QCError
 
 def get_git_diff(path):
     "Gits a diff between file state and HEAD"
     result = run(f"git diff {path}", shell=True, capture_output=True, text=True)
     return result.stdout
 
+def get_git_head_lines(path):
+    "Gets the lines of a file as of HEAD"
+    path = Path(path).resolve()
+    result = run(["git", "show", f"HEAD:./{path.name}"], cwd=path.parent, 
+            capture_output=True, text=True)
+    if result.returncode != 0:
+        raise QCError(f"Could not read {path} from HEAD: {result.stderr.strip()}")
+    return split_lines(result.stdout)
+
+def read_lines(path):
+    "Reads the lines of a file"
+    with open(path) as fh:
+        return [line for line in fh]
+
+def split_lines(text):
+    "Splits text into lines, keeping line endings, as iterating over a file does"
+    *lines, last = text.split("\n")
+    return [line + "\n" for line in lines] + ([last] if last else [])
+
 def get_diff(path0, path1):
     "Gets a diff between two file paths"
-    with open(path0) as fh:
-        doc0 = [line for line in fh]
-    with open(path1) as fh:
-        doc1 = [line for line in fh]
-    return ''.join(unified_diff(doc0, doc1))
-
-def reindex_coded_lines(coded_lines, diff):
-    """Returns a new version of coded_lines, with line numbers updated to account for diff.
-    Assumes coded_lines are sorted by line number.
+    return diff_lines(read_lines(path0), read_lines(path1))
+
+def diff_lines(old_lines, new_lines):
+    "Gets a unified diff between two lists of lines"
+    return ''.join(unified_diff(old_lines, new_lines))
+
+def map_lines(old_lines, new_lines):
+    """Returns an array mapping each old line number to its new line number, 
+    or to -1 if the line was deleted. Lines in a common prefix and suffix are 
+    mapped directly; the rest are mapped in one pass over the opcodes of a 
+    difflib.SequenceMatcher. Within a replaced block, old and new lines are 
+    paired in order as edited versions of the same lines, and surplus old 
+    lines are deleted.
+    """
+    line_map = np.full(len(old_lines), -1, dtype=np.int64)
+    prefix = 0
+    max_prefix = min(len(old_lines), len(new_lines))
+    while prefix < max_prefix and old_lines[prefix] == new_lines[prefix]:
+        prefix += 1
+    suffix = 0
+    max_suffix = max_prefix - prefix
+    while suffix < max_suffix and old_lines[-1 - suffix] == new_lines[-1 - suffix]:
+        suffix += 1
+    old_end = len(old_lines) - suffix
+    new_end = len(new_lines) - suffix
+    line_map[:prefix] = np.arange(prefix)
+    line_map[old_end:] = np.arange(new_end, len(new_lines))
+    matcher = SequenceMatcher(None, old_lines[prefix:old_end], new_lines[prefix:new_end])
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal" or tag == "replace":
+            n = min(i2 - i1, j2 - j1)
+            line_map[prefix + i1:prefix + i1 + n] = np.arange(prefix + j1, prefix + j1 + n)
+    return line_map
+
+def reindex_lines(lines, line_map):
+    """Returns an array of new line numbers for an array of old line numbers, 
+    using line_map (see map_lines). Deleted lines, and lines outside the old 
+    document, become -1.
+    """
+    lines = np.asarray(lines, dtype=np.int64)
+    in_range = (lines >= 0) & (lines < len(line_map))
+    if not in_range.any():
+        return np.full(len(lines), -1, dtype=np.int64)
+    return np.where(in_range, line_map[np.where(in_range, lines, 0)], -1)
+
+def reindex_coded_lines(coded_lines, line_map):
+    """Returns (reindexed, dropped). reindexed is a new version of coded_lines, 
+    with line numbers updated using line_map (see map_lines). dropped contains
+    the coded lines whose lines were deleted.
     """
-    offsets = peekable(read_diff_offsets(diff))
-    current_offset_line = 0
-    current_offset = 0
-    cum_offset = 0
+    new_lines = reindex_lines([line for code, coder, line, path in coded_lines], line_map)
     reindexed_coded_lines = []
-    for code, coder, line, path in coded_lines:
-        try:
-            if offsets.peek()[0] <= line:
-                current_offset_line, current_offset = next(offsets)
-                cum_offset += current_offset
-        except StopIteration:
-            pass
-
-
-    return reindexed_coded_lines
+    dropped_coded_lines = []
+    for (code, coder, line, path), new_line in zip(coded_lines, new_lines.tolist()):
+        if new_line < 0:
+            dropped_coded_lines.append((code, coder, line, path))
+        else:
+            reindexed_coded_lines.append((code, coder, new_line, path))
+    return reindexed_coded_lines, dropped_coded_lines
 
 def read_diff_offsets(diff):
     """Reads a unified diff and returns a list of (line, offset) tuples.
@@ -1,6 +1,9 @@
 from textwrap import fill
 from pathlib import Path
 from subprocess import run
+from fnmatch import translate
+from functools import lru_cache
+import re
 from qualitative_coding.exceptions import QCError
 import yaml
 
@@ -23,6 +26,22 @@ def read_file_list(filename):
     if filename:
         return Path(filename).read_text().split("\n")
 
+@lru_cache(maxsize=None)
+def compile_path_pattern(pattern):
+    """Compiles a pattern for selecting corpus paths into a predicate. 
+    Patterns beginning with "re:" are regular expressions, searched within the path. 
+    Patterns containing glob characters (*, ?, or [) must match the whole path; 
+    "*" matches across directories. Other patterns match any path containing them.
+    """
+    if pattern.startswith("re:"):
+        try:
+            return re.compile(pattern[3:]).search
+        except re.error as err:
+            raise QCError(f"Invalid regular expression in pattern {pattern}: {err}")
+    if any(char in pattern for char in "*?["):
+        return re.compile(translate(pattern)).match
+    return lambda path: pattern in path
+
 def iter_paragraph_lines(fh):
     p_start = 0
     in_whitespace = False
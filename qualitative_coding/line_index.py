@@ -0,0 +1,140 @@
+from mmap import mmap, ACCESS_READ
+import numpy as np
+
+def scan_line_offsets(buffer, chunk_size=1 << 20):
+    """Returns (byte_offsets, char_offsets) for the lines of UTF-8 text in buffer.
+    offsets[i] is where line i starts, and offsets[-1] is the end of the text, so
+    line i spans offsets[i]:offsets[i+1]. Character offsets count characters as
+    they are read in text mode, where "\\r\\n" is read as "\\n". As with universal
+    newlines in text mode, lines end at "\\n", "\\r\\n", or a lone "\\r" (old Mac 
+    line endings). The buffer is scanned one chunk at a time.
+    """
+    size = len(buffer)
+    byte_starts = [np.zeros(1, dtype=np.int64)]
+    char_starts = [np.zeros(1, dtype=np.int64)]
+    skipped = 0
+    previous = 0
+    for chunk_start in range(0, size, chunk_size):
+        chunk = np.frombuffer(buffer, dtype=np.uint8, offset=chunk_start,
+                count=min(chunk_size, size - chunk_start))
+        chunk_end = chunk_start + len(chunk)
+        following = buffer[chunk_end:chunk_end + 1] or b"\0"
+        after = np.concatenate((chunk[1:], np.frombuffer(following, dtype=np.uint8)))
+        lone_returns = (chunk == ord("\r")) & (after != ord("\n"))
+        newlines = np.flatnonzero((chunk == ord("\n")) | lone_returns)
+        before = np.concatenate(([previous], chunk[:-1]))
+        # UTF-8 continuation bytes and the "\r" of "\r\n" do not count as characters.
+        not_chars = ((chunk & 0xC0) == 0x80) | ((chunk == ord("\n")) & (before == ord("\r")))
+        not_chars_so_far = np.cumsum(not_chars) + skipped
+        byte_starts.append(newlines + chunk_start + 1)
+        char_starts.append(newlines + chunk_start + 1 - not_chars_so_far[newlines])
+        skipped = int(not_chars_so_far[-1])
+        previous = chunk[-1]
+    byte_offsets = np.concatenate(byte_starts)
+    char_offsets = np.concatenate(char_starts)
+    if byte_offsets[-1] != size:
+        byte_offsets = np.append(byte_offsets, size)
+        char_offsets = np.append(char_offsets, size - skipped)
+    return byte_offsets, char_offsets
+
+def scan_file_line_offsets(path, chunk_size=1 << 20):
+    "Returns (byte_offsets, char_offsets) for the lines of a file. See scan_line_offsets."
+    with open(path, 'rb') as fh:
+        if fh.seek(0, 2) == 0:
+            return scan_line_offsets(b"")
+        with mmap(fh.fileno(), 0, access=ACCESS_READ) as buffer:
+            return scan_line_offsets(buffer, chunk_size=chunk_size)
+
+# Bytes which str.strip() removes: ASCII whitespace and the separators \x1c-\x1f.
+WHITESPACE_BYTES = np.array([9, 10, 11, 12, 13, 28, 29, 30, 31, 32], dtype=np.uint8)
+
+def scan_paragraphs(buffer, byte_offsets, chunk_size=1 << 20):
+    """Returns (starts, ends) arrays of line numbers for the paragraphs of UTF-8 text
+    in buffer, whose lines start at byte_offsets. As in helpers.iter_paragraph_lines,
+    a new paragraph starts at each non-blank line which follows a blank line, 
+    and a line is blank when line.strip() is empty. The buffer is scanned a chunk 
+    of whole lines at a time.
+    """
+    line_count = len(byte_offsets) - 1
+    if line_count == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    blank = np.empty(line_count, dtype=bool)
+    line = 0
+    while line < line_count:
+        limit = byte_offsets[line] + chunk_size
+        stop = min(max(line + 1, int(np.searchsorted(byte_offsets, limit, side="right")) - 1), line_count)
+        lo, hi = int(byte_offsets[line]), int(byte_offsets[stop])
+        chunk = np.frombuffer(buffer, dtype=np.uint8, offset=lo, count=hi - lo)
+        line_offsets = byte_offsets[line:stop + 1] - lo
+        visible = np.concatenate(([0], np.cumsum(~np.isin(chunk, WHITESPACE_BYTES))))
+        non_ascii = np.concatenate(([0], np.cumsum(chunk >= 0x80)))
+        visible_per_line = visible[line_offsets[1:]] - visible[line_offsets[:-1]]
+        non_ascii_per_line = non_ascii[line_offsets[1:]] - non_ascii[line_offsets[:-1]]
+        blank[line:stop] = visible_per_line == 0
+        # Lines whose only visible bytes are non-ASCII may be Unicode whitespace.
+        for i in np.flatnonzero((visible_per_line == non_ascii_per_line) & (non_ascii_per_line > 0)):
+            text = bytes(chunk[line_offsets[i]:line_offsets[i + 1]]).decode("utf-8")
+            blank[line + i] = text.strip() == ""
+        line = stop
+    starts = np.concatenate(([0], np.flatnonzero(blank[:-1] & ~blank[1:]) + 1))
+    ends = np.append(starts[1:], line_count)
+    return starts, ends
+
+def scan_file_paragraphs(path, byte_offsets, chunk_size=1 << 20):
+    "Returns (starts, ends) for the paragraphs of a file. See scan_paragraphs."
+    with open(path, 'rb') as fh:
+        if fh.seek(0, 2) == 0:
+            return scan_paragraphs(b"", byte_offsets)
+        with mmap(fh.fileno(), 0, access=ACCESS_READ) as buffer:
+            return scan_paragraphs(buffer, byte_offsets, chunk_size=chunk_size)
+
+def pack_offsets(offsets):
+    "Serializes an offsets array for storage"
+    return np.asarray(offsets, dtype="<i8").tobytes()
+
+def unpack_offsets(data):
+    "Deserializes an offsets array created by pack_offsets"
+    return np.frombuffer(data, dtype="<i8")
+
+class LineIndex:
+    """Byte offsets of the lines in a corpus file, so that ranges of lines can be
+    read without loading the whole file. offsets[i] is where line i starts, and
+    offsets[-1] is the file size. When offsets are not given (for example, from
+    QCCorpus.get_line_offsets), the file is scanned once. Lines are read through
+    mmap. Use as a context manager, or call close().
+    """
+    def __init__(self, path, offsets=None, chunk_size=1 << 20):
+        self.path = path
+        self.file = open(path, 'rb')
+        size = self.file.seek(0, 2)
+        self.mmap = mmap(self.file.fileno(), 0, access=ACCESS_READ) if size else None
+        if offsets is None:
+            buffer = self.mmap if self.mmap is not None else b""
+            offsets, _ = scan_line_offsets(buffer, chunk_size=chunk_size)
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def read_lines(self, start, stop):
+        """Returns lines [start, stop) as strings with line endings, like iterating
+        over the file in text mode. The range is clamped to the file.
+        """
+        start = min(max(start, 0), len(self))
+        stop = min(max(stop, start), len(self))
+        if start == stop:
+            return []
+        text = self.mmap[self.offsets[start]:self.offsets[stop]].decode("utf-8")
+        *lines, last = text.replace("\r\n", "\n").replace("\r", "\n").split("\n")
+        return [line + "\n" for line in lines] + ([last] if last else [])
+
+    def close(self):
+        if self.mmap is not None:
+            self.mmap.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
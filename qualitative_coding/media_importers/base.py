@@ -1,12 +1,23 @@
 
+from concurrent.futures import ProcessPoolExecutor
+
 class BaseMediaImporter:
     """Base class for media importers.
     The API for MediaImporters is a single method, `import_media`, which 
-    takes an input filename and an output filename.
+    takes an input filename and an output filename. `check_requirements` is 
+    called once before importing. When importing with several jobs, 
+    `import_media` runs in a pool created by `executor`; importers whose work 
+    happens outside the Python interpreter may use a ThreadPoolExecutor.
     """
+    executor = ProcessPoolExecutor
+
     def __init__(self, settings):
         self.settings = settings
 
+    def check_requirements(self):
+        "Raises QCError if the importer cannot run."
+        pass
+
     def import_media(self, input_filename, output_filename):
         raise NotImplementedError("Subclasses of BaseMediaImporter should be used.")
 
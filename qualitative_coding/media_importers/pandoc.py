@@ -1,16 +1,23 @@
 from subprocess import run, CalledProcessError
+from shutil import which
+from concurrent.futures import ThreadPoolExecutor
 from qualitative_coding.media_importers.base import BaseMediaImporter
 from qualitative_coding.exceptions import QCError
 
 class PandocImporter(BaseMediaImporter):
+    executor = ThreadPoolExecutor
+
     def import_media(self, input_filename, output_filename):
-        self.check_for_pandoc()
         cmd = f'pandoc -i "{input_filename}" -o "{output_filename}" --to plain --columns 80'
-        run(cmd, shell=True, check=True)
+        try:
+            run(cmd, shell=True, check=True, capture_output=True, text=True)
+        except CalledProcessError as err:
+            raise QCError(f"pandoc could not convert {input_filename}: {err.stderr.strip()}")
+
+    def check_requirements(self):
+        self.check_for_pandoc()
 
     def check_for_pandoc(self):
-        try:
-            run("which pandoc", shell=True, check=True, capture_output=True)
-        except CalledProcessError:
+        if which("pandoc") is None:
             raise QCError("pandoc is required but was not found. Please install pandoc.")
 
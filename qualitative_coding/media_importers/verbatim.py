@@ -1,9 +1,12 @@
 import shutil
+from concurrent.futures import ThreadPoolExecutor
 from qualitative_coding.media_importers.base import BaseMediaImporter
 
 class VerbatimImporter(BaseMediaImporter):
     """Imports media without making any changes.
     """
+    executor = ThreadPoolExecutor
+
     def import_media(self, input_filename, output_filename):
         if input_filename != output_filename:
             shutil.copyfile(input_filename, output_filename)
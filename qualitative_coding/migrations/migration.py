@@ -40,3 +40,19 @@ class QCMigration:
         del settings[key]
         Path(settings_path).write_text(yaml.dump(settings))
         return settings
+
+    def add_column(self, engine, table, column, column_type):
+        """Adds a column to a database table, unless it already exists.
+        """
+        with engine.begin() as conn:
+            columns = [row[1] for row in conn.exec_driver_sql(f"PRAGMA table_info({table})")]
+            if column not in columns:
+                conn.exec_driver_sql(f"ALTER TABLE {table} ADD COLUMN {column} {column_type}")
+
+    def drop_column(self, engine, table, column):
+        """Drops a column from a database table, if it exists.
+        """
+        with engine.begin() as conn:
+            columns = [row[1] for row in conn.exec_driver_sql(f"PRAGMA table_info({table})")]
+            if column in columns:
+                conn.exec_driver_sql(f"ALTER TABLE {table} DROP COLUMN {column}")
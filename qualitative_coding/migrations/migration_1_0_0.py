@@ -37,9 +37,12 @@ class Migrate_1_0_0(QCMigration):
         with corpus.session():
             for filepath in corpus.corpus_dir.iterdir():
                 if filepath.is_dir():
-                    corpus.import_media(filepath, recursive=True, importer="verbatim")
+                    failures = corpus.import_media(filepath, recursive=True, importer="verbatim")
                 else:
-                    corpus.import_media(filepath, importer="verbatim")
+                    failures = corpus.import_media(filepath, importer="verbatim")
+                if failures:
+                    source, message = failures[0]
+                    raise QCError(f"Could not import {source}: {message}")
             for dir_path, dir_names, filenames in os.walk(corpus.corpus_dir):
                 for fn in filenames:
                     file_path = Path(dir_path) / fn
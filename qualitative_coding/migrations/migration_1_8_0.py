@@ -0,0 +1,108 @@
+from qualitative_coding.migrations.migration import QCMigration
+from qualitative_coding.corpus import QCCorpus
+from qualitative_coding.database.models import Base, CodeCountSummary
+from sqlalchemy.schema import CreateTable
+
+class Migrate_1_8_0(QCMigration):
+    """Adds secondary indexes supporting the most frequent queries: 
+    fetching and counting coded lines, and looking up paragraphs.
+    Also adds database_pragmas to settings, file stat columns to 
+    document so that unchanged files need not be rehashed, and line offset
+    columns so that line positions need not be recomputed. Foreign keys 
+    cascade on delete, so that documents and coders can be deleted with 
+    a few statements. Creates and populates the code count summary.
+    """
+    _version = "1.8.0"
+
+    index_names = [
+        "ix_coded_line_code",
+        "ix_coded_line_coder",
+        "ix_location_document_index",
+        "ix_coded_line_location_association_location",
+        "ix_document_index_name",
+        "ix_code_count_summary_code",
+        "ix_code_count_summary_coder",
+    ]
+
+    document_stat_columns = ["file_size", "file_mtime_ns", "file_inode"]
+    document_line_offset_columns = ["line_byte_offsets", "line_char_offsets"]
+
+    # Tables whose foreign keys gain ON DELETE CASCADE.
+    cascade_table_names = [
+        "document_index",
+        "location",
+        "coded_line",
+        "coded_line_location_association",
+    ]
+
+    def apply(self, settings_path):
+        self.set_setting(settings_path, "qc_version", "1.8.0")
+        self.set_setting(settings_path, "database_pragmas", {
+            'journal_mode': 'WAL',
+            'synchronous': 'NORMAL',
+            'mmap_size': 268435456,
+            'cache_size': -65536,
+            'temp_store': 'MEMORY',
+        })
+        self.set_setting(settings_path, "code_count_summary", True)
+        corpus = QCCorpus(settings_path)
+        for column in self.document_stat_columns:
+            self.add_column(corpus.engine, "document", column, "INTEGER")
+        for column in self.document_line_offset_columns:
+            self.add_column(corpus.engine, "document", column, "BLOB")
+        self.rebuild_tables(corpus.engine, self.cascade_table_names)
+        CodeCountSummary.__table__.create(corpus.engine, checkfirst=True)
+        for index in self.get_indexes():
+            index.create(corpus.engine, checkfirst=True)
+        with corpus.session():
+            for doc in corpus.get_documents():
+                path = corpus.corpus_dir / doc.file_path
+                if path.exists():
+                    corpus.set_document_line_offsets(doc, path)
+            corpus.get_session().commit()
+            corpus.rebuild_code_count_summary()
+
+    def revert(self, settings_path):
+        "Cascading foreign keys are left in place; earlier versions do not depend on them."
+        corpus = QCCorpus(settings_path)
+        for index in self.get_indexes():
+            index.drop(corpus.engine, checkfirst=True)
+        CodeCountSummary.__table__.drop(corpus.engine, checkfirst=True)
+        for column in self.document_stat_columns + self.document_line_offset_columns:
+            self.drop_column(corpus.engine, "document", column)
+        self.set_setting(settings_path, "qc_version", "1.4.0")
+        self.delete_setting(settings_path, "database_pragmas")
+        self.delete_setting(settings_path, "code_count_summary")
+
+    def rebuild_tables(self, engine, table_names):
+        """SQLite cannot alter a table's foreign keys, so each table is rebuilt 
+        with its current definition: a new table is created and filled, the old 
+        table is dropped, and the new table takes its name. Foreign key 
+        enforcement is suspended during the rebuild. Indexes are dropped 
+        with the old tables; apply recreates them.
+        """
+        with engine.connect() as conn:
+            foreign_keys = conn.exec_driver_sql("PRAGMA foreign_keys").scalar()
+            conn.exec_driver_sql("PRAGMA foreign_keys = OFF")
+            conn.commit()
+            try:
+                for name in table_names:
+                    table = Base.metadata.tables[name]
+                    ddl = str(CreateTable(table).compile(engine))
+                    ddl = ddl.replace(f"CREATE TABLE {name} ", f"CREATE TABLE {name}__new ", 1)
+                    columns = ", ".join(column.name for column in table.columns)
+                    conn.exec_driver_sql(ddl)
+                    conn.exec_driver_sql(
+                        f"INSERT INTO {name}__new ({columns}) SELECT {columns} FROM {name}"
+                    )
+                    conn.exec_driver_sql(f"DROP TABLE {name}")
+                    conn.exec_driver_sql(f"ALTER TABLE {name}__new RENAME TO {name}")
+                conn.commit()
+            finally:
+                conn.rollback()
+                conn.exec_driver_sql(f"PRAGMA foreign_keys = {'ON' if foreign_keys else 'OFF'}")
+                conn.commit()
+
+    def get_indexes(self):
+        indexes = {ix.name: ix for table in Base.metadata.tables.values() for ix in table.indexes}
+        return [indexes[name] for name in self.index_names]
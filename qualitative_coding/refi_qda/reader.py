@@ -1,14 +1,13 @@
 from qualitative_coding.exceptions import QCError
 from qualitative_coding.corpus import QCCorpus
 from qualitative_coding.tree_node import TreeNode
-from xmlschema.validators.exceptions import XMLSchemaValidationError
+from qualitative_coding.refi_qda.schema import iter_validation_errors
 from collections import defaultdict
+from itertools import islice
 from subprocess import run
-from xmlschema import validate
 from pathlib import Path
 import re
 import xml.etree.ElementTree as ET
-import importlib.resources
 import shutil
 import zipfile
 import structlog
@@ -17,56 +16,70 @@ log = structlog.get_logger()
 
 class REFIQDAReader:
     """Imports an existing REFI-QDA project.
+    project.qde is streamed with iterparse, so that each Source is processed and
+    discarded as soon as it has been read, and source files are read directly
+    from the qdpx file rather than extracting the whole archive.
     NOTE: Currently does not support importing memos.
     """
     default_coder = "default"
+    unsupported = ["Variables", "Cases", "Notes", "Links", "Graphs", "Description", "NoteRef"]
 
-    def __init__(self, qdpxfile):
+    def __init__(self, qdpxfile, validate_schema=True):
         self.qdpxfile = qdpxfile
-        self.validate(qdpxfile)
+        self.validate(qdpxfile, validate_schema=validate_schema)
 
-    def unpack_project(self, destination):
+    def unpack_project(self, destination, jobs=1):
+        """Creates a new project in destination from the qdpx file. Source files
+        are imported by a pool of `jobs` workers once project.qde has been read.
+        """
         self.dest_path = Path(destination)
         if not self.dest_path.exists():
-            raise QCError(f"Cannot import project to {dest_path}; no such directory.")
+            raise QCError(f"Cannot import project to {self.dest_path}; no such directory.")
         if len(list(self.dest_path.iterdir())) > 0:
             raise QCError("You can only import a project into an empty directory.")
         QCCorpus.initialize()
         self.corpus = QCCorpus(self.dest_path / "settings.yaml")
-        (self.dest_path / "source").mkdir()
-        (self.dest_path / "source" / "import").mkdir()
+        self.import_dir = self.dest_path / "source" / "import"
+        self.import_dir.mkdir(parents=True)
         with zipfile.ZipFile(self.qdpxfile, 'r', zipfile.ZIP_DEFLATED) as zf:
-            zf.extractall((self.dest_path / "source"))
-        tree = ET.parse(self.dest_path / "source" / "project.qde")
-        with self.corpus.session():
-            self.unpack_xml(tree.getroot())
-
-    def unpack_xml(self, root):
+            with self.corpus.session():
+                with zf.open("project.qde") as qde:
+                    self.unpack_xml(zf, qde)
+                self.import_sources(jobs)
+
+    def unpack_xml(self, zf, qde):
+        """Reads project.qde incrementally. Each child of the Project is handled
+        when its end tag is read, and each Source is cleared once it has been
+        unpacked, so only one Source is held in memory at a time.
+        """
         self.coder_guids = {}
-        for child in root:
-            if child.tag.endswith("Users"):
-                self.unpack_coders(child)
-        for child in root:
-            if child.tag.endswith("CodeBook"):
-                self.unpack_codebook(child)
-        for child in root:
-            if child.tag.endswith("Variables"):
-                log.warning("{self.qdpxfile} contains Variables, which are not supported by qc.")
-        self.unpack_unsupported(root, "Variables")
-        self.unpack_unsupported(root, "Cases")
-        for child in root:
-            if child.tag.endswith("Sources"):
-                self.unpack_sources(child)
-        self.unpack_unsupported(root, "Notes")
-        self.unpack_unsupported(root, "Links")
-        self.unpack_unsupported(root, "Graphs")
-        self.unpack_unsupported(root, "Description")
-        self.unpack_unsupported(root, "NoteRef")
-
-    def unpack_unsupported(self, root, tagname):
-        for child in root:
-            if child.tag.endswith(tagname):
-                log.warning(f"{self.qdpxfile} contains {tagname}, which are not supported by qc.")
+        self.code_guids = {}
+        self.sources = []
+        path = []
+        for event, element in ET.iterparse(qde, events=("start", "end")):
+            if event == "start":
+                path.append(self.local_name(element))
+                continue
+            path.pop()
+            if len(path) == 1:
+                self.unpack_element(zf, element)
+                element.clear()
+            elif len(path) == 2 and path[1] == "Sources":
+                self.unpack_source(zf, element)
+                element.clear()
+
+    def unpack_element(self, zf, element):
+        tag = self.local_name(element)
+        if tag == "Users":
+            self.unpack_coders(element)
+        elif tag == "CodeBook":
+            self.unpack_codebook(element)
+        elif tag in self.unsupported:
+            log.warning(f"{self.qdpxfile} contains {tag}, which are not supported by qc.")
+
+    def local_name(self, element):
+        "Returns an element's tag without its namespace"
+        return element.tag.rsplit("}", 1)[-1]
 
     def unpack_coders(self, users):
         for user in users:
@@ -80,20 +93,18 @@ class REFIQDAReader:
             self.corpus.get_or_create_coder("default")
 
     def unpack_codebook(self, codebook):
+        self.code_tree = TreeNode(TreeNode.root)
         for child in codebook:
             self.unpack_codes(child)
+        TreeNode.write_yaml(self.corpus.codebook_path, self.code_tree)
 
     def unpack_codes(self, codes):
-        self.code_guids = {}
-        self.code_tree = TreeNode(TreeNode.root)
-
         def unpack_code(code, parent):
             name = code.attrib['name']
             guid = code.attrib['guid']
             self.corpus.get_or_create_code(name)
             self.code_guids[guid] = name
-            node = TreeNode(name, parent=parent)
-            parent.children.append(node)
+            node = parent.add_child(name)
             for child in code:
                 if child.tag.endswith("Code"):
                     unpack_code(child, node)
@@ -101,87 +112,86 @@ class REFIQDAReader:
         for code in codes:
             unpack_code(code, self.code_tree)
 
-        TreeNode.write_yaml(self.corpus.codebook_path, self.code_tree)
-
-    def unpack_sources(self, sources):
-        self.document_guids = {}
-        for source in sources:
-            if not source.attrib.get('plainTextPath'):
-                log.warning(
-                    f"Skipping import of source {source['name']}; " + 
-                    "only text sources are supported."
-                )
-                continue
-            guid = source.attrib['guid']
-            plain_text_path = source.attrib['plainTextPath'].replace("internal://", "")
-            qdpx_path = self.dest_path / "source" / "sources" / plain_text_path
-            importable_path = (self.dest_path / "source" / "import" / source.attrib['name']).with_suffix(
-                qdpx_path.suffix
+    def unpack_source(self, zf, source):
+        """Copies a text source's file out of the qdpx file and records its
+        selections as (coder, line, position, code), where line is None when
+        it must be found from the character position.
+        """
+        if not source.attrib.get('plainTextPath'):
+            log.warning(
+                f"Skipping import of source {source.attrib.get('name')}; " +
+                "only text sources are supported."
             )
-            log.info(f"Copying {qdpx_path} -> {importable_path}")
-            shutil.copyfile(qdpx_path, importable_path)
-            self.document_guids[guid] = importable_path.name
-            self.corpus.import_media(importable_path, importer="verbatim")
-            line_positions = self.line_positions(importable_path)
+            return
+        plain_text_path = source.attrib['plainTextPath'].replace("internal://", "")
+        importable_path = (self.import_dir / source.attrib['name']).with_suffix(
+            Path(plain_text_path).suffix
+        )
+        log.info(f"Copying {plain_text_path} -> {importable_path}")
+        with zf.open("sources/" + plain_text_path) as src, open(importable_path, 'wb') as dest:
+            shutil.copyfileobj(src, dest)
+        selections = []
+        for selection in source:
+            if selection.tag.endswith("PlainTextSelection"):
+                match = re.match(r"line:(\d+)", selection.attrib.get("name", ""))
+                line = int(match.group(1)) if match else None
+                position = int(selection.attrib['startPosition'])
+                for coding in selection:
+                    if coding.tag.endswith("Coding"):
+                        coder_guid = coding.attrib['creatingUser']
+                        coder = self.coder_guids.get(coder_guid, self.default_coder)
+                        for coderef in coding:
+                            if coderef.tag.endswith("CodeRef"):
+                                code = self.code_guids[coderef.attrib['targetGUID']]
+                                selections.append((coder, line, position, code))
+        self.sources.append((importable_path, selections))
+
+    def import_sources(self, jobs=1):
+        """Imports all source files at once, and then writes each source's coded
+        lines. Character positions are resolved to lines using the document's
+        line offsets.
+        """
+        failures = self.corpus.import_media(self.import_dir, recursive=True,
+                importer="verbatim", jobs=jobs)
+        if failures:
+            failed_path, message = failures[0]
+            raise QCError(f"Could not import {failed_path}: {message}")
+        for importable_path, selections in self.sources:
+            corpus_path = self.corpus.corpus_dir / importable_path.with_suffix(".txt").name
+            unresolved = [position for coder, line, position, code in selections if line is None]
+            resolved = iter(self.corpus.get_lines_for_char_positions(corpus_path, unresolved))
             coded_lines = defaultdict(list)
-            for selection in source:
-                if selection.tag.endswith("PlainTextSelection"):
-                    match = re.match("line:(\d+)", selection.attrib.get("name", ""))
-                    if match:
-                        line = int(match.group(1))
-                    else:
-                        position = int(selection.attrib['startPosition'])
-                        line = self.get_line_for_position(position, line_positions)
-                    for coding in selection:
-                        if coding.tag.endswith("Coding"):
-                            coder_guid = coding.attrib['creatingUser']
-                            coder = self.coder_guids.get(coder_guid, self.default_coder)
-                            for coderef in coding:
-                                if coderef.tag.endswith("CodeRef"):
-                                    code = self.code_guids[coderef.attrib['targetGUID']]
-                                    coded_lines[coder].append({'line': line, 'code_id': code})
+            for coder, line, position, code in selections:
+                if line is None:
+                    line = next(resolved)
+                coded_lines[coder].append({'line': line, 'code_id': code})
             for coder, cls in coded_lines.items():
                 self.corpus.update_coded_lines(importable_path.name, coder, cls)
 
-    def get_line_for_position(self, position, line_positions):
-        for line, (start, end) in enumerate(line_positions):
-            if position >= start:
-                return line
-
-    def validate(self, qdpxfile):
+    def validate(self, qdpxfile, validate_schema=True, max_errors=10):
+        """Checks that qdpxfile is a zipfile containing project.qde. When
+        validate_schema is True, project.qde is also validated against the
+        REFI-QDA schema, streaming it from the zipfile. Up to max_errors 
+        validation errors are reported. Skip schema validation for trusted files.
+        """
         if not Path(qdpxfile).suffix == ".qdpx":
             raise QCError(f"{qdpxfile} must end in .qdpx")
         if not zipfile.is_zipfile(qdpxfile):
             raise QCError(f"{qdpxfile} is not a zipfile")
         with zipfile.ZipFile(qdpxfile, 'r', zipfile.ZIP_DEFLATED) as zf:
-            zroot = zipfile.Path(zf)
-            qde = zroot / "project.qde"
-            if not qde.exists():
-                raise QCError("{qdpxfile} does not contain project.qde")
-            qcf = importlib.resources.files("qualitative_coding")
-            schema_path = qcf / "refi_qda" / "schema.xsd"
-            try:
-                validate(qde.read_text(), schema_path)
-            except XMLSchemaValidationError as err:
+            if "project.qde" not in zf.namelist():
+                raise QCError(f"{qdpxfile} does not contain project.qde")
+            if not validate_schema:
+                return
+            with zf.open("project.qde") as qde:
+                errors = list(islice(iter_validation_errors(qde), max_errors))
+            if errors:
                 raise QCError(
-                    f"When reading {qdpxfile}, project.qde did not validate " + 
-                    f"against the REFI-QDA schema:\n" + 
-                    repr(err)
+                    f"When reading {qdpxfile}, project.qde did not validate " +
+                    f"against the REFI-QDA schema:\n" +
+                    "\n".join(repr(err) for err in errors)
                 )
 
-    def line_positions(self, corpus_file_path):
-        """returns a list of (start, end) character positions for lines in doc.
-        """
-        text = (self.corpus.corpus_dir / corpus_file_path).read_text()
-        lines = []
-        index = 0
-        for line in text:
-            start = index
-            end = index + len(line)
-            lines.append((start, end))
-            index += len(line)
-        return lines
-
     def print_tree(self, project_path):
         result = run("tree", cwd=project_path, capture_output=True, text=True, shell=True)
         print(result.stdout)
@@ -0,0 +1,64 @@
+from functools import lru_cache
+from hashlib import sha1
+from pathlib import Path
+import importlib.resources
+import os
+import pickle
+import sys
+import xmlschema
+import structlog
+
+log = structlog.get_logger()
+
+def schema_path():
+    "Returns the path to the REFI-QDA project schema"
+    return importlib.resources.files("qualitative_coding") / "refi_qda" / "schema.xsd"
+
+def schema_cache_dir():
+    """Returns the directory where compiled schemas are cached. This is
+    $QC_CACHE_DIR when set, and otherwise qualitative-coding in the user's cache dir.
+    The cache dir must be trusted: cached schemas are loaded with pickle, which can 
+    run arbitrary code, so it should be writable only by the user running qc.
+    """
+    if "QC_CACHE_DIR" in os.environ:
+        return Path(os.environ["QC_CACHE_DIR"])
+    cache_home = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(cache_home) / "qualitative-coding"
+
+@lru_cache
+def get_schema():
+    """Returns the compiled REFI-QDA schema. Compiling schema.xsd is slow, so the
+    compiled XMLSchema is cached in process and pickled to the cache dir, keyed by
+    a hash of the schema, the xmlschema version, and the Python version. The 
+    cache dir is trusted (see schema_cache_dir). A cache file which cannot be 
+    loaded, for example one written by another version of a dependency, is 
+    deleted and the schema is recompiled.
+    """
+    source = schema_path().read_bytes()
+    versions = f"{xmlschema.__version__}:{sys.version}".encode()
+    key = sha1(source + versions).hexdigest()
+    cache_path = schema_cache_dir() / f"refi_qda_schema_{key}.pickle"
+    try:
+        with open(cache_path, 'rb') as fh:
+            return pickle.load(fh)
+    except FileNotFoundError:
+        pass
+    except Exception as err:
+        log.warning(f"Could not load the cached REFI-QDA schema at {cache_path}: {err!r}")
+        cache_path.unlink(missing_ok=True)
+    schema = xmlschema.XMLSchema(str(schema_path()))
+    try:
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(cache_path, 'wb') as fh:
+            pickle.dump(schema, fh)
+    except OSError as err:
+        log.warning(f"Could not cache the REFI-QDA schema at {cache_path}: {err}")
+    return schema
+
+def iter_validation_errors(source):
+    """Validates a REFI-QDA project, yielding each validation error.
+    source may be a path or a file object, and is read lazily, so that large
+    projects are streamed rather than loaded into memory.
+    """
+    resource = xmlschema.XMLResource(source, lazy=True)
+    yield from get_schema().iter_errors(resource)
@@ -1,20 +1,16 @@
 from qualitative_coding.corpus import QCCorpus
 from qualitative_coding.exceptions import QCError, InvalidParameter
-from tempfile import TemporaryDirectory
-from shutil import copyfile
 from pathlib import Path
-from subprocess import run
-from collections import defaultdict
-from hashlib import md5
-import os
+from hashlib import md5, sha1
+from contextlib import ExitStack
+from io import BytesIO
+from itertools import groupby
+from operator import itemgetter
 from importlib.metadata import metadata
-from zipfile import ZipFile, ZIP_DEFLATED
-from uuid import UUID
-from xml.etree.ElementTree import (
-    Element,
-    Comment,
-    tostring,
-)
+from zipfile import ZipFile, ZIP_DEFLATED, BadZipFile
+from xml.etree.ElementTree import Element
+from xml.sax.saxutils import XMLGenerator
+import json
 import structlog
 
 log = structlog.get_logger()
@@ -27,56 +23,128 @@ class REFIQDAWriter:
         self.settings = settings
         self.corpus = QCCorpus(settings)
         self.debug = debug
+        self.guid_cache = {}
 
-    def write(self, outpath):
-        """Write a zip file at the given outpath
+    def write(self, outpath, incremental=False):
+        """Write a zip file at the given outpath.
+        project.qde is streamed into the zip file as it is generated, and corpus 
+        files are added to the zip file directly from the corpus. The zip file is
+        written to a temporary file, which then replaces outpath.
+
+        When incremental is True, a manifest recording each document's file hash, 
+        a checksum of its coded lines, and the position of its TextSource in 
+        project.qde is saved alongside outpath (see manifest_path). On the next 
+        incremental export, TextSources of documents whose text and coded lines 
+        are unchanged are copied from the previous project.qde rather than rebuilt.
         """
-        if Path(outpath).suffix != ".qdpx":
+        outpath = Path(outpath)
+        if outpath.suffix != ".qdpx":
             raise InvalidParameter("REFI-QDA projects must have suffix .qdpx")
-        with TemporaryDirectory() as tempdir:
-            project_path = Path(tempdir)
-            qde = self.write_xml(project_path / "project.qde")
-            self.write_corpus(qde, project_path / "sources")
-            if self.debug:
-                self.print_tree(project_path)
-            with ZipFile(outpath, 'w', ZIP_DEFLATED) as zf:
-                for dirpath, dirnames, filenames in os.walk(tempdir):
-                    for fn in filenames:
-                        path = Path(dirpath) / fn
-                        zf.write(path, arcname=path.relative_to(tempdir))
+        previous = self.read_manifest(outpath) if incremental else None
+        temp_path = outpath.with_name(outpath.name + ".tmp")
+        with ExitStack() as stack:
+            previous_qde = None
+            if previous:
+                previous_zf = stack.enter_context(ZipFile(outpath))
+                previous_qde = stack.enter_context(previous_zf.open("project.qde"))
+            with ZipFile(temp_path, 'w', ZIP_DEFLATED) as zf:
+                with zf.open("project.qde", 'w') as qde:
+                    manifest = self.write_xml_stream(qde, previous, previous_qde, 
+                            incremental=incremental)
+                self.write_corpus(zf)
+                if self.debug:
+                    zf.printdir()
+        temp_path.replace(outpath)
+        if incremental:
+            with ZipFile(outpath) as zf:
+                manifest["qde_crc"] = zf.getinfo("project.qde").CRC
+            self.manifest_path(outpath).write_text(json.dumps(manifest))
 
     def write_xml(self, outpath):
-        root = self.xml_root()
-        root.append(self.users_to_xml())
-        root.append(self.codebook_to_xml())
-        root.append(self.sources_to_xml())
-        if self.debug:
-            print(tostring(root, encoding="unicode"))
-        outpath.write_text(tostring(root, encoding="unicode"))
-        return root
-
-    def write_corpus(self, qde, outpath):
-        outpath.mkdir()
-        for child in qde:
-            if child.tag.endswith("Sources"):
-                for source in child:
-                    project_path = self.corpus.corpus_dir / source.attrib['name']
-                    export_path = outpath / source.attrib['plainTextPath'].replace("internal://", "")
-                    log.info(f"Copying {project_path} -> {export_path}")
-                    copyfile(project_path, export_path)
-
-    def print_tree(self, project_path):
-        result = run("tree", cwd=project_path, capture_output=True, text=True, shell=True)
-        print(result.stdout)
-
-    def xml_root(self):
-        root = Element("Project")
-        root.set("xmlns", "urn:QDA-XML:project:1.0")
-        root.set("xmlns:xsi", "http://www.w3.org/2001/XMLSchema-instance")
+        "Write project.qde at the given outpath"
+        with open(outpath, 'wb') as qde:
+            self.write_xml_stream(qde)
+
+    def write_xml_stream(self, stream, previous=None, previous_qde=None, incremental=False):
+        """Writes project.qde to a binary stream, one TextSource at a time, 
+        so that memory use does not grow with the size of the project.
+        When a previous manifest and the previous project.qde are given, 
+        unchanged TextSources are copied from previous_qde. 
+        Returns a manifest for the project.qde which was written; document file
+        hashes are only recorded when incremental is True.
+        """
+        head = BytesIO()
+        xml = XMLGenerator(head, encoding="utf-8", short_empty_elements=True)
+        xml.startDocument()
+        xml.startElement("Project", self.root_attributes())
+        self.write_element(xml, self.users_to_xml())
+        self.write_element(xml, self.codebook_to_xml())
+        xml.endDocument()
+        codes_checksum = self.checksum(sorted(self.code_guids.items()))
+        if previous and previous["codes"] != codes_checksum:
+            log.info("The codebook has changed; rewriting all sources")
+            previous = None
+        stream.write(head.getvalue())
+        with self.corpus.session():
+            documents = self.write_sources(stream, len(head.getvalue()), 
+                    previous["documents"] if previous else {}, previous_qde, 
+                    incremental=incremental)
+        stream.write(b"</Project>")
+        return {"codes": codes_checksum, "documents": documents}
+
+    def write_element(self, xml, element):
+        "Writes an Element and its children to an XMLGenerator"
+        xml.startElement(element.tag, element.attrib)
+        for child in element:
+            self.write_element(xml, child)
+        xml.endElement(element.tag)
+
+    def manifest_path(self, outpath):
+        "Returns the path of the manifest for an incremental export to outpath"
+        outpath = Path(outpath)
+        return outpath.with_name(outpath.name + ".manifest.json")
+
+    def read_manifest(self, outpath):
+        """Reads the manifest of a previous incremental export to outpath. 
+        Returns None when there is no previous export, or when outpath is 
+        not the export described by the manifest.
+        """
+        manifest_path = self.manifest_path(outpath)
+        if not (Path(outpath).exists() and manifest_path.exists()):
+            return None
+        try:
+            manifest = json.loads(manifest_path.read_text())
+            with ZipFile(outpath) as zf:
+                if zf.getinfo("project.qde").CRC == manifest["qde_crc"]:
+                    return manifest
+        except (OSError, ValueError, KeyError, BadZipFile) as err:
+            log.warning(f"Could not read manifest {manifest_path}: {err}")
+            return None
+        log.info(f"{outpath} has changed since {manifest_path} was written; rewriting all sources")
+        return None
+
+    def checksum(self, values):
+        "Returns a checksum of a list of tuples of strings and ints"
+        return sha1("\n".join(":".join(map(str, value)) for value in values).encode('utf8')).hexdigest()
+
+    def write_corpus(self, zf):
+        "Adds each corpus document to the zip file at its plainTextPath"
+        with self.corpus.session():
+            file_paths = list(self.corpus.get_document_keys())
+        for file_path in file_paths:
+            project_path = self.corpus.corpus_dir / file_path
+            export_path = "sources/" + self.source_internal_path(file_path)
+            log.info(f"Adding {project_path} -> {export_path}")
+            zf.write(project_path, arcname=export_path)
+
+    def root_attributes(self):
         version = metadata('qualitative-coding')['version']
-        root.set("origin", f"qc {version}")
-        root.set("name", "qc project")
-        return root
+        return {
+            "xmlns": "urn:QDA-XML:project:1.0",
+            "xmlns:xsi": "http://www.w3.org/2001/XMLSchema-instance",
+            "origin": f"qc {version}",
+            "name": "qc project",
+        }
 
     def codebook_to_xml(self):
         """Render the codebook as XML.
@@ -114,60 +182,112 @@ class REFIQDAWriter:
             for coder in self.corpus.get_all_coders():
                 user = Element("User")
                 user.set("name", coder.name)
-                user.set("guid", self.guid(coder.name))
+                user.set("guid", self.coder_guid(coder.name))
                 users.append(user)
         return users
 
-    def sources_to_xml(self):
-        sources = Element("Sources")
-        with self.corpus.session():
-            sources = Element("Sources")
-            for doc in self.corpus.get_documents():
-                source = Element("TextSource")
-                source_guid = self.guid(doc.file_path)
-                suffix = Path(doc.file_path).suffix
-                internal_path = str(Path(source_guid).with_suffix(suffix))
-                source.set("plainTextPath", "internal://" + internal_path)
-                source.set("guid", source_guid)
-                source.set("name", doc.file_path)
-                doc_line_positions = self.line_positions(doc.file_path)
-                coded_lines = self.corpus.get_coded_lines(file_list=[doc.file_path])
-                lines_with_codes = defaultdict(list)
-                for cl in coded_lines:
-                    lines_with_codes[cl.line].append(cl)
-                for line, cls in lines_with_codes.items():
-                    selection = Element("PlainTextSelection")
-                    selection.set("guid", self.selection_guid(doc.file_path, line))
-                    selection.set("name", f"line:{line}")
-                    selection.set("startPosition", str(doc_line_positions[line][0]))
-                    selection.set("endPosition", str(doc_line_positions[line][1]))
-                    for code, coder, line, file_path in cls:
-                        coding = Element("Coding")
-                        coding.set("guid", self.coding_guid(code, coder, line, file_path))
-                        coding.set("creatingUser", self.coder_guid(coder))
-                        code_ref = Element("CodeRef")
-                        code_ref.set("targetGUID", self.code_guids[code])
-                        coding.append(code_ref)
-                        selection.append(coding)
-                    source.append(selection)
-                sources.append(source)
-        return sources
-
-    def line_positions(self, corpus_file_path):
-        """returns a list of (start, end) character positions for lines in doc.
+    def write_sources(self, stream, position=0, previous=None, previous_qde=None, 
+            incremental=False):
+        """Writes Sources to a binary stream, with a TextSource for each document 
+        and a PlainTextSelection for each coded line. All coded lines are read in 
+        one query, ordered by document and line, and streamed alongside the 
+        (identically ordered) documents. position is the offset in project.qde 
+        at which Sources begins. 
+        
+        previous maps file paths to manifest entries from a previous export; 
+        when the hash of a document's file on disk and its coded lines checksum 
+        are unchanged, its TextSource is read from previous_qde. The file on disk
+        is hashed, rather than using the hash in the database, because it is the
+        file on disk which is added to the zip file. Files are only hashed when 
+        incremental is True; otherwise file_hash is None and nothing is reused. 
+        Returns manifest entries for the documents written.
+        """
+        previous = previous or {}
+        stream.write(b"<Sources>")
+        position += len(b"<Sources>")
+        documents = {}
+        reused = 0
+        coded_lines_by_doc = groupby(self.corpus.iter_coded_lines(), key=itemgetter(3))
+        next_doc = next(coded_lines_by_doc, None)
+        for file_path in self.corpus.get_document_keys():
+            file_hash = None
+            if incremental:
+                file_hash = self.corpus.hash_file(self.corpus.corpus_dir / file_path)
+            coded_lines = []
+            if next_doc is not None and next_doc[0] == file_path:
+                coded_lines = list(next_doc[1])
+                next_doc = next(coded_lines_by_doc, None)
+            coded_lines_checksum = self.checksum(coded_lines)
+            entry = previous.get(file_path)
+            if (
+                incremental and 
+                entry and 
+                entry["file_hash"] == file_hash and 
+                entry["coded_lines"] == coded_lines_checksum
+            ):
+                previous_qde.seek(entry["start"])
+                fragment = previous_qde.read(entry["end"] - entry["start"])
+                reused += 1
+            else:
+                fragment = self.source_to_xml(file_path, coded_lines)
+            stream.write(fragment)
+            documents[file_path] = {
+                "file_hash": file_hash,
+                "coded_lines": coded_lines_checksum,
+                "start": position,
+                "end": position + len(fragment),
+            }
+            position += len(fragment)
+        stream.write(b"</Sources>")
+        if previous:
+            log.info(f"Reused {reused} of {len(documents)} sources from the previous export")
+        return documents
+
+    def source_to_xml(self, file_path, coded_lines):
+        """Renders a document's TextSource, with a PlainTextSelection for each coded
+        line. coded_lines are (code, coder, line, file_path), ordered by line.
+        Returns utf-8 encoded bytes.
         """
-        lines = []
-        index = 0
-        with (self.corpus.corpus_dir / corpus_file_path).open() as fh:
-            for line in fh:
-                start = index
-                end = index + len(line)
-                lines.append((start, end))
-                index += len(line)
-        return lines
+        fragment = BytesIO()
+        xml = XMLGenerator(fragment, encoding="utf-8", short_empty_elements=True)
+        xml.startElement("TextSource", {
+            "plainTextPath": "internal://" + self.source_internal_path(file_path),
+            "guid": self.document_guid(file_path),
+            "name": file_path,
+        })
+        if coded_lines:
+            doc_line_positions = self.corpus.get_line_char_ranges(
+                self.corpus.corpus_dir / file_path
+            )
+            for line, cls in groupby(coded_lines, key=itemgetter(2)):
+                xml.startElement("PlainTextSelection", {
+                    "guid": self.selection_guid(file_path, line),
+                    "name": f"line:{line}",
+                    "startPosition": str(doc_line_positions[line][0]),
+                    "endPosition": str(doc_line_positions[line][1]),
+                })
+                for code, coder, line, file_path in cls:
+                    xml.startElement("Coding", {
+                        "guid": self.coding_guid(code, coder, line, file_path),
+                        "creatingUser": self.coder_guid(coder),
+                    })
+                    xml.startElement("CodeRef", {"targetGUID": self.code_guids[code]})
+                    xml.endElement("CodeRef")
+                    xml.endElement("Coding")
+                xml.endElement("PlainTextSelection")
+        xml.endElement("TextSource")
+        xml.endDocument()
+        return fragment.getvalue()
+
+    def source_internal_path(self, file_path):
+        "Returns the path of a document's plain text within the project"
+        return str(Path(self.document_guid(file_path)).with_suffix(Path(file_path).suffix))
+
+    def document_guid(self, file_path):
+        return self.cached_guid(file_path)
 
     def coder_guid(self, coder):
-        return self.guid(coder)
+        return self.cached_guid(coder)
 
     def coding_guid(self, code, coder, line, file_path):
         return self.guid(':'.join([file_path, str(line), coder, code]))
@@ -178,6 +298,24 @@ class REFIQDAWriter:
     def code_guid(self, code):
         return self.guid(code)
 
+    def cached_guid(self, source):
+        """Returns the GUID for source, memoized. Used for coders, whose GUID is 
+        needed for each of their codings, and documents, whose GUID is needed 
+        for both the TextSource and its file in the zip file.
+        """
+        if source not in self.guid_cache:
+            self.guid_cache[source] = self.guid(source)
+        return self.guid_cache[source]
+
     def guid(self, source):
-        digest = md5(source.encode('utf8')).hexdigest()[:16]
-        return str(UUID(bytes=digest.encode('utf8')))
+        """Returns a GUID derived from source, so that GUIDs are stable across exports.
+        The first 16 hex digits of source's md5 digest are used as the UUID's bytes.
+        """
+        return format_guid(md5(source.encode('utf8')).hexdigest())
+
+def format_guid(digest):
+    """Formats the first 16 characters of a hex digest as a UUID string, like 
+    str(UUID(bytes=digest[:16].encode())) but without constructing a UUID.
+    """
+    h = digest[:16].encode('ascii').hex()
+    return f"{h[:8]}-{h[8:12]}-{h[12:16]}-{h[16:20]}-{h[20:]}"
@@ -114,6 +114,26 @@ class QCTestCase(TestCase):
         })
         self.corpus = QCCorpus(self.testpath / "settings.yaml")
 
+    def set_up_large_coded_corpus(self, documents=20, repeats=100, 
+            coders=("chris", "kelly"), codes=("time", "death", "pace"), corpus_root=None):
+        """Imports `documents` copies of MACBETH, each repeated `repeats` times, 
+        and codes every line for each coder, cycling through codes. 
+        Useful for benchmarking operations on a large coded corpus.
+        """
+        (self.testpath / "large").mkdir()
+        for i in range(documents):
+            (self.testpath / "large" / f"macbeth_{i}.txt").write_text(MACBETH * repeats)
+        prefix = f"{corpus_root}/" if corpus_root else ""
+        with self.corpus.session():
+            self.corpus.import_media(self.testpath / "large", recursive=True, 
+                    corpus_root=corpus_root, importer="verbatim")
+            for i in range(documents):
+                for j, coder in enumerate(coders):
+                    self.corpus.update_coded_lines(f"{prefix}macbeth_{i}.txt", coder, [
+                        {'line': line, 'code_id': codes[(line + j) % len(codes)]}
+                        for line in range(10 * repeats)
+                    ])
+
     def read_stats_tsv(self, stdout):
         reader = csv.reader(StringIO(stdout), delimiter="\t")
         table = [[item.strip() for item in row] for row in reader]
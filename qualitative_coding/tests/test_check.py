@@ -1,5 +1,6 @@
 from tests.fixtures import QCTestCase
 from pathlib import Path
+import os
 from qualitative_coding.corpus import DEFAULT_SETTINGS
 
 class TestCheck(QCTestCase):
@@ -30,5 +31,33 @@ class TestCheck(QCTestCase):
         message = self.run_in_testpath("qc check").stderr
         self.assertTrue("macbeth.txt" in message)
 
+    def test_check_db_shows_effective_pragmas(self):
+        result = self.run_in_testpath("qc check --db")
+        self.assertTrue("journal_mode  wal" in result.stdout)
+        self.assertTrue("foreign_keys  1" in result.stdout)
 
+    def test_check_db_always_enables_foreign_keys(self):
+        self.update_settings("database_pragmas", {"journal_mode": "WAL"})
+        result = self.run_in_testpath("qc check --db")
+        self.assertTrue("foreign_keys  1" in result.stdout)
 
+    def test_check_rejects_disabled_foreign_keys(self):
+        self.update_settings("database_pragmas", {"foreign_keys": False})
+        result = self.run_in_testpath("qc check")
+        self.assertTrue("Database pragma foreign_keys cannot be disabled" in result.stderr)
+
+    def test_check_identifies_unsupported_pragmas(self):
+        self.update_settings("database_pragmas", {"writable_schema": True})
+        result = self.run_in_testpath("qc check")
+        self.assertTrue("Unsupported database pragma: writable_schema" in result.stderr)
+
+    def test_check_only_rehashes_files_whose_stat_changed(self):
+        self.run_in_testpath("qc corpus import macbeth.txt --importer verbatim")
+        path = self.testpath / "corpus" / "macbeth.txt"
+        stat = path.stat()
+        with open(path, 'r+') as fh:
+            fh.write("X")
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        self.assertEqual(self.run_in_testpath("qc check").stderr, "")
+        message = self.run_in_testpath("qc check --full --jobs 2").stderr
+        self.assertTrue("macbeth.txt" in message)
@@ -56,3 +56,21 @@ class TestCode(QCTestCase):
 
 
 
+
+    def test_update_coded_lines_replaces_coded_lines(self):
+        with self.corpus.session():
+            self.corpus.update_coded_lines("macbeth.txt", "chris", [
+                {'line': 0, 'code_id': 'time'},
+                {'line': 4, 'code_id': 'death'},
+            ])
+            self.corpus.update_coded_lines("macbeth.txt", "chris", [
+                {'line': 4, 'code_id': 'death'},
+                {'line': 9, 'code_id': 'nothing'},
+            ])
+            coded_lines = self.corpus.get_coded_lines()
+            paragraphs = self.corpus.get_coded_paragraphs()
+        self.assertEqual(coded_lines, [
+            ('death', 'chris', 4, 'macbeth.txt'),
+            ('nothing', 'chris', 9, 'macbeth.txt'),
+        ])
+        self.assertEqual([(start, end) for *_, start, end in paragraphs], [(0, 10), (0, 10)])
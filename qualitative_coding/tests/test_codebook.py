@@ -1,5 +1,9 @@
 from tests.fixtures import QCTestCase
 import yaml
+import pickle
+from hashlib import sha1
+from pathlib import Path
+from qualitative_coding.codebook import QCCodebook
 
 class TestCodebook(QCTestCase):
     def test_codebook_is_empty_on_init(self):
@@ -14,5 +18,71 @@ class TestCodebook(QCTestCase):
         cb = yaml.safe_load((self.testpath / "codebook.yaml").read_text())
         self.assertEqual(len(cb), 3)
 
+    def test_new_codes_are_appended_when_session_ends(self):
+        self.run_in_testpath("qc corpus import macbeth.txt --importer verbatim")
+        codebook_path = self.testpath / "codebook.yaml"
+        codebook_path.write_text("# themes\n- time:\n  - tomorrow\n")
+        with self.corpus.session():
+            self.corpus.update_coded_lines("macbeth.txt", "chris", [
+                {'line': 0, 'code_id': 'tomorrow'},
+                {'line': 1, 'code_id': 'pace'},
+            ])
+            self.corpus.update_coded_lines("macbeth.txt", "kelly", [
+                {'line': 2, 'code_id': 'pace'},
+                {'line': 3, 'code_id': 'death'},
+            ])
+            self.assertEqual(codebook_path.read_text(), "# themes\n- time:\n  - tomorrow\n")
+        self.assertEqual(
+            codebook_path.read_text(), 
+            "# themes\n- time:\n  - tomorrow\n- pace\n- death\n"
+        )
+
+    def test_new_codes_are_not_appended_to_flow_style_codebook(self):
+        codebook_path = self.testpath / "codebook.yaml"
+        for text in ["---\n[time, tomorrow]\n", "---\n- time\n...\n"]:
+            codebook_path.write_text(text)
+            QCCodebook(codebook_path).append_codes({"pace": None})
+            self.assertEqual(
+                QCCodebook(codebook_path).read().flatten(names=True), 
+                ["pace", "time", "tomorrow"] if "[" in text else ["pace", "time"],
+            )
+
+    def test_committed_codes_are_added_when_session_raises(self):
+        self.run_in_testpath("qc corpus import macbeth.txt --importer verbatim")
+        codebook_path = self.testpath / "codebook.yaml"
+        codebook_path.write_text("- time\n")
+        with self.assertRaises(ValueError):
+            with self.corpus.session():
+                self.corpus.update_coded_lines("macbeth.txt", "chris", [
+                    {'line': 1, 'code_id': 'pace'},
+                ])
+                raise ValueError("Something went wrong")
+        self.assertEqual(codebook_path.read_text(), "- time\n- pace\n")
+        with self.corpus.session():
+            self.assertEqual(self.corpus.get_codes(), {"pace"})
+
+    def test_codebook_cache_is_used_until_codebook_changes(self):
+        codebook_path = self.testpath / "codebook.yaml"
+        codebook_path.write_text("- one:\n  - two\n")
+        tree = QCCodebook(codebook_path).read()
+        self.assertTrue((self.testpath / ".codebook.yaml.cache").exists())
+        QCCodebook.memo.clear()
+        self.assertEqual(QCCodebook(codebook_path).read().flatten(names=True), ["one", "two"])
+        codebook_path.write_text("- three\n")
+        self.assertEqual(QCCodebook(codebook_path).read().flatten(names=True), ["three"])
+
+    def test_codebook_cache_returns_independent_trees(self):
+        codebook_path = self.testpath / "codebook.yaml"
+        codebook_path.write_text("- one\n")
+        QCCodebook(codebook_path).read().add_child("two")
+        self.assertEqual(QCCodebook(codebook_path).read().flatten(names=True), ["one"])
 
+    def test_codebook_cache_refuses_objects(self):
+        codebook_path = self.testpath / "codebook.yaml"
+        codebook_path.write_text("- one\n")
+        codebook = QCCodebook(codebook_path)
+        digest = sha1(codebook_path.read_bytes()).hexdigest()
+        codebook.cache_path.write_bytes(pickle.dumps((1, digest, [Path("two")])))
+        QCCodebook.memo.clear()
+        self.assertEqual(codebook.read().flatten(names=True), ["one"])
 
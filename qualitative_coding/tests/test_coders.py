@@ -1,4 +1,6 @@
 from tests.fixtures import QCTestCase
+from qualitative_coding.corpus import QCCorpus
+from collections import Counter
 from pathlib import Path
 
 class TestCoders(QCTestCase):
@@ -10,3 +12,22 @@ class TestCoders(QCTestCase):
         result = self.run_in_testpath("qc coders")
         self.assertTrue("chris" in result.stdout)
         self.assertTrue("varun" in result.stdout)
+
+    def test_delete_coder_deletes_coded_lines(self):
+        self.set_up_large_coded_corpus(documents=2, repeats=2)
+        with self.corpus.session():
+            self.corpus.delete_coder("chris")
+            self.assertEqual({coder for code, coder, line, path in self.corpus.get_coded_lines()}, 
+                    {"kelly"})
+            self.assertEqual([c.name for c in self.corpus.get_all_coders()], ["kelly"])
+
+    def test_delete_coder_cascades_when_foreign_keys_not_in_settings(self):
+        self.set_up_large_coded_corpus(documents=2, repeats=2)
+        self.update_settings("database_pragmas", {"journal_mode": "WAL"})
+        corpus = QCCorpus(self.testpath / "settings.yaml")
+        with corpus.session():
+            corpus.delete_coder("chris")
+            coded_lines = corpus.get_coded_lines()
+            self.assertEqual({coder for code, coder, line, path in coded_lines}, {"kelly"})
+            self.assertEqual(corpus.count_codes(), 
+                    dict(Counter(code for code, coder, line, path in coded_lines)))
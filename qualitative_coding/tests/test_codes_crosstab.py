@@ -17,3 +17,91 @@ class TestCrosstab(QCTestCase):
         result = self.run_in_testpath("qc codes crosstab one two line --probs --format tsv")
         table = self.read_stats_tsv(result.stdout)
         self.assertEqual(table['line']['two'], 0.5)
+
+CODEBOOK = """
+- fate:
+  - death
+  - time
+- theater
+"""
+
+class TestCodeMatrix(QCTestCase):
+    def setUp(self):
+        super().setUp()
+        self.run_in_testpath("qc corpus import macbeth.txt --importer verbatim")
+        self.run_in_testpath("qc corpus import moby_dick.md --importer verbatim")
+        with self.corpus.session():
+            self.corpus.update_coded_lines("macbeth.txt", "chris", [
+                {'line': 0, 'code_id': 'time'},
+                {'line': 1, 'code_id': 'time'},
+                {'line': 4, 'code_id': 'death'},
+                {'line': 4, 'code_id': 'time'},
+                {'line': 5, 'code_id': 'theater'},
+                {'line': 6, 'code_id': 'theater'},
+            ])
+            self.corpus.update_coded_lines("macbeth.txt", "haley", [
+                {'line': 1, 'code_id': 'fate'},
+                {'line': 6, 'code_id': 'death'},
+            ])
+            self.corpus.update_coded_lines("moby_dick.txt", "chris", [
+                {'line': 0, 'code_id': 'death'},
+                {'line': 0, 'code_id': 'theater'},
+            ])
+        (self.testpath / "codebook.yaml").write_text(CODEBOOK)
+
+    def get_matrix(self, **kwargs):
+        with self.corpus.session():
+            labels, matrix = self.corpus.get_code_matrix(None, **kwargs)
+        return {(a, b): matrix[i][j] for i, a in enumerate(labels) 
+                for j, b in enumerate(labels)}
+
+    def test_matrix_matches_pairwise_reference(self):
+        for unit in self.corpus.units:
+            for recursive_counts in [False, True]:
+                for coders in [None, ["chris"]]:
+                    params = dict(unit=unit, recursive_counts=recursive_counts, coders=coders)
+                    with self.corpus.session():
+                        labels, matrix = self.corpus.get_code_matrix(None, **params)
+                        ref_labels, ref_matrix = self.corpus.get_code_matrix_pairwise(
+                                None, **params)
+                    self.assertEqual(labels, ref_labels)
+                    self.assertEqual(matrix.tolist(), ref_matrix.tolist(), params)
+
+    def test_matrix_counts_lines(self):
+        m = self.get_matrix()
+        self.assertEqual(m['time', 'time'], 3)
+        self.assertEqual(m['death', 'time'], 1)
+        self.assertEqual(m['death', 'theater'], 2)
+
+    def test_matrix_counts_coded_lines(self):
+        with self.corpus.session():
+            self.corpus.update_coded_lines("macbeth.txt", "kelly", [{'line': 4, 'code_id': 'time'}])
+            labels, matrix = self.corpus.get_code_matrix(None)
+            counts = self.corpus.count_codes()
+        self.assertEqual(labels, ["fate", "death", "time", "theater"])
+        # Cell [i, j] (i <= j) counts coded lines of code i on lines where code j occurs.
+        self.assertEqual(matrix.tolist(), [
+            [1, 0, 1, 0],
+            [0, 3, 1, 2],
+            [1, 1, 4, 0],
+            [0, 2, 0, 3],
+        ])
+        self.assertEqual([matrix[i][i] for i in range(len(labels))], 
+                [counts.get(label, 0) for label in labels])
+
+    def test_matrix_counts_documents(self):
+        m = self.get_matrix(unit="document")
+        self.assertEqual(m['death', 'theater'], 2)
+        self.assertEqual(m['fate', 'time'], 1)
+
+    def test_matrix_counts_recursively(self):
+        m = self.get_matrix(recursive_counts=True)
+        self.assertEqual(m['fate', 'fate'], 7)
+        self.assertEqual(m['fate', 'theater'], 2)
+
+    def test_matrix_filters_by_pattern_and_coder(self):
+        m = self.get_matrix(pattern="macbeth")
+        self.assertEqual(m['death', 'theater'], 1)
+        m = self.get_matrix(unit="document", coders=["haley"])
+        self.assertEqual(m['death', 'fate'], 1)
+        self.assertEqual(m['theater', 'theater'], 0)
@@ -1,4 +1,5 @@
-from tests.fixtures import QCTestCase
+import json
+from tests.fixtures import QCTestCase, MACBETH
 
 class TestFind(QCTestCase):
     def setUp(self):
@@ -16,3 +17,16 @@ class TestFind(QCTestCase):
         self.assertEqual(len(result.stdout.splitlines()), 11)
 
 
+
+    def test_find_json_streams_one_record_per_line(self):
+        result = self.run_in_testpath("qc codes find one --json -B 1 -C 1")
+        records = [json.loads(line) for line in result.stdout.splitlines()]
+        self.assertTrue(records)
+        for record in records:
+            self.assertEqual(record["code"], "one")
+            start, end = record["text_lines"]
+            self.assertEqual(record["text"], "".join(MACBETH.splitlines(keepends=True)[start:end]))
+
+    def test_find_paragraphs_shows_paragraph_text(self):
+        result = self.run_in_testpath("qc codes find one --unit paragraph --no-codes")
+        self.assertIn(MACBETH.splitlines()[-1].strip(), result.stdout)
@@ -1,5 +1,8 @@
 from tests.fixtures import QCTestCase
 from qualitative_coding.corpus import QCCorpus
+from qualitative_coding.database.models import CodedLine
+from sqlalchemy import select, func
+from collections import Counter
 import yaml
 
 class TestRename(QCTestCase):
@@ -19,3 +22,41 @@ class TestRename(QCTestCase):
         self.run_in_testpath("qc codes rename line one")
         with corpus.session():
             self.assertEqual(len(corpus.get_coded_lines()), 3)
+
+    def test_rename_merges_codes_on_the_same_line(self):
+        with self.corpus.session():
+            self.corpus.update_coded_lines("macbeth.txt", "kelly", [
+                {'line': 0, 'code_id': 'a'},
+                {'line': 0, 'code_id': 'b'},
+                {'line': 0, 'code_id': 'c'},
+                {'line': 1, 'code_id': 'b'},
+            ])
+            self.corpus.rename_codes(["a", "b", "c"], "c", coders=["kelly"])
+            coded_lines = self.corpus.get_coded_lines(coders=["kelly"])
+        self.assertEqual(sorted(coded_lines), [
+            ('c', 'kelly', 0, 'macbeth.txt'),
+            ('c', 'kelly', 1, 'macbeth.txt'),
+        ])
+
+class TestRenameLargeCorpus(QCTestCase):
+    def setUp(self):
+        super().setUp()
+        self.set_up_large_coded_corpus(documents=4, repeats=50)
+
+    def test_rename_applies_filters(self):
+        with self.corpus.session():
+            self.corpus.rename_codes(["time", "death"], "mortality", 
+                    file_list=["macbeth_0.txt", "macbeth_1.txt"], coders=["chris"])
+            counts = self.corpus.get_session().execute(
+                select(CodedLine.code_id, CodedLine.coder_id, func.count())
+                .group_by(CodedLine.code_id, CodedLine.coder_id)
+            ).all()
+        expected = Counter()
+        for i in range(4):
+            for j, coder in enumerate(["chris", "kelly"]):
+                for line in range(500):
+                    code = ["time", "death", "pace"][(line + j) % 3]
+                    if code != "pace" and i < 2 and coder == "chris":
+                        code = "mortality"
+                    expected[(code, coder)] += 1
+        self.assertEqual(sorted(counts), sorted((*k, v) for k, v in expected.items()))
@@ -1,4 +1,6 @@
 from tests.fixtures import QCTestCase
+from sqlalchemy import delete
+from qualitative_coding.database.models import CodeCountSummary
 
 class TestStats(QCTestCase):
     def test_stats_shows_stats(self):
@@ -32,3 +34,79 @@ class TestStats(QCTestCase):
         self.run_in_testpath("qc code haley")
         result = self.run_in_testpath("qc codes stats --by-document --by-coder --format tsv")
         table = self.read_stats_tsv(result.stdout)
+
+    def test_counts_by_group_match_counts_for_each_group(self):
+        self.run_in_testpath("qc corpus import macbeth.txt --importer verbatim")
+        self.run_in_testpath("qc corpus import moby_dick.md --importer verbatim")
+        with self.corpus.session():
+            self.corpus.update_coded_lines("macbeth.txt", "chris", [
+                {'line': 0, 'code_id': 'time'},
+                {'line': 4, 'code_id': 'death'},
+                {'line': 4, 'code_id': 'time'},
+            ])
+            self.corpus.update_coded_lines("moby_dick.txt", "haley", [
+                {'line': 0, 'code_id': 'death'},
+                {'line': 0, 'code_id': 'fate'},
+            ])
+        (self.testpath / "codebook.yaml").write_text("- fate:\n  - death\n  - time\n")
+        with self.corpus.session():
+            for unit in self.corpus.units:
+                for totals in [True, False]:
+                    attr = "total" if totals else "count"
+                    by_coder = self.corpus.count_codes_by_coder(unit=unit, totals=totals)
+                    for coder in ["chris", "haley"]:
+                        tree = self.corpus.get_code_tree_with_counts(coders=[coder], unit=unit)
+                        for node in tree.flatten():
+                            self.assertEqual(by_coder[coder][node.expanded_name()], 
+                                    getattr(node, attr))
+                    by_doc = self.corpus.count_codes_by_document(unit=unit, totals=totals)
+                    for doc in ["macbeth.txt", "moby_dick.txt"]:
+                        tree = self.corpus.get_code_tree_with_counts(file_list=[doc], unit=unit)
+                        for node in tree.flatten():
+                            self.assertEqual(by_doc[doc][node.expanded_name()], 
+                                    getattr(node, attr))
+            by_coder = self.corpus.count_codes_by_coder()
+        self.assertEqual(by_coder["chris"]["fate"], 3)
+
+    def test_code_count_summary_matches_coded_lines(self):
+        self.set_up_large_coded_corpus(documents=3, repeats=2, corpus_root="large")
+        self.run_in_testpath("qc corpus import macbeth.txt --importer verbatim")
+        with self.corpus.session():
+            self.corpus.update_coded_lines("macbeth.txt", "haley", [
+                {'line': 0, 'code_id': 'time'},
+                {'line': 1, 'code_id': 'time'},
+                {'line': 4, 'code_id': 'death'},
+            ])
+            self.assertSummaryMatchesCodedLines()
+            self.corpus.rename_codes(["time", "pace"], "fate", coders=["chris"])
+            self.assertSummaryMatchesCodedLines()
+            self.corpus.move_document(self.testpath / "corpus/large/macbeth_0.txt", 
+                    self.testpath / "corpus/macbeth_0.txt")
+            self.assertSummaryMatchesCodedLines()
+            self.corpus.remove_document(self.testpath / "corpus/large/macbeth_1.txt")
+            self.assertSummaryMatchesCodedLines()
+            self.corpus.delete_coder("kelly")
+            self.assertSummaryMatchesCodedLines()
+            self.corpus.get_session().execute(delete(CodeCountSummary))
+            self.corpus.get_session().commit()
+        self.run_in_testpath("qc check --rebuild-summary")
+        with self.corpus.session():
+            self.assertSummaryMatchesCodedLines()
+
+    def assertSummaryMatchesCodedLines(self):
+        def counts():
+            results = []
+            for unit in self.corpus.units:
+                for coders in [None, ["chris"], ["chris", "haley"]]:
+                    results.append(self.corpus.count_codes(unit=unit, coders=coders))
+                    results.append(self.corpus.count_codes(unit=unit, coders=coders, 
+                            pattern="large"))
+                    results.append(self.corpus.count_codes_by_coder(unit=unit, coders=coders))
+                    results.append(self.corpus.count_codes_by_document(unit=unit, coders=coders))
+            return results
+        summary_counts = counts()
+        self.corpus.use_code_count_summary = False
+        try:
+            self.assertEqual(summary_counts, counts())
+        finally:
+            self.corpus.use_code_count_summary = True
@@ -1,11 +1,22 @@
 from tests.fixtures import QCTestCase
 from pathlib import Path
+from unittest.mock import patch
 
 class TestImport(QCTestCase):
     def test_import_verbatim(self):
         self.run_in_testpath("qc corpus import macbeth.txt --importer verbatim")
         self.assertFileImported("macbeth.txt")
 
+    def test_import_records_line_offsets(self):
+        self.run_in_testpath("qc corpus import macbeth.txt --importer verbatim")
+        path = self.testpath / "corpus/macbeth.txt"
+        text = path.read_text()
+        with self.corpus.session():
+            self.assertIsNotNone(self.corpus.get_document(path).line_byte_offsets)
+            ranges = self.corpus.get_line_char_ranges(path)
+            self.assertEqual([text[start:end] for start, end in ranges], text.splitlines(True))
+            self.assertEqual(self.corpus.get_line_for_char_position(path, ranges[3][0] + 2), 3)
+
     def test_import_pandoc(self):
         self.run_in_testpath("qc corpus import moby_dick.md --importer pandoc")
         self.assertFileImported("moby_dick.txt")
@@ -50,6 +61,38 @@ class TestImport(QCTestCase):
         self.assertFileImported("one.txt")
         self.assertFileImported("preface/note.txt")
 
+    def test_import_recursive_with_jobs(self):
+        (self.testpath / "chapters").mkdir()
+        for i in range(8):
+            (self.testpath / f"chapters/{i}.txt").write_text(f"chapter {i}\n")
+        self.run_in_testpath("qc corpus import chapters --recursive --importer verbatim --jobs 4")
+        for i in range(8):
+            self.assertFileImported(f"{i}.txt")
+
+    def test_import_reports_failed_files(self):
+        (self.testpath / "chapters").mkdir()
+        (self.testpath / "chapters/one.txt").write_text("one")
+        self.run_in_testpath("qc corpus import chapters/one.txt --importer verbatim")
+        (self.testpath / "chapters/two.txt").write_text("two")
+        result = self.run_in_testpath("qc corpus import chapters --recursive --importer verbatim")
+        self.assertNotEqual(result.returncode, 0)
+        self.assertIn("1 file(s) could not be imported", result.stderr)
+        self.assertIn("one.txt already exists", result.stderr)
+        self.assertFileImported("two.txt")
+
+    def test_import_removes_files_which_were_not_registered(self):
+        (self.testpath / "chapters").mkdir()
+        (self.testpath / "chapters/one.txt").write_text("one")
+        (self.testpath / "chapters/two.txt").write_text("two")
+        (self.testpath / "corpus/two.txt").write_text("two")
+        with self.corpus.session():
+            with patch.object(self.corpus, "register_document", side_effect=ValueError("failed")):
+                failures = self.corpus.import_media(self.testpath / "chapters", 
+                        recursive=True, importer="verbatim")
+        self.assertEqual(len(failures), 2)
+        self.assertFalse((self.testpath / "corpus/one.txt").exists())
+        self.assertFileExists(Path("corpus") / "two.txt")
+
     def assertFileImported(self, path):
         self.assertFileExists(Path("corpus") / path)
         with self.corpus.session():
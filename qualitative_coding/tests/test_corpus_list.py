@@ -0,0 +1,24 @@
+from tests.fixtures import QCTestCase
+
+class TestCorpusList(QCTestCase):
+    def setUp(self):
+        super().setUp()
+        self.run_in_testpath("qc corpus import macbeth.txt --importer verbatim --corpus-root plays")
+        self.run_in_testpath("qc corpus import moby_dick.md --importer verbatim --corpus-root novels")
+        with self.corpus.session():
+            self.corpus.update_coded_lines("plays/macbeth.txt", "chris", [{'line': 0, 'code_id': 'time'}])
+            self.corpus.update_coded_lines("novels/moby_dick.txt", "chris", [{'line': 0, 'code_id': 'sea'}])
+
+    def test_lists_documents(self):
+        result = self.run_in_testpath("qc corpus list")
+        self.assertEqual(result.stdout.split(), ["novels/moby_dick.txt", "plays/macbeth.txt"])
+
+    def test_pattern_styles_select_the_same_documents(self):
+        for pattern in ["mac", "'plays/*'", "'*/m?cbeth.txt'", "'re:^pl.*\\.txt$'"]:
+            result = self.run_in_testpath(f"qc corpus list --pattern {pattern}")
+            self.assertEqual(result.stdout.split(), ["plays/macbeth.txt"])
+            with self.corpus.session():
+                docs = self.corpus.get_documents(pattern=pattern.strip("'"))
+                counts = self.corpus.count_codes(pattern=pattern.strip("'"))
+            self.assertEqual([doc.file_path for doc in docs], ["plays/macbeth.txt"])
+            self.assertEqual(counts, {'time': 1})
@@ -1,5 +1,7 @@
 from tests.fixtures import QCTestCase
 from pathlib import Path
+from sqlalchemy import select, func
+from qualitative_coding.database.models import CodedLine, DocumentIndex, Location
 
 class TestCorpusRemove(QCTestCase):
     def test_removes_individual_file(self):
@@ -11,3 +13,16 @@ class TestCorpusRemove(QCTestCase):
         self.run_in_testpath("qc corpus import macbeth.txt --importer verbatim --corpus-root shx")
         self.run_in_testpath("qc corpus remove corpus/shx --recursive")
         self.assertFileDoesNotExist(self.testpath / "corpus" / "shx" / "macbeth.txt")
+
+    def test_removing_documents_deletes_their_rows(self):
+        self.set_up_large_coded_corpus(documents=3, repeats=2, corpus_root="large")
+        self.run_in_testpath("qc corpus import macbeth.txt --importer verbatim")
+        with self.corpus.session():
+            self.corpus.update_coded_lines("macbeth.txt", "chris", [{'line': 0, 'code_id': 'time'}])
+        self.run_in_testpath("qc corpus remove corpus/large --recursive")
+        with self.corpus.session():
+            session = self.corpus.get_session()
+            self.assertEqual(self.corpus.get_coded_lines(), [('time', 'chris', 0, 'macbeth.txt')])
+            self.assertEqual(session.scalar(select(func.count()).select_from(CodedLine)), 1)
+            self.assertEqual(session.scalar(select(func.count()).select_from(DocumentIndex)), 1)
+            self.assertEqual(session.scalar(select(func.count()).select_from(Location)), 1)
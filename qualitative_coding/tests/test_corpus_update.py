@@ -52,3 +52,58 @@ class TestCorpusUpdate(QCTestCase):
 
 
 
+    def test_corpus_update_updates_line_offsets(self):
+        self.run_in_testpath("qc corpus update corpus/macbeth.txt --new macbeth_improved.txt")
+        path = self.testpath / "corpus/macbeth.txt"
+        with self.corpus.session():
+            self.assertIsNotNone(self.corpus.get_document(path).line_byte_offsets)
+            self.assertEqual(self.corpus.count_lines(path), len(MACBETH_IMPROVED.splitlines()))
+            start, end = self.corpus.get_line_char_ranges(path)[7]
+        self.assertEqual(MACBETH_IMPROVED[start:end], "Something something something,\n")
+
+    def test_corpus_update_updates_paragraphs(self):
+        lines = MACBETH_IMPROVED.splitlines(True)
+        (self.testpath / "macbeth_improved.txt").write_text("".join(lines[:4] + ["\n"] + lines[4:]))
+        self.run_in_testpath("qc corpus update corpus/macbeth.txt --new macbeth_improved.txt")
+        with self.corpus.session():
+            ids, starts, ends = self.corpus.get_paragraph_intervals("macbeth.txt")
+        self.assertEqual(starts, [0, 5])
+        self.assertEqual(ends, [5, 11])
+
+    def test_corpus_update_moves_codes_with_their_lines(self):
+        result = self.run_in_testpath("qc corpus update corpus/macbeth.txt --new macbeth_improved.txt")
+        with self.corpus.session():
+            coded_lines = self.corpus.get_coded_lines()
+        self.assertEqual(sorted((line, code) for code, coder, line, path in coded_lines), [
+            (3, 'tomorrow'), (4, 'creeps'), (5, 'and'), (6, 'the'), (7, 'lifes'), 
+            (8, 'and'), (9, 'told'),
+        ])
+        self.assertIn("Code to (chris) on line 3 of macbeth.txt was dropped", result.stderr)
+        self.assertIn("Code that (chris) on line 7 of macbeth.txt was dropped", result.stderr)
+
+    def test_corpus_update_dryrun_reports_dropped_codes(self):
+        result = self.run_in_testpath(
+            "qc corpus update corpus/macbeth.txt --new macbeth_improved.txt --dryrun"
+        )
+        self.assertIn("Code to (chris) on line 3 of macbeth.txt would be dropped", result.stderr)
+        with self.corpus.session():
+            self.assertEqual(len(self.corpus.get_coded_lines()), 9)
+
+    def test_update_documents_updates_many_documents(self):
+        (self.testpath / "macbeth2.txt").write_text((self.testpath / "macbeth.txt").read_text())
+        self.run_in_testpath("qc corpus import macbeth2.txt --importer verbatim")
+        with self.corpus.session():
+            self.corpus.update_coded_lines("macbeth2.txt", "chris", [{'line': 9, 'code_id': 'told'}])
+            dropped = self.corpus.update_documents([
+                (self.testpath / "corpus/macbeth.txt", MACBETH_IMPROVED),
+                (self.testpath / "corpus/macbeth2.txt", MACBETH_IMPROVED),
+            ], jobs=2)
+            coded_lines = self.corpus.get_coded_lines(file_list=["macbeth2.txt"])
+            ids, starts, ends = self.corpus.get_paragraph_intervals("macbeth2.txt")
+        self.assertEqual(sorted(dropped), [
+            ('that', 'chris', 7, 'macbeth.txt'),
+            ('to', 'chris', 3, 'macbeth.txt'),
+        ])
+        self.assertEqual(coded_lines, [('told', 'chris', 9, 'macbeth2.txt')])
+        self.assertEqual(ends, [len(MACBETH_IMPROVED.splitlines())])
+        self.assertEqual((self.testpath / "corpus/macbeth2.txt").read_text(), MACBETH_IMPROVED)
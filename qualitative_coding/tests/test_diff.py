@@ -0,0 +1,57 @@
+from unittest import TestCase
+from random import Random
+from time import perf_counter
+from qualitative_coding.diff import (
+    map_lines, 
+    reindex_coded_lines, 
+    get_git_head_lines, 
+    read_lines,
+)
+from tempfile import TemporaryDirectory
+from pathlib import Path
+from subprocess import run
+
+class TestMapLines(TestCase):
+    def test_maps_equal_inserted_deleted_and_replaced_lines(self):
+        old = [t + '\n' for t in 'abcdefghij']
+        new = [t + '\n' for t in 'a12bcefXhij']
+        # d is deleted; g is replaced by X
+        self.assertEqual(map_lines(old, new).tolist(), [0, 3, 4, -1, 5, 6, 7, 8, 9, 10])
+
+    def test_reindex_coded_lines_reports_dropped_lines(self):
+        old = [t + '\n' for t in 'abcd']
+        new = [t + '\n' for t in 'xabd']
+        coded_lines = [('one', 'chris', 0, 'doc.txt'), ('two', 'chris', 2, 'doc.txt')]
+        reindexed, dropped = reindex_coded_lines(coded_lines, map_lines(old, new))
+        self.assertEqual(reindexed, [('one', 'chris', 1, 'doc.txt')])
+        self.assertEqual(dropped, [('two', 'chris', 2, 'doc.txt')])
+
+    def test_maps_10k_line_document(self):
+        rng = Random(0)
+        old = [
+            "\n" if i % 4 == 3 else f"line {i} " + " ".join(rng.choices("abcdefg", k=8)) + "\n"
+            for i in range(10000)
+        ]
+        new = list(old)
+        for _ in range(200):
+            k = rng.randrange(len(new))
+            new.insert(k, "inserted\n") if rng.random() < 0.5 else new.pop(k)
+        start = perf_counter()
+        line_map = map_lines(old, new)
+        elapsed = perf_counter() - start
+        mapped = [(i, j) for i, j in enumerate(line_map.tolist()) if j >= 0]
+        self.assertTrue(all(j0 < j1 for (i0, j0), (i1, j1) in zip(mapped, mapped[1:])))
+        unchanged = sum(old[i] == new[j] for i, j in mapped)
+        self.assertGreaterEqual(unchanged, len(old) - 200)
+        self.assertLess(elapsed, 10)
+
+    def test_git_head_lines_split_like_file_iteration(self):
+        text = "one\x0cstill one and\x1c\none\r\ntwo\n"
+        with TemporaryDirectory() as tempdir:
+            path = Path(tempdir) / "doc.txt"
+            path.write_bytes(text.encode())
+            for command in ["git init -q", "git add doc.txt", 
+                    "git -c user.name=qc -c user.email=qc@example.com commit -q -m doc"]:
+                run(command, shell=True, cwd=tempdir, check=True)
+            self.assertEqual(get_git_head_lines(path), read_lines(path))
+            self.assertEqual(len(get_git_head_lines(path)), 3)
@@ -3,6 +3,8 @@ from qualitative_coding.corpus import QCCorpus
 from tempfile import TemporaryDirectory
 from pathlib import Path
 from subprocess import run
+from zipfile import ZipFile
+import re
 
 class TestInitImport(QCTestCase):
     def test_imports_from_qdpx_file(self):
@@ -25,3 +27,31 @@ class TestInitImport(QCTestCase):
                 self.assertEqual(len(list(corpus.get_all_coders())), 2)
                 self.assertEqual(len(corpus.get_coded_lines()), 8)
 
+
+    def test_imports_selections_by_character_position(self):
+        self.run_in_testpath("qc corpus import macbeth.txt --importer verbatim")
+        self.run_in_testpath("qc corpus import moby_dick.md --importer verbatim")
+        with self.corpus.session():
+            self.corpus.update_coded_lines("macbeth.txt", "chris", [
+                {'line': 0, 'code_id': 'time'},
+                {'line': 5, 'code_id': 'death'},
+                {'line': 9, 'code_id': 'time'},
+            ])
+            self.corpus.update_coded_lines("moby_dick.txt", "kelly", [
+                {'line': 0, 'code_id': 'whale'},
+            ])
+            expected = sorted(self.corpus.get_coded_lines())
+        self.run_in_testpath("qc export out.qdpx")
+        with ZipFile(self.testpath / "out.qdpx") as zf, ZipFile(self.testpath / "positions.qdpx", 'w') as out:
+            for name in zf.namelist():
+                data = zf.read(name)
+                if name == "project.qde":
+                    data = re.sub(rb' name="line:\d+"', b'', data)
+                out.writestr(name, data)
+        with TemporaryDirectory() as outdir:
+            qdpx_file = self.testpath / "positions.qdpx"
+            run(f'qc init --import "{qdpx_file}" --jobs 2', cwd=outdir, shell=True, 
+                    check=True, capture_output=True, text=True)
+            corpus = QCCorpus(Path(outdir) / "settings.yaml")
+            with corpus.session():
+                self.assertEqual(sorted(corpus.get_coded_lines()), expected)
@@ -0,0 +1,54 @@
+from unittest import TestCase
+from io import StringIO
+from qualitative_coding.helpers import iter_paragraph_lines
+from qualitative_coding.line_index import (
+    LineIndex,
+    scan_line_offsets,
+    scan_paragraphs,
+)
+from tempfile import TemporaryDirectory
+from pathlib import Path
+
+TEXT = "Oneé\r\ntwo\n\n  \nthree\n\x1c\n\nfour"
+
+class TestLineIndex(TestCase):
+    def test_offsets_match_text_mode_lines(self):
+        lines = StringIO(TEXT.replace("\r\n", "\n"), newline="\n").readlines()
+        for chunk_size in [1, 5, 1 << 20]:
+            byte_offsets, char_offsets = scan_line_offsets(TEXT.encode(), chunk_size=chunk_size)
+            self.assertEqual(len(byte_offsets), len(lines) + 1)
+            self.assertEqual(
+                [len(line) for line in lines], 
+                (char_offsets[1:] - char_offsets[:-1]).tolist()
+            )
+
+    def test_lone_carriage_returns_end_lines(self):
+        data = b"a\rb\nc\r\rd\r"
+        with TemporaryDirectory() as tempdir:
+            path = Path(tempdir) / "text.txt"
+            path.write_bytes(data)
+            with open(path) as fh:
+                lines = list(fh)
+            for chunk_size in [1, 2, 1 << 20]:
+                byte_offsets, char_offsets = scan_line_offsets(data, chunk_size=chunk_size)
+                self.assertEqual(byte_offsets.tolist(), [0, 2, 4, 6, 7, 9])
+                self.assertEqual([len(line) for line in lines], 
+                        (char_offsets[1:] - char_offsets[:-1]).tolist())
+            with LineIndex(path) as line_index:
+                self.assertEqual(line_index.read_lines(0, len(line_index)), lines)
+
+    def test_read_lines(self):
+        with TemporaryDirectory() as tempdir:
+            path = Path(tempdir) / "text.txt"
+            path.write_bytes(TEXT.encode())
+            with LineIndex(path) as line_index:
+                self.assertEqual(line_index.read_lines(0, 2), ["Oneé\n", "two\n"])
+                self.assertEqual(line_index.read_lines(6, 20), ["\n", "four"])
+
+    def test_paragraphs_match_iter_paragraph_lines(self):
+        text = TEXT.replace("\r\n", "\n")
+        expected = list(iter_paragraph_lines(StringIO(text, newline="\n")))
+        byte_offsets, char_offsets = scan_line_offsets(text.encode())
+        for chunk_size in [1, 5, 1 << 20]:
+            starts, ends = scan_paragraphs(text.encode(), byte_offsets, chunk_size=chunk_size)
+            self.assertEqual(list(zip(starts.tolist(), ends.tolist())), expected)
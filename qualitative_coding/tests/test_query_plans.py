@@ -0,0 +1,74 @@
+from tests.fixtures import QCTestCase
+from sqlalchemy import event
+import re
+
+class TestQueryPlans(QCTestCase):
+    """Checks that frequent queries are served by indexes rather than by 
+    scanning whole tables.
+    """
+    def setUp(self):
+        super().setUp()
+        self.run_in_testpath("qc corpus import macbeth.txt --importer verbatim")
+        with self.corpus.session():
+            self.corpus.update_coded_lines("macbeth.txt", "chris", [
+                {'line': 0, 'code_id': 'time'},
+                {'line': 4, 'code_id': 'death'},
+            ])
+
+    def get_query_plans(self, query_fn):
+        "Runs query_fn and returns the query plan of each SELECT statement it executes"
+        statements = []
+        def capture(conn, cursor, statement, parameters, context, executemany):
+            if statement.lstrip().upper().startswith("SELECT"):
+                statements.append((statement, parameters))
+        event.listen(self.corpus.engine, "before_cursor_execute", capture)
+        try:
+            with self.corpus.session():
+                query_fn()
+        finally:
+            event.remove(self.corpus.engine, "before_cursor_execute", capture)
+        plans = []
+        with self.corpus.engine.connect() as conn:
+            for statement, parameters in statements:
+                rows = conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters)
+                plans.append((statement, [row[3] for row in rows]))
+        return plans
+
+    def assertNoTableScans(self, query_fn):
+        for statement, plan in self.get_query_plans(query_fn):
+            for step in plan:
+                if re.match(r"SCAN \S+$", step):
+                    raise AssertionError(f"{step} in plan for:\n{statement}\n" + "\n".join(plan))
+
+    def test_get_coded_lines_uses_indexes(self):
+        self.assertNoTableScans(lambda: self.corpus.get_coded_lines())
+        self.assertNoTableScans(lambda: self.corpus.get_coded_lines(
+                codes=["time"], file_list=["macbeth.txt"], coders=["chris"]))
+
+    def test_count_codes_uses_indexes(self):
+        for unit in self.corpus.units:
+            self.assertNoTableScans(lambda: self.corpus.count_codes(unit=unit))
+            self.assertNoTableScans(lambda: self.corpus.count_codes(unit=unit, 
+                    coders=["chris"], file_list=["macbeth.txt"]))
+
+    def test_get_paragraph_uses_indexes(self):
+        self.assertNoTableScans(lambda: self.corpus.get_paragraph("macbeth.txt", 4))
+        self.assertNoTableScans(lambda: self.corpus.get_paragraph_intervals("macbeth.txt"))
+
+    def test_get_code_matrix_uses_indexes(self):
+        for unit in self.corpus.units:
+            self.assertNoTableScans(lambda: self.corpus.get_code_matrix(None, unit=unit))
+            self.assertNoTableScans(lambda: self.corpus.get_code_matrix(None, unit=unit,
+                    coders=["chris"], file_list=["macbeth.txt"]))
+
+    def test_document_filters_use_integer_keys(self):
+        self.corpus.use_code_count_summary = False
+        def count_codes():
+            for unit in self.corpus.units:
+                self.assertEqual(self.corpus.count_codes(unit=unit, pattern="mac"), 
+                        {'time': 1, 'death': 1})
+        self.assertNoTableScans(count_codes)
+        for statement, plan in self.get_query_plans(count_codes):
+            if "coded_line" in statement:
+                self.assertNotIn("document.file_path", statement)
+                self.assertNotIn("LIKE", statement)
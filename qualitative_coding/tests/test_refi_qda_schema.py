@@ -0,0 +1,51 @@
+from qualitative_coding.tests.fixtures import QCTestCase
+from qualitative_coding.refi_qda.schema import get_schema, iter_validation_errors
+from unittest.mock import patch
+from io import BytesIO
+import xmlschema
+import os
+
+PROJECT = b'<?xml version="1.0" encoding="utf-8"?><Project xmlns="urn:QDA-XML:project:1.0" %s/>'
+
+class TestREFIQDASchema(QCTestCase):
+    def setUp(self):
+        super().setUp()
+        get_schema.cache_clear()
+        self.cache_dir = self.testpath / "cache"
+        self.env = patch.dict(os.environ, {"QC_CACHE_DIR": str(self.cache_dir)})
+        self.env.start()
+
+    def tearDown(self):
+        self.env.stop()
+        get_schema.cache_clear()
+        super().tearDown()
+
+    def test_compiled_schema_is_cached(self):
+        schema = get_schema()
+        self.assertIs(get_schema(), schema)
+        self.assertEqual(len(list(self.cache_dir.glob("refi_qda_schema_*.pickle"))), 1)
+        get_schema.cache_clear()
+        with patch.object(xmlschema, "XMLSchema") as compile_schema:
+            get_schema()
+        compile_schema.assert_not_called()
+
+    def test_unloadable_cache_is_replaced(self):
+        get_schema()
+        (cache_path,) = self.cache_dir.glob("refi_qda_schema_*.pickle")
+        # A pickle referring to a module which does not exist, like one written 
+        # by another version of xmlschema.
+        cache_path.write_bytes(b"cxmlschema_missing_module\nXMLSchema\n.")
+        get_schema.cache_clear()
+        self.assertIsInstance(get_schema(), xmlschema.XMLSchemaBase)
+        get_schema.cache_clear()
+        with patch.object(xmlschema, "XMLSchema") as compile_schema:
+            get_schema()
+        compile_schema.assert_not_called()
+
+    def test_iter_validation_errors_streams_project(self):
+        valid = PROJECT % b'name="project" origin="qc"'
+        invalid = PROJECT % b'origin="qc"'
+        self.assertEqual(list(iter_validation_errors(BytesIO(valid))), [])
+        errors = list(iter_validation_errors(BytesIO(invalid)))
+        self.assertEqual(len(errors), 1)
+        self.assertIn("name", errors[0].reason)
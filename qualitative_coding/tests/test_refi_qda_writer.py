@@ -3,6 +3,11 @@ from tests.fixtures import QCTestCase
 from qualitative_coding.refi_qda.writer import REFIQDAWriter
 from tempfile import TemporaryDirectory
 from xmlschema import validate
+from zipfile import ZipFile
+from xml.etree import ElementTree
+from hashlib import md5
+from uuid import UUID
+from unittest.mock import patch
 import importlib.resources
 
 CODEBOOK = """
@@ -41,3 +46,91 @@ class TestREFIQDAWriter(QCTestCase):
             
 
 
+
+    def test_write_streams_project_into_zip(self):
+        schema_path = importlib.resources.files("qualitative_coding") / "refi_qda" / "schema.xsd"
+        self.run_in_testpath("qc corpus import macbeth.txt --importer verbatim")
+        self.run_in_testpath("qc corpus import moby_dick.md --importer verbatim")
+        with self.corpus.session():
+            self.corpus.update_coded_lines("macbeth.txt", "chris", [
+                {'line': 0, 'code_id': 'time'},
+                {'line': 4, 'code_id': 'death'},
+                {'line': 4, 'code_id': 'time'},
+            ])
+        with TemporaryDirectory() as tempdir:
+            qdpx_path = Path(tempdir) / "project.qdpx"
+            self.writer.write(qdpx_path)
+            with ZipFile(qdpx_path) as zf:
+                self.assertEqual(len(zf.namelist()), 3)
+                qde = zf.read("project.qde").decode("utf-8")
+                sources = [zf.read(name) for name in zf.namelist() if name.startswith("sources/")]
+        validate(qde, schema_path)
+        self.assertIn((self.testpath / "macbeth.txt").read_bytes(), sources)
+        root = ElementTree.fromstring(qde)
+        selections = root.findall(".//{urn:QDA-XML:project:1.0}PlainTextSelection")
+        self.assertEqual([s.attrib['name'] for s in selections], ["line:0", "line:4"])
+        self.assertEqual(len(root.findall(".//{urn:QDA-XML:project:1.0}Coding")), 3)
+
+    def test_guids_are_stable_across_exports(self):
+        self.run_in_testpath("qc corpus import macbeth.txt --importer verbatim")
+        with self.corpus.session():
+            self.corpus.update_coded_lines("macbeth.txt", "chris", [
+                {'line': 2, 'code_id': 'time'},
+                {'line': 2, 'code_id': 'death'},
+            ])
+        digest = md5("macbeth.txt:2:chris:time".encode('utf8')).hexdigest()[:16]
+        self.assertEqual(
+            self.writer.coding_guid("time", "chris", 2, "macbeth.txt"), 
+            str(UUID(bytes=digest.encode('utf8'))),
+        )
+        with TemporaryDirectory() as tempdir:
+            first, second = Path(tempdir) / "first.qde", Path(tempdir) / "second.qde"
+            self.writer.write_xml(first)
+            REFIQDAWriter(self.testpath / "settings.yaml").write_xml(second)
+            self.assertEqual(first.read_bytes(), second.read_bytes())
+            root = ElementTree.parse(first).getroot()
+        codings = root.findall(".//{urn:QDA-XML:project:1.0}Coding")
+        self.assertEqual(
+            sorted(coding.attrib['guid'] for coding in codings),
+            sorted(self.writer.coding_guid(code, "chris", 2, "macbeth.txt") for code in ["time", "death"]),
+        )
+
+    def test_incremental_export_rewrites_changed_sources(self):
+        self.run_in_testpath("qc corpus import macbeth.txt --importer verbatim")
+        self.run_in_testpath("qc corpus import moby_dick.md --importer verbatim")
+        with self.corpus.session():
+            self.corpus.update_coded_lines("macbeth.txt", "chris", [{'line': 2, 'code_id': 'time'}])
+            self.corpus.update_coded_lines("moby_dick.txt", "chris", [{'line': 0, 'code_id': 'time'}])
+        qdpx_path = self.testpath / "project.qdpx"
+        self.writer.write(qdpx_path, incremental=True)
+        self.assertTrue(self.writer.manifest_path(qdpx_path).exists())
+        with self.corpus.session():
+            self.corpus.update_coded_lines("macbeth.txt", "chris", [{'line': 4, 'code_id': 'time'}])
+        with patch.object(self.writer, "source_to_xml", wraps=self.writer.source_to_xml) as source_to_xml:
+            self.writer.write(qdpx_path, incremental=True)
+        self.assertEqual([c.args[0] for c in source_to_xml.call_args_list], ["macbeth.txt"])
+        with TemporaryDirectory() as tempdir:
+            full_path = Path(tempdir) / "project.qde"
+            REFIQDAWriter(self.testpath / "settings.yaml").write_xml(full_path)
+            with ZipFile(qdpx_path) as zf:
+                self.assertEqual(zf.read("project.qde"), full_path.read_bytes())
+
+    def test_incremental_export_rewrites_sources_edited_on_disk(self):
+        self.run_in_testpath("qc corpus import macbeth.txt --importer verbatim")
+        with self.corpus.session():
+            self.corpus.update_coded_lines("macbeth.txt", "chris", [{'line': 2, 'code_id': 'time'}])
+        qdpx_path = self.testpath / "project.qdpx"
+        self.writer.write(qdpx_path, incremental=True)
+        corpus_path = self.testpath / "corpus" / "macbeth.txt"
+        corpus_path.write_text("Prologue\n" + corpus_path.read_text())
+        with patch.object(self.writer, "source_to_xml", wraps=self.writer.source_to_xml) as source_to_xml:
+            self.writer.write(qdpx_path, incremental=True)
+        self.assertEqual([c.args[0] for c in source_to_xml.call_args_list], ["macbeth.txt"])
+
+    def test_non_incremental_export_does_not_hash_files(self):
+        self.run_in_testpath("qc corpus import macbeth.txt --importer verbatim")
+        qdpx_path = self.testpath / "project.qdpx"
+        with patch.object(self.writer.corpus, "hash_file") as hash_file:
+            self.writer.write(qdpx_path)
+        hash_file.assert_not_called()
+        self.assertFalse(self.writer.manifest_path(qdpx_path).exists())
@@ -15,6 +15,53 @@ class TestTreeNode(TestCase):
                 TreeNode.write_yaml(outfile, tn)
                 self.assertEqual(outfile.read_text(), case)
 
+    def test_queries_match_tree_structure(self):
+        tn = TreeNode({TreeNode.root: yaml.safe_load(DUPLICATE_NAMES_CODEBOOK)})
+        self.assertEqual(
+            tn.flatten(names=True, expanded=True),
+            ["a", "a1", "a:b", "a:b:c", "a:c", "d", "d:b"],
+        )
+        self.assertEqual(tn.flatten(names=True, expanded=True, depth=1), ["a", "a1", "d"])
+        (a,) = tn.find("a")
+        self.assertEqual([n.expanded_name() for n in a.flatten(depth=1)], ["a", "a:b", "a:c"])
+        self.assertEqual([n.expanded_name() for n in tn.find("b")], ["a:b", "d:b"])
+        self.assertEqual([n.expanded_name() for n in a.find("c")], ["a:b:c", "a:c"])
+        (c,) = tn.find("b")[0].find("c")
+        self.assertEqual(c.depth(), 3)
+        self.assertEqual(c.expanded_name(sep="/"), "a/b/c")
+        self.assertEqual(c.ancestors(), [a, tn.find("b")[0], c])
+
+    def test_direct_mutation_updates_queries(self):
+        tn = TreeNode({TreeNode.root: yaml.safe_load(DUPLICATE_NAMES_CODEBOOK)})
+        self.assertEqual(tn.flatten(names=True, expanded=True, depth=1), ["a", "a1", "d"])
+        tn.children.append(TreeNode("f", parent=tn))
+        self.assertEqual(tn.flatten(names=True, expanded=True, depth=1), ["a", "a1", "d", "f"])
+        tn.find("d")[0].name = "e"
+        self.assertEqual(tn.flatten(names=True, expanded=True), 
+                ["a", "a1", "a:b", "a:b:c", "a:c", "e", "e:b", "f"])
+        a = tn.find("a")[0]
+        del a.children[0]
+        self.assertEqual(tn.find("c")[0].expanded_name(), "a:c")
+
+    def test_index_of_detached_node(self):
+        tn = TreeNode({TreeNode.root: yaml.safe_load(DUPLICATE_NAMES_CODEBOOK)})
+        a = tn.find("a")[0]
+        tn.children = [c for c in tn.children if c is not a]
+        self.assertEqual(a.flatten(names=True), ["a", "b", "c", "c"])
+
+    def test_mutation_updates_queries(self):
+        tn = TreeNode({TreeNode.root: yaml.safe_load(DUPLICATE_NAMES_CODEBOOK)})
+        self.assertEqual(len(tn.find("c")), 2)
+        tn.find("d")[0].add_child("c")
+        self.assertEqual([n.expanded_name() for n in tn.find("c")], ["a:b:c", "a:c", "d:c"])
+        tn.rename("d", "e")
+        self.assertEqual(tn.flatten(names=True, expanded=True, depth=1), ["a", "a1", "e"])
+        tn.remove_children_by_name("b")
+        self.assertEqual(
+            tn.flatten(names=True, expanded=True),
+            ["a", "a1", "a:c", "a:c", "e", "e:c"],
+        )
+
 EMPTY_CODEBOOK = "[]\n"
 FLAT_CODEBOOK = """- a one
 - b two
@@ -27,4 +74,12 @@ NESTED_CODEBOOK = """- one:
 - two:
   - d
 """
+DUPLICATE_NAMES_CODEBOOK = """- a:
+  - b:
+    - c
+  - c
+- a1
+- d:
+  - b
+"""
 CASES = [EMPTY_CODEBOOK, FLAT_CODEBOOK, NESTED_CODEBOOK]
@@ -20,3 +20,48 @@ class TestUpgrade(QCTestCase):
         with corpus.session():
             code_counts = corpus.count_codes()
         self.assertEqual(code_counts['prolepsis'], 3)
+
+    def test_upgrade_1_4_0_to_1_8_0_adds_indexes(self):
+        self.set_up_qc_project()
+        corpus = QCCorpus(self.testpath / "settings.yaml")
+        with corpus.engine.begin() as conn:
+            conn.exec_driver_sql("DROP INDEX ix_coded_line_code")
+        self.update_settings("qc_version", "1.4.0")
+        self.run_in_testpath("qc upgrade -v 1.8.0")
+        with corpus.engine.connect() as conn:
+            indexes = conn.exec_driver_sql("SELECT name FROM sqlite_master WHERE type='index'")
+            self.assertIn("ix_coded_line_code", [name for (name,) in indexes])
+        self.run_in_testpath("qc upgrade -v 1.4.0")
+        with corpus.engine.connect() as conn:
+            indexes = conn.exec_driver_sql("SELECT name FROM sqlite_master WHERE type='index'")
+            self.assertNotIn("ix_coded_line_code", [name for (name,) in indexes])
+
+    def test_upgrade_1_4_0_to_1_8_0_adds_delete_cascades(self):
+        self.set_up_qc_project()
+        self.run_in_testpath("qc corpus import macbeth.txt --importer verbatim")
+        corpus = QCCorpus(self.testpath / "settings.yaml")
+        with corpus.session():
+            corpus.update_coded_lines("macbeth.txt", "chris", [
+                {'line': 0, 'code_id': 'time'},
+                {'line': 4, 'code_id': 'death'},
+            ])
+        with corpus.engine.connect() as conn:
+            conn.exec_driver_sql("PRAGMA foreign_keys = OFF")
+            conn.exec_driver_sql("CREATE TABLE coded_line_old (id INTEGER NOT NULL PRIMARY KEY, " + 
+                    "line INTEGER NOT NULL, coder_id VARCHAR NOT NULL REFERENCES coder (name), " + 
+                    "code_id VARCHAR NOT NULL REFERENCES code (name))")
+            conn.exec_driver_sql("INSERT INTO coded_line_old SELECT id, line, coder_id, code_id " + 
+                    "FROM coded_line")
+            conn.exec_driver_sql("DROP TABLE coded_line")
+            conn.exec_driver_sql("ALTER TABLE coded_line_old RENAME TO coded_line")
+            conn.commit()
+            conn.exec_driver_sql("PRAGMA foreign_keys = ON")
+        self.update_settings("qc_version", "1.4.0")
+        self.run_in_testpath("qc upgrade -v 1.8.0")
+        with corpus.engine.connect() as conn:
+            foreign_keys = conn.exec_driver_sql("PRAGMA foreign_key_list(coded_line)").all()
+            self.assertEqual({fk[6] for fk in foreign_keys}, {"CASCADE"})
+        with corpus.session():
+            self.assertEqual(len(corpus.get_coded_lines()), 2)
+            corpus.delete_coder("chris")
+            self.assertEqual(len(corpus.get_coded_lines()), 0)
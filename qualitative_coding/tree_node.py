@@ -2,14 +2,118 @@
 # Could use refactoring
 
 import yaml
+import numpy as np
+from bisect import bisect_left
 from functools import total_ordering
 from qualitative_coding.exceptions import CodebookParseError
 
+YAMLLoader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+YAMLDumper = getattr(yaml, "CSafeDumper", yaml.SafeDumper)
+
+class TreeIndex:
+    """
+    A compact, array-backed view of a tree, built in one preorder traversal.
+    Node i's descendants occupy positions i+1 through end[i]-1, so subtree queries
+    are slices. Expanded names, depths, and sort ranks are precomputed, and
+    name_positions maps each name to the (ascending) positions of nodes with that name.
+    The index describes the tree as it was when built; changing any node's name
+    or children (see TreeNode.name and TreeNode.children) invalidates it.
+    """
+    def __init__(self, root):
+        self.valid = True
+        self.nodes = []
+        self.expanded_names = []
+        self.names = []
+        name_ids = {}
+        parent, depth, name_id, end = [], [], [], []
+        stack = [(root, -1)]
+        while stack:
+            node, parent_position = stack.pop()
+            if node is None:
+                end[parent_position] = len(self.nodes)
+                continue
+            position = len(self.nodes)
+            self.nodes.append(node)
+            node._tree_index = self
+            node._tree_position = position
+            parent.append(parent_position)
+            if parent_position < 0:
+                depth.append(0)
+                self.expanded_names.append(node.name)
+            elif self.nodes[parent_position].is_root():
+                depth.append(1)
+                self.expanded_names.append(node.name)
+            else:
+                depth.append(depth[parent_position] + 1)
+                self.expanded_names.append(self.expanded_names[parent_position] + ":" + node.name)
+            if node.name not in name_ids:
+                name_ids[node.name] = len(self.names)
+                self.names.append(node.name)
+            name_id.append(name_ids[node.name])
+            end.append(position + 1)
+            stack.append((None, position))
+            for child in reversed(node.children):
+                stack.append((child, position))
+        self.parent = np.array(parent, dtype=np.int64)
+        self.depth = np.array(depth, dtype=np.int64)
+        self.name_id = np.array(name_id, dtype=np.int64)
+        self.end = np.array(end, dtype=np.int64)
+        self.rank = np.empty(len(self.nodes), dtype=np.int64)
+        self.rank[sorted(range(len(self.nodes)), key=self.expanded_names.__getitem__)] = np.arange(len(self.nodes))
+        self.name_positions = {name: [] for name in self.names}
+        for position, i in enumerate(name_id):
+            self.name_positions[self.names[i]].append(position)
+
+    def descendants(self, position, depth=None, include_self=True):
+        "Returns positions of the subtree at position, in expanded-name order"
+        positions = np.arange(position if include_self else position + 1, self.end[position])
+        if depth is not None:
+            positions = positions[self.depth[positions] <= self.depth[position] + depth]
+        return positions[np.argsort(self.rank[positions], kind="stable")]
+
+    def find(self, position, name):
+        "Returns positions in the subtree at position of nodes named name, in preorder"
+        positions = self.name_positions.get(name, [])
+        start = bisect_left(positions, position)
+        stop = bisect_left(positions, self.end[position])
+        return positions[start:stop]
+
+    def ancestors(self, position):
+        "Returns positions from the top of the tree down to position"
+        path = []
+        while position >= 0:
+            path.append(position)
+            position = self.parent[position]
+        return path[::-1]
+
+class ChildList(list):
+    "A list of a TreeNode's children, which invalidates the tree's index when changed."
+    def __init__(self, owner, children=()):
+        super().__init__(children)
+        self.owner = owner
+
+def _invalidating(method):
+    def wrapper(self, *args, **kwargs):
+        self.owner.invalidate()
+        return method(self, *args, **kwargs)
+    wrapper.__name__ = method.__name__
+    wrapper.__doc__ = method.__doc__
+    return wrapper
+
+for _method in [
+    "append", "extend", "insert", "remove", "pop", "clear", "sort", "reverse", 
+    "__setitem__", "__delitem__", "__iadd__", "__imul__",
+]:
+    setattr(ChildList, _method, _invalidating(getattr(list, _method)))
+
 @total_ordering
 class TreeNode:
     """
     A node in a tree, represented as either a string (terminal)
     or a dict (with children).
+    Queries are answered from a TreeIndex of the whole tree, which is rebuilt
+    when needed. Setting name or children, or changing children in place,
+    invalidates the index.
     """
     root = "$ROOT$"
     indent = "    "
@@ -18,25 +122,30 @@ class TreeNode:
     @classmethod
     def read_yaml(cls, filename):
         with open(filename) as f:
-            try:
-                data = yaml.safe_load(f)
-                return TreeNode({cls.root: data})
-            except yaml.scanner.ScannerError as err:
-                m = err.problem_mark
-                message = f"Error reading {filename} on line {m.line}: {err.problem}"
-                raise CodebookParseError(message)
-            except yaml.parser.ParserError as err:
-                m = err.problem_mark
-                message = f"Error reading {filename} on line {m.line}: {err.problem}"
-                raise CodebookParseError(message)
+            return TreeNode({cls.root: cls.parse_yaml(f, filename)})
+
+    @classmethod
+    def parse_yaml(cls, stream, filename):
+        "Parses codebook YAML into plain data, using libyaml when it is available."
+        try:
+            return yaml.load(stream, Loader=YAMLLoader)
+        except yaml.scanner.ScannerError as err:
+            m = err.problem_mark
+            message = f"Error reading {filename} on line {m.line}: {err.problem}"
+            raise CodebookParseError(message)
+        except yaml.parser.ParserError as err:
+            m = err.problem_mark
+            message = f"Error reading {filename} on line {m.line}: {err.problem}"
+            raise CodebookParseError(message)
 
     @classmethod
     def write_yaml(cls, filename, tree_node):
         with open(filename, 'w') as f:
-            f.write(yaml.dump(tree_node.to_json(), default_flow_style=False))
+            f.write(yaml.dump(tree_node.to_json(), default_flow_style=False, Dumper=YAMLDumper))
 
     def __init__(self, representation, parent=None):
         self.parent = parent
+        self._tree_index = None
         if isinstance(representation, str):
             self.name = representation
             self.children = []
@@ -46,8 +155,45 @@ class TreeNode:
         else:
             raise ValueError("Illegal node representation: {}".format(representation))
 
+    @property
+    def name(self):
+        return self._name
+
+    @name.setter
+    def name(self, name):
+        self.invalidate()
+        self._name = name
+
+    @property
+    def children(self):
+        return self._children
+
+    @children.setter
+    def children(self, children):
+        self.invalidate()
+        self._children = ChildList(self, children)
+
+    def get_index(self):
+        "Returns the TreeIndex for the whole tree containing this node, building it if needed"
+        if self._tree_index is None or not self._tree_index.valid:
+            top = self
+            while top.parent is not None:
+                top = top.parent
+            index = TreeIndex(top)
+            if self._tree_index is not index:
+                # This node is not among its top ancestor's descendants.
+                TreeIndex(self)
+        return self._tree_index
+
+    def invalidate(self):
+        "Discards the tree's index. Called when a node's name or children change."
+        if self._tree_index is not None:
+            self._tree_index.valid = False
+
     def add_child(self, representation):
-        self.children.append(TreeNode(representation, parent=self))
+        child = TreeNode(representation, parent=self)
+        self.children.append(child)
+        return child
 
     def remove_children_by_name(self, name):
         for child in self.children: 
@@ -67,10 +213,10 @@ class TreeNode:
 
     def ancestors(self):
         "Returns a list of ancestors, ending with self"
-        if self.is_root() or self.is_root():
+        if self.is_root():
             return []
-        else:
-            return self.parent.ancestors() + [self]
+        index = self.get_index()
+        return [index.nodes[i] for i in index.ancestors(self._tree_position) if not index.nodes[i].is_root()]
 
     def depth(self):
         return len(self.ancestors())
@@ -92,23 +238,22 @@ class TreeNode:
         If expanded, return expanded name, like 'fruits:apples:pippin'
         If depth is not None, limits the depth of recursion
         """
-        result = [] if self.is_root() else [self]
-        if depth is None or depth > 0:
-            for child in self.children: 
-                result += child.flatten(depth=depth if depth is None else depth - 1)
+        index = self.get_index()
+        positions = index.descendants(self._tree_position, depth=depth, include_self=not self.is_root())
         if names:
             if expanded:
-                result = [n.expanded_name(sep=sep) for n in result]
+                result = [index.nodes[i].expanded_name(sep=sep) for i in positions]
             else:
-                result = [n.name for n in result]
-        return sorted(result)
+                result = [index.names[index.name_id[i]] for i in positions]
+            return sorted(result)
+        return [index.nodes[i] for i in positions]
 
     def expanded_name(self, sep=":"):
         "Returns expanded name, like 'fruits:apples:pippin'"
-        if self.parent and not self.parent.is_root():
-            return self.parent.expanded_name(sep=sep) + sep + self.name
-        else:
-            return self.name
+        index = self.get_index()
+        if sep == ":":
+            return index.expanded_names[self._tree_position]
+        return sep.join(n.name for n in self.ancestors()) if not self.is_root() else self.name
 
     def indented_name(self, nodes, sep=":", indent_length=2, indent_start='.'):
         "Returns indented name, like '.    pippin'"
@@ -125,10 +270,8 @@ class TreeNode:
 
     def find(self, name):
         "Returns all child nodes (including self) with matching name"
-        result = [self] if self.name == name else []
-        for child in self.children:
-            result += child.find(name)
-        return result
+        index = self.get_index()
+        return [index.nodes[i] for i in index.find(self._tree_position, name)]
 
     def sum(self, prop):
         "Returns the sum of self plus all children's values for prop"
@@ -8,7 +8,8 @@ from pathlib import Path
 from subprocess import run, CalledProcessError
 from datetime import datetime
 from random import choice
-from itertools import count
+from itertools import count, groupby
+from operator import itemgetter
 from textwrap import fill
 import numpy as np
 import csv
@@ -84,12 +85,13 @@ class QCCorpusViewer:
         if not zeros:
             nodes = filter(lambda n: n.total > 0, nodes)
         nodes = sorted(nodes)
+        node_set = set(nodes)
 
         def namer(node):
             if expanded:
                 return node.expanded_name()
             elif recursive_codes and not outfile:
-                return node.indented_name(nodes)
+                return node.indented_name(node_set)
             else:
                 return node.name
 
@@ -351,66 +353,59 @@ class QCCorpusViewer:
             codes = set(codes)
         if unit == "line": 
             with self.corpus.session():
-                coded_lines = self.corpus.get_coded_lines(codes=codes, pattern=pattern, 
+                coded_lines = self.corpus.iter_coded_lines(codes=codes, pattern=pattern, 
                         file_list=file_list, coders=coders)
-            doc_coded_lines = defaultdict(lambda: defaultdict(set))
-            doc_code_counts = defaultdict(int)
-            for code, coder, line_num, doc_path in coded_lines:
-                doc_code_counts[doc_path] += 1
-                doc_coded_lines[doc_path][line_num].add(code)
-            for doc_path, coded_lines in doc_coded_lines.items():
-                with open(self.corpus.corpus_dir / doc_path) as fh:
-                    lines = [line for line in fh]
-                ranges = self.merge_ranges(
-                    [range(n-before, n+after+1) for n in coded_lines.keys()], 
-                    clamp=[0, len(lines)]
-                )
-                print(f"\n{doc_path} ({doc_code_counts[doc_path]})")
-                print("=" * text_width)
-                for r in ranges:
-                    if show_line_numbers:
-                        print("[{}:{}]".format(r.start, r.stop))
-                    if show_codes:
-                        self.show_text_with_codes(
-                            [lines[i] for i in r],
-                            [doc_coded_lines[doc_path][i] for i in r],
-                            text_width=text_width,
-                        )
-                    else:
-                        self.show_text(
-                            [lines[i] for i in r],
-                            text_width=text_width,
+                for doc_path, rows in groupby(coded_lines, key=itemgetter(3)):
+                    doc_coded_lines = defaultdict(set)
+                    doc_code_count = 0
+                    for code, coder, line_num, _ in rows:
+                        doc_code_count += 1
+                        doc_coded_lines[line_num].add(code)
+                    with self.corpus.open_lines(self.corpus.corpus_dir / doc_path) as line_index:
+                        ranges = self.merge_ranges(
+                            [range(n-before, n+after+1) for n in doc_coded_lines.keys()], 
+                            clamp=[0, len(line_index)]
                         )
-                    print("")
+                        print(f"\n{doc_path} ({doc_code_count})")
+                        print("=" * text_width)
+                        for r in ranges:
+                            lines = line_index.read_lines(r.start, r.stop)
+                            if show_line_numbers:
+                                print("[{}:{}]".format(r.start, r.stop))
+                            if show_codes:
+                                self.show_text_with_codes(
+                                    lines,
+                                    [doc_coded_lines[i] for i in r],
+                                    text_width=text_width,
+                                )
+                            else:
+                                self.show_text(lines, text_width=text_width)
+                            print("")
         elif unit == "paragraph":
             with self.corpus.session():
-                coded_paragraphs = self.corpus.get_coded_paragraphs(codes=codes, 
+                coded_paragraphs = self.corpus.iter_coded_paragraphs(codes=codes, 
                         pattern=pattern, file_list=file_list, coders=coders)
-            doc_coded_paras = defaultdict(lambda: defaultdict(set))
-            for code, coder, doc_path, para_start, para_end in coded_paragraphs:
-                doc_coded_paras[doc_path][(para_start, para_end)].add(code)
-            for doc_path, coded_paras in doc_coded_paras.items():
-                with open(self.corpus.corpus_dir / doc_path) as fh:
-                    lines = [line for line in fh]
-                para_code_count = sum(len(code_set) for code_set in coded_paras.values())
-                print(f"\n{doc_path} ({para_code_count})")
-                print("=" * text_width)
-                for (para_start, para_end), codes in coded_paras.items():
-                    r = range(para_start, para_end)
-                    if show_line_numbers:
-                        print("[{}:{}]".format(r.start, r.stop))
-                    if show_codes:
-                        self.show_text_with_codes(
-                            [lines[i] for i in r],
-                            [codes] + [[] for i in range(para_end - para_start)],
-                            text_width=text_width,
-                        )
-                    else:
-                        self.show_text(
-                            [lines[i] for i in r],
-                            text_width=text_width,
-                        )
-                        print(" ".join(lines[i].strip() for i in r))
+                for doc_path, rows in groupby(coded_paragraphs, key=itemgetter(2)):
+                    coded_paras = defaultdict(set)
+                    for code, coder, _, para_start, para_end in rows:
+                        coded_paras[(para_start, para_end)].add(code)
+                    para_code_count = sum(len(code_set) for code_set in coded_paras.values())
+                    print(f"\n{doc_path} ({para_code_count})")
+                    print("=" * text_width)
+                    with self.corpus.open_lines(self.corpus.corpus_dir / doc_path) as line_index:
+                        for (para_start, para_end), para_codes in coded_paras.items():
+                            lines = line_index.read_lines(para_start, para_end)
+                            if show_line_numbers:
+                                print("[{}:{}]".format(para_start, para_end))
+                            if show_codes:
+                                self.show_text_with_codes(
+                                    lines,
+                                    [para_codes] + [[] for i in range(para_end - para_start)],
+                                    text_width=text_width,
+                                )
+                            else:
+                                self.show_text(lines, text_width=text_width)
+                                print(" ".join(line.strip() for line in lines))
         elif unit == "document": 
             with self.corpus.session():
                 coded_documents = self.corpus.get_coded_documents(codes=codes, 
@@ -440,9 +435,10 @@ class QCCorpusViewer:
             file_list=None,
             show_codes=True,
         ):
-        """Displays json with lines from corpus documents with their codes.
+        """Displays JSON Lines with lines from corpus documents with their codes,
+        printing each record as soon as it is read.
         """
-        records = self.get_coded_text_json(codes, 
+        records = self.iter_coded_text_json(codes, 
             recursive_codes=recursive_codes, 
             depth=depth,
             unit=unit,
@@ -453,7 +449,8 @@ class QCCorpusViewer:
             pattern=pattern,
             file_list=file_list,
         )
-        print(json.dumps(records))
+        for record in records:
+            print(json.dumps(record))
 
     def get_coded_text_json(self, codes, 
             recursive_codes=False, 
@@ -468,63 +465,79 @@ class QCCorpusViewer:
         ):
         """Gets json with lines from corpus documents with their codes.
         """
+        return list(self.iter_coded_text_json(codes, 
+            recursive_codes=recursive_codes, 
+            depth=depth,
+            unit=unit,
+            before=before, 
+            after=after, 
+            text_width=text_width, 
+            coders=coders,
+            pattern=pattern,
+            file_list=file_list,
+        ))
+
+    def iter_coded_text_json(self, codes, 
+            recursive_codes=False, 
+            depth=None,
+            unit="line",
+            before=2, 
+            after=2, 
+            text_width=80, 
+            coders=None,
+            pattern=None,
+            file_list=None,
+        ):
+        """Yields json records with lines from corpus documents with their codes.
+        Coded lines are streamed from the database in document and line order, 
+        and only the lines needed for each record are read from the document.
+        """
         if recursive_codes:
             codes = set(sum([self.get_child_nodes(code, names=True) for code in codes], []))
         else:
             codes = set(codes)
-        records = []
         if unit == "line": 
             with self.corpus.session():
-                coded_lines = self.corpus.get_coded_lines(codes=codes, pattern=pattern, 
+                coded_lines = self.corpus.iter_coded_lines(codes=codes, pattern=pattern, 
                         file_list=file_list, coders=coders)
-            doc_coded_lines = defaultdict(lambda: defaultdict(set))
-            doc_code_counts = defaultdict(int)
-            for code, coder, line_num, doc_path in coded_lines:
-                doc_code_counts[doc_path] += 1
-                doc_coded_lines[doc_path][line_num].add(code)
-            for doc_path, coded_lines in doc_coded_lines.items():
-                with open(self.corpus.corpus_dir / doc_path) as fh:
-                    lines = [line for line in fh]
-                for line, codes in coded_lines.items():
-                    for code in codes:
-                        line_start = max(0, line - before)
-                        line_end = min(len(lines), line + after + 1)
-                        records.append({
-                            "document": doc_path,
-                            "line": line,
-                            "code": code,
-                            "text_lines": [line_start, line_end],
-                            "text": ''.join(lines[line_start:line_end])
-                        })
+                for doc_path, doc_rows in groupby(coded_lines, key=itemgetter(3)):
+                    with self.corpus.open_lines(self.corpus.corpus_dir / doc_path) as line_index:
+                        for line, line_rows in groupby(doc_rows, key=itemgetter(2)):
+                            line_start = max(0, line - before)
+                            line_end = min(len(line_index), line + after + 1)
+                            text = ''.join(line_index.read_lines(line_start, line_end))
+                            for code in dict.fromkeys(row[0] for row in line_rows):
+                                yield {
+                                    "document": doc_path,
+                                    "line": line,
+                                    "code": code,
+                                    "text_lines": [line_start, line_end],
+                                    "text": text,
+                                }
         elif unit == "paragraph":
             with self.corpus.session():
-                coded_paragraphs = self.corpus.get_coded_paragraphs(codes=codes, 
+                coded_paragraphs = self.corpus.iter_coded_paragraphs(codes=codes, 
                         pattern=pattern, file_list=file_list, coders=coders)
-            doc_coded_paras = defaultdict(lambda: defaultdict(set))
-            for code, coder, doc_path, para_start, para_end in coded_paragraphs:
-                doc_coded_paras[doc_path][(para_start, para_end)].add(code)
-            for doc_path, coded_paras in doc_coded_paras.items():
-                with open(self.corpus.corpus_dir / doc_path) as fh:
-                    lines = [line for line in fh]
-                for (para_start, para_end), codes in coded_paras.items():
-                    for code in codes:
-                        records.append({
-                            "document": doc_path,
-                            "paragraph": [para_start, para_end],
-                            "code": code,
-                            "text": ''.join(lines[para_start:para_end]),
-                        })
+                for doc_path, doc_rows in groupby(coded_paragraphs, key=itemgetter(2)):
+                    with self.corpus.open_lines(self.corpus.corpus_dir / doc_path) as line_index:
+                        for (para_start, para_end), para_rows in groupby(doc_rows, key=itemgetter(3, 4)):
+                            text = ''.join(line_index.read_lines(para_start, para_end))
+                            for code in dict.fromkeys(row[0] for row in para_rows):
+                                yield {
+                                    "document": doc_path,
+                                    "paragraph": [para_start, para_end],
+                                    "code": code,
+                                    "text": text,
+                                }
         elif unit == "document": 
             with self.corpus.session():
                 coded_documents = self.corpus.get_coded_documents(codes=codes, 
                         pattern=pattern, file_list=file_list, coders=coders)
-            doc_codes = defaultdict(set)
             for code, coder, doc_path in coded_documents:
-                records.append({
+                yield {
                     "docuement": doc_path,
                     "code": code,
-                })
-        return records
+                }
 
     def show_text(self, lines, text_width=80):
         "Prints lines of text from a corpus document"
@@ -611,7 +624,8 @@ class QCCorpusViewer:
         command = self.get_code_command(full_path, codes_file_path)
         try:
             p = run(command, shell=True, check=True)
-            corpus_file_length = len(full_path.read_text().splitlines())
+            with self.corpus.session():
+                corpus_file_length = self.corpus.count_lines(full_path)
             coded_lines = self.parse_codes(coder_name, codes_file_path.read_text(), 
                     corpus_file_length)
         except CalledProcessError as err:
@@ -751,12 +765,12 @@ class QCCorpusViewer:
                 file_list=[corpus_file_path], 
                 coders=[coder]
             )
+            line_count = self.corpus.count_lines(self.corpus.corpus_dir / corpus_file_path)
         codes_per_line = defaultdict(list)
         for code, coder, line, doc in code_line_docs:
             codes_per_line[line].append(code)
 
-        text = (self.corpus.corpus_dir / corpus_file_path).read_text().splitlines()
-        lines = [', '.join(codes_per_line[i]) for i in range(len(text))]
+        lines = [', '.join(codes_per_line[i]) for i in range(line_count)]
         return '\n'.join(lines) + '\n'
 
     def get_code_command(self, corpus_file_path, codes_file_path):